@@ -50,30 +50,35 @@
 # https://community.plotly.com/t/dash-app-pages-with-flask-login-flow-using-flask/69507
 
 import os
-from flask import Flask, url_for, redirect, request, render_template, session, jsonify
+from flask import Flask, url_for, redirect, request, render_template, session, jsonify, g
 from flask_login import login_user, LoginManager, UserMixin, current_user, logout_user
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 
+import diskcache
 import dash
-from dash import dcc, html, Input, Output, State, callback
+from dash import dcc, html, Input, Output, State, callback, clientside_callback
 
 import dash_bootstrap_components as dbc
 
 from pages.load_data import (
-    current_academic_year,
-    network_count,
-    get_school_index,
+    data_version,
+    pin_data_version,
+    unpin_data_version,
+    start_data_reloader,
+    school_directory,
     get_academic_dropdown_years,
     get_academic_growth_dropdown_years,
     get_financial_dropdown_years,
-    get_school_dropdown_list,
     get_gradespan,
     get_ethnicity,
     get_subgroup,
 )
 from pages.layouts import create_radio_layout
+from pages.callback_cache import (
+    CALLBACK_CACHE_TTL, BackgroundCallbackManager, background_cache_by
+)
 from pages.subnav import subnav_academic_information, subnav_academic_analysis
 
 # Used to generate metric rating svg circles
@@ -141,6 +146,21 @@ def load_user(id):
     return db.session.get(User, int(id))
 
 
+# every request reads the data version that is current when it starts, even if
+# new data is loaded while it runs (see load_data.pin_data_version())
+@server.before_request
+def pin_request_data_version():
+    g.data_version_token = pin_data_version()
+
+
+@server.teardown_request
+def unpin_request_data_version(exception=None):
+    token = g.pop("data_version_token", None)
+
+    if token is not None:
+        unpin_data_version(token)
+
+
 # The default is to block all requests unless user is on login page or is authenticated
 @server.before_request
 def check_login():
@@ -214,10 +234,24 @@ def logout():
     return render_template("login.html", message="You have been logged out.")
 
 
+# the heavy analysis and metrics callbacks run as background callbacks: each
+# job is queued in a diskcache directory (no broker) and run in its own process,
+# so the Flask workers stay free for the interactive callbacks. At most
+# BACKGROUND_CALLBACK_WORKERS jobs (default: the number of cpus) run at once
+# on the server - a request that starts a job waits for a free slot. Results
+# are cached by inputs, login scope, and data version (see callback_cache.py) -
+# except for errors, which are not replayed.
+background_callback_manager = BackgroundCallbackManager(
+    diskcache.Cache(os.getenv("BACKGROUND_CALLBACK_PATH", "data/background_callbacks")),
+    cache_by=background_cache_by,
+    expire=CALLBACK_CACHE_TTL,
+)
+
 app = dash.Dash(
     __name__,
     server=server,
     use_pages=True,
+    background_callback_manager=background_callback_manager,
     external_stylesheets=external_stylesheets,
     suppress_callback_exceptions=True,
     meta_tags=[
@@ -228,6 +262,11 @@ app = dash.Dash(
     ],
 )
 
+# new data (a new database or snapshot) is picked up in the background
+# without a restart, see load_data.reload_data(). Set DATA_RELOAD_INTERVAL=0
+# to turn this off.
+start_data_reloader()
+
 # Top Level Navigation #
 
 # Selected School Dropdown - shows a single school if a 'school' login is used, an associated
@@ -251,7 +290,7 @@ def set_dropdown_options(app_state):
     # this gets the list of available charters from 'school_index' which is a separate
     # table from users_db- this is because users_db includes admin + network users
 
-    available_charters = get_school_dropdown_list()
+    available_charters = school_directory.schools()
 
     # admin user
     if authorized_user.id == 0:
@@ -260,23 +299,21 @@ def set_dropdown_options(app_state):
     else:
         # check for network login - use abs value of network group_id
         if group_id < 0:
-            charters = available_charters[
-                available_charters["GroupID"] == str(abs(group_id))
-            ]
+            charters = school_directory.group(abs(group_id))
 
         else:
             # select only the authorized school using the id field of the authorized_user
             # object.
 
-            # network_count is a global variable that queries the users
+            # network_count is a value (see data_version()) that queries the users
             # table and returns a count of network + admin logins. Need
             # this value to know how far to offset the id to get the
             # correct result (e.g., there are 51 schools, 8 of which are
             # network or admin logins, so we need to subtract 8 from
             # 51 to match the actual id)
-            charters = available_charters.iloc[[(authorized_user.id - network_count)]]
+            charters = [available_charters[authorized_user.id - data_version().network_count]]
 
-    dropdown_dict = dict(zip(charters["SchoolName"], charters["SchoolID"]))
+    dropdown_dict = {s.school_name: s.school_id for s in charters}
     dropdown_list = dict(sorted(dropdown_dict.items()))
     dropdown_options = [
         {"label": name, "value": id} for name, id in dropdown_list.items()
@@ -327,7 +364,7 @@ def set_year_dropdown_options(
     # on initial login or history clear, this will be Nonetype
     # so set initial default
     if not year_value:
-        year_value = str(current_academic_year)
+        year_value = str(data_version().current_academic_year)
 
     # input_state saves (in a dcc.store) the values for previous and
     # current year and page. think of previous as the state of the variable
@@ -373,8 +410,8 @@ def set_year_dropdown_options(
         input_state["currentpage"] = current_page
         input_state["previouspage"] = input_state["currentpage"]
 
-    selected_school = get_school_index(school_id)
-    school_type = selected_school["School Type"].values[0]
+    selected_school = school_directory.get(school_id)
+    school_type = selected_school.school_type
 
     # previous_page = input_state["previouspage"]
 
@@ -385,9 +422,9 @@ def set_year_dropdown_options(
         analysis_type_value = "k8"
 
     # guest schools use academic_dropdown_years
-    if "academic" in current_page or selected_school["Guest"].values[0] == "Y":
+    if "academic" in current_page or selected_school.guest:
         if "academic_information_growth" in current_page and \
-                selected_school["Guest"].values[0] != "Y":
+                not selected_school.guest:
             years = get_academic_growth_dropdown_years(school_id)
         else:
             years = get_academic_dropdown_years(school_id, school_type)
@@ -456,7 +493,7 @@ def set_year_dropdown_options(
             "academic" in current_page
             or "academic_analysis_single" in current_page
             or "academic_analysis_multiple" in current_page
-            or selected_school["Guest"].values[0] == "Y"
+            or selected_school.guest
         )
         and (
             (school_type == "K8")
@@ -485,8 +522,7 @@ def set_year_dropdown_options(
     Input("analysis-type-radio", "value"),
 )
 def get_school_type(school_id: str, analysis_type_value: str):
-    selected_school = get_school_index(school_id)
-    school_type = selected_school["School Type"].values[0]
+    school_type = school_directory.get(school_id).school_type
 
     type_options_default = [
         {"label": "K8", "value": "k8"},
@@ -519,10 +555,42 @@ def get_school_type(school_id: str, analysis_type_value: str):
     return analysis_type_options, analysis_type_value, analysis_type_container
 
 
-# Subnavigation - Dropdown #
-# NOTE: There are no doubt better ways to structure this; however, given how complicated
-# it is and how the values are interlinked and in order to avoid circular callbacks, we are
-# using a single callback
+# Subnavigation #
+# Navigation is handled by a callback for each group of controls, so that each
+# change only runs the callbacks (and queries) that depend on it:
+#   1) which navigation is displayed depends only on the url (clientside);
+#   2) academic_information_navigation() (academic information type and
+#      category), analysis_multi_navigation() (year over year group, subject,
+#      and category) and analysis_multi_subcategory() (subcategories, which need
+#      the data) only run on their own pages - each depends on a dcc.Store
+#      that is only in the layout of those pages.
+# Because the values of these controls are not reset on other pages, a page
+# keeps the selections that were made the last time it was open.
+
+# 1) navigation displayed on the current page
+clientside_callback(
+    """
+    function(href) {
+        const page = (href || "").split("/").pop();
+        const show = {"display": "block"};
+        const hide = {"display": "none"};
+
+        return [
+            page.includes("academic_info") ? show : hide,
+            page.includes("academic_analysis") ? show : hide,
+            page.includes("analysis_multiple") ? show : hide,
+        ];
+    }
+    """,
+    Output("academic-information-navigation-container", "style"),
+    Output("analysis-navigation-container", "style"),
+    Output("analysis-multi-navigation-container", "style"),
+    Input("url", "href"),
+)
+
+
+# 2) academic_information.py and academic_information_growth.py - the
+# "academic-information-page" store holds the name of the page
 @callback(
     Output("academic-information-type-radio", "options"),
     Output("academic-information-type-radio", "value"),
@@ -531,621 +599,526 @@ def get_school_type(school_id: str, analysis_type_value: str):
     Output("academic-information-category-radio", "value"),
     Output("academic-information-category-radio-container", "style"),
     Output("academic-information-subnav-container", "style"),
-    Output("academic-information-navigation-container", "style"),
-    Output("analysis-multi-hs-group-radio", "options"),
-    Output("analysis-multi-hs-group-radio", "value"),
-    Output("analysis-multi-hs-group-radio-container", "style"),
-    Output("analysis-multi-subject-radio", "options"),
-    Output("analysis-multi-subject-radio", "value"),
-    Output("analysis-multi-subject-radio-container", "style"),
-    Output("analysis-multi-category-radio", "options"),
-    Output("analysis-multi-category-radio", "value"),
-    Output("analysis-multi-category-radio-container", "style"),
-    Output("analysis-multi-subcategory-radio", "options"),
-    Output("analysis-multi-subcategory-radio", "value"),
-    Output("analysis-multi-subcategory-radio-container", "style"),
-    Output("analysis-subnav-container", "style"),
-    Output("analysis-navigation-container", "style"),
-    Input("url", "href"),
+    Input("academic-information-page", "data"),
     Input("charter-dropdown", "value"),
-    Input("year-dropdown", "value"),
     Input("academic-information-type-radio", "value"),
-    Input("analysis-multi-hs-group-radio", "value"),
-    Input("analysis-multi-category-radio", "value"),
-    Input("analysis-multi-subcategory-radio", "value"),
-    Input("analysis-type-radio", "value"),
-    Input("analysis-multi-subject-radio", "value"),    
     State("academic-information-category-radio", "options"),
     State("academic-information-category-radio", "value"),
-    State("analysis-multi-subject-radio", "value"),
 )
-# use values as Inputs when we use them to trigger changes in the
-# navigation. use them as States when we don't necessarily want
-# them to trigger changes, but we use their values in determining
-# what to display
-def navigation(
+def academic_information_navigation(
     current_page: str,
     school_id: str,
-    year_value: str,
     info_type_value: str,
-    analysis_hs_group_value: str,
-    analysis_multi_category_value: str,
-    analysis_multi_subcategory_value: str,
-    analysis_type_value: str,
-    analysis_multi_subject_value: str,   # Testing this
     info_category_options_state: list,
     info_category_value_state: str,
-    analysis_multi_subject_state: str
 ):
-    selected_school = get_school_index(school_id)
-    school_type = selected_school["School Type"].values[0]
-
-    current_page = current_page.rsplit("/", 1)[-1]
+    school_type = school_directory.get(school_id).school_type
 
     type_options_default = [
         {"label": "K8", "value": "k8"},
         {"label": "High School", "value": "hs"}
     ]
 
-    # academic_information.py and academic_information_growth.py
-    if "academic_info" in current_page:
+    category_options_default = [
+        {"label": "All Data", "value": "all"},
+        {"label": "By Grade", "value": "grade"},
+        {"label": "By Ethnicity", "value": "ethnicity"},
+        {"label": "By Subgroup", "value": "subgroup"},
+        {"label": "IREAD", "value": "iread"},
+        {"label": "WIDA", "value": "wida"}
+    ]
 
-        # hide academic analysis navigation
-        analysis_type_value = "k8"
+    category_options_growth = [
+        {"label": "All Data", "value": "all"},
+        {"label": "By Grade", "value": "grade"},
+        {"label": "By Ethnicity", "value": "ethnicity"},
+        {"label": "By Subgroup", "value": "subgroup"}
+    ]
 
-        analysis_multi_hs_group_options = []
-        analysis_multi_hs_group_value = ""
-        analysis_multi_hs_group_container = {"display": "none"}
+    # hide subnavigation if HS/AHS is selected
+    if school_type == "HS" or school_type == "AHS":
+        info_subnav_container = {"display": "none"}
 
-        analysis_multi_subject_options = []  # type: list
-        analysis_multi_subject_value = ""
-        analysis_multi_subject_container = {"display": "none"}
+        info_type_options = []  # type: list
+        info_type_value = "hs"
+        info_type_container = {"display": "none"}
 
-        analysis_multi_category_options = []
-        analysis_multi_category_value = ""
-        analysis_multi_category_container = {"display": "none"}
+        info_category_options = []
+        info_category_value = ""
+        info_category_container = {"display": "none"}
 
-        analysis_multi_subcategory_options = []  # type: list
-        analysis_multi_subcategory_value = ""
-        analysis_multi_subcategory_container = {"display": "none"}
+    # categories of K8 schools
+    elif school_type == "K8":
+        info_subnav_container = {"display": "block"}
 
-        analysis_nav_container = {"display": "none"}
-        analysis_subnav_container = {"display": "none"}
+        info_type_options = []
+        info_type_value = "k8"
+        info_type_container = {"display": "none"}
 
-        # begin academic_info navigation
-        info_nav_container = {"display": "block"}
+        # growth page does not have IREAD/WIDA buttons - so we check
+        # value_state to make sure those values and options are
+        # changed to growth_defaults if the user selects the academic
+        # growth tab (while IREAD/WIDA is selected)
+        if current_page == "academic_information_growth":
+            if info_category_value_state:
+                if info_category_value_state == "wida" or \
+                    info_category_value_state == "iread":
+                    info_category_value = "all"
+                else:
+                    info_category_value = info_category_value_state
+            else:
+                info_category_value = "all"
 
-        category_options_default = [
-            {"label": "All Data", "value": "all"},
-            {"label": "By Grade", "value": "grade"},
-            {"label": "By Ethnicity", "value": "ethnicity"},
-            {"label": "By Subgroup", "value": "subgroup"},
-            {"label": "IREAD", "value": "iread"},
-            {"label": "WIDA", "value": "wida"}
-        ]
+            # if on growth page and the current options_state is the default (non-growth)
+            # value, switch options_value to growth, else use state
+            if info_category_options_state:
+                if info_category_options_state == category_options_default:
+                    info_category_options = category_options_growth
+                else:
+                  info_category_options = info_category_options_state
+            else:
+                info_category_options = category_options_growth
+        
+        else:    # academic_information.py          
+            if info_category_value_state:
+                info_category_value = info_category_value_state
+            else:
+                info_category_value = "all"
+
+            if info_category_options_state:
+                # similarly, if options_state is using growth and the user
+                # switches to info page, change options to default
+                if info_category_options_state == category_options_growth:
+                    info_category_options = category_options_default
+                else: 
+                    info_category_options = info_category_options_state
+            else:
+                info_category_options = category_options_default 
 
-        category_options_growth = [
-            {"label": "All Data", "value": "all"},
-            {"label": "By Grade", "value": "grade"},
-            {"label": "By Ethnicity", "value": "ethnicity"},
-            {"label": "By Subgroup", "value": "subgroup"}
-        ]
+        info_category_container = {"display": "block"}
 
-        # hide subnavigation if HS/AHS is selected
-        if school_type == "HS" or school_type == "AHS":
-            info_subnav_container = {"display": "none"}
+    # categories for K12 schools who have selected the "k8" type
+    # note that academic_information_growth.py does not have a type radio button
+    elif school_type == "K12" and (info_type_value == "k8" or not info_type_value):
+        info_subnav_container = {"display": "block"}
 
-            info_type_options = []  # type: list
-            info_type_value = "hs"
+        if current_page == "academic_information_growth":
+            info_type_options = []
+            info_type_value = "k8"
             info_type_container = {"display": "none"}
 
-            info_category_options = []
-            info_category_value = ""
-            info_category_container = {"display": "none"}
+        else:
+            info_type_options = type_options_default
 
-        # categories of K8 schools
-        elif school_type == "K8":
-            info_subnav_container = {"display": "block"}
+            if info_type_value in ["k8", "hs"]:
+                info_type_value = info_type_value
+            else:
+                info_type_value = "k8"
 
-            info_type_options = []
-            info_type_value = "k8"
-            info_type_container = {"display": "none"}
+            info_type_container = {"display": "block"}
 
-            # growth page does not have IREAD/WIDA buttons - so we check
-            # value_state to make sure those values and options are
-            # changed to growth_defaults if the user selects the academic
-            # growth tab (while IREAD/WIDA is selected)
-            if current_page == "academic_information_growth":
-                if info_category_value_state:
-                    if info_category_value_state == "wida" or \
-                        info_category_value_state == "iread":
-                        info_category_value = "all"
-                    else:
-                        info_category_value = info_category_value_state
-                else:
+        # see above growth/info value/otions comment
+        if current_page == "academic_information_growth":
+            if info_category_value_state:
+                if info_category_value_state == "wida" or \
+                    info_category_value_state == "iread":
                     info_category_value = "all"
-
-                # if on growth page and the current options_state is the default (non-growth)
-                # value, switch options_value to growth, else use state
-                if info_category_options_state:
-                    if info_category_options_state == category_options_default:
-                        info_category_options = category_options_growth
-                    else:
-                      info_category_options = info_category_options_state
                 else:
-                    info_category_options = category_options_growth
-            
-            else:    # academic_information.py          
-                if info_category_value_state:
                     info_category_value = info_category_value_state
-                else:
-                    info_category_value = "all"
+            else:
+                info_category_value = "all"
 
-                if info_category_options_state:
-                    # similarly, if options_state is using growth and the user
-                    # switches to info page, change options to default
-                    if info_category_options_state == category_options_growth:
-                        info_category_options = category_options_default
-                    else: 
-                        info_category_options = info_category_options_state
+            if info_category_options_state:
+                if info_category_options_state == category_options_default:
+                    info_category_options = category_options_growth
                 else:
-                    info_category_options = category_options_default 
+                  info_category_options = info_category_options_state
+            else:
+                info_category_options = category_options_growth
+        
+        else:    
+        
+            if info_category_value_state:
+                info_category_value = info_category_value_state
+            else:
+                info_category_value = "all"
 
-            info_category_container = {"display": "block"}
+            if info_category_options_state:
 
-        # categories for K12 schools who have selected the "k8" type
-        # note that academic_information_growth.py does not have a type radio button
-        elif school_type == "K12" and (info_type_value == "k8" or not info_type_value):
-            info_subnav_container = {"display": "block"}
+                if info_category_options_state == category_options_growth:
+                    info_category_options = category_options_default
+                else: 
+                    info_category_options = info_category_options_state
+            else:
+                info_category_options = category_options_default 
+ 
+        info_category_container = {"display": "block"}
 
-            if current_page == "academic_information_growth":
-                info_type_options = []
-                info_type_value = "k8"
-                info_type_container = {"display": "none"}
+    # there is also no subnavigation for a K12 school that
+    # has the "hs" type selected
+    elif school_type == "K12" and info_type_value == "hs":
+        info_subnav_container = {"display": "none"}
 
-            else:
-                info_type_options = type_options_default
+        info_type_options = type_options_default
 
-                if info_type_value in ["k8", "hs"]:
-                    info_type_value = info_type_value
-                else:
-                    info_type_value = "k8"
-
-                info_type_container = {"display": "block"}
-
-            # see above growth/info value/otions comment
-            if current_page == "academic_information_growth":
-                if info_category_value_state:
-                    if info_category_value_state == "wida" or \
-                        info_category_value_state == "iread":
-                        info_category_value = "all"
-                    else:
-                        info_category_value = info_category_value_state
-                else:
-                    info_category_value = "all"
+        if info_type_value in ["k8", "hs"]:
+            info_type_value = info_type_value
+        else:
+            info_type_value = "k8"
 
-                if info_category_options_state:
-                    if info_category_options_state == category_options_default:
-                        info_category_options = category_options_growth
-                    else:
-                      info_category_options = info_category_options_state
-                else:
-                    info_category_options = category_options_growth
-            
-            else:    
-            
-                if info_category_value_state:
-                    info_category_value = info_category_value_state
-                else:
-                    info_category_value = "all"
+        info_type_container = {"display": "block"}
 
-                if info_category_options_state:
+        info_category_options = []
+        info_category_value = ""
+        info_category_container = {"display": "none"}
 
-                    if info_category_options_state == category_options_growth:
-                        info_category_options = category_options_default
-                    else: 
-                        info_category_options = info_category_options_state
-                else:
-                    info_category_options = category_options_default 
- 
-            info_category_container = {"display": "block"}
+    return (
+        info_type_options,
+        info_type_value,
+        info_type_container,
+        info_category_options,
+        info_category_value,
+        info_category_container,
+        info_subnav_container,
+    )
 
-        # there is also no subnavigation for a K12 school that
-        # has the "hs" type selected
-        elif school_type == "K12" and info_type_value == "hs":
-            info_subnav_container = {"display": "none"}
 
-            info_type_options = type_options_default
+# 2) academic_analysis_multiple_years.py - the "analysis-multi-page" store is
+# only used to limit the callback to the page
+@callback(
+    Output("analysis-multi-hs-group-radio", "options"),
+    Output("analysis-multi-hs-group-radio", "value"),
+    Output("analysis-multi-hs-group-radio-container", "style"),
+    Output("analysis-multi-subject-radio", "options"),
+    Output("analysis-multi-subject-radio", "value"),
+    Output("analysis-multi-subject-radio-container", "style"),
+    Output("analysis-multi-category-radio", "options"),
+    Output("analysis-multi-category-radio", "value"),
+    Output("analysis-multi-category-radio-container", "style"),
+    Input("analysis-multi-page", "data"),
+    Input("charter-dropdown", "value"),
+    Input("analysis-type-radio", "value"),
+    Input("analysis-multi-hs-group-radio", "value"),
+    Input("analysis-multi-subject-radio", "value"),
+    Input("analysis-multi-category-radio", "value"),
+)
+def analysis_multi_navigation(
+    current_page: str,
+    school_id: str,
+    analysis_type_value: str,
+    analysis_hs_group_value: str,
+    analysis_multi_subject_value: str,
+    analysis_multi_category_value: str,
+):
+    school_type = school_directory.get(school_id).school_type
 
-            if info_type_value in ["k8", "hs"]:
-                info_type_value = info_type_value
-            else:
-                info_type_value = "k8"
+    # K8 schools (and K12 schools without a selected type) use "k8" data
+    if (school_type == "K8" or school_type == "K12") and analysis_type_value != "hs":
+        analysis_type_value = "k8"
 
-            info_type_container = {"display": "block"}
+    # options and values for for HS/AHS/K12 (hs type)
+    if (
+        school_type == "HS"
+        or school_type == "AHS"
+        or (school_type == "K12" and analysis_type_value == "hs")
+    ):
+        analysis_multi_hs_group_options = [
+            {"label": "Graduation Rate", "value": "Graduation Rate"},
+            {"label": "SAT", "value": "SAT"},
+        ]
 
-            info_category_options = []
-            info_category_value = ""
-            info_category_container = {"display": "none"}
+        analysis_multi_hs_group_container = {"display": "block"}
 
-    # analysis_single_year.py and analysis_multiple_years.py
-    elif "academic_analysis" in current_page:
-        
-        # hide academic information navigation and subnavigation
-        info_nav_container = {"display": "none"}
-        info_subnav_container = {"display": "none"}
-        info_type_container = {"display": "none"}
-        info_category_container = {"display": "none"}
+        if analysis_hs_group_value:
+            analysis_multi_hs_group_value = analysis_hs_group_value
+        else:
+            analysis_multi_hs_group_value = "Graduation Rate"
 
-        info_type_options = []
-        info_type_value = ""
+    else:
+        analysis_multi_hs_group_options = []
+        analysis_multi_hs_group_value = ""
+        analysis_multi_hs_group_container = {"display": "none"}
 
-        info_category_options = []
-        info_category_value = ""
+    # categories for HS/AHS/K12 (hs type)
+    if (
+        school_type == "HS"
+        or school_type == "AHS"
+        or (school_type == "K12" and analysis_type_value == "hs")
+    ):
+
+        if (
+            analysis_multi_hs_group_value == "Graduation Rate"
+            or analysis_multi_hs_group_value == ""
+        ):
+            # hide subject and subcategory
+            analysis_multi_subject_value = ""
+            analysis_multi_subject_options = []
+            analysis_multi_subject_container = {"display": "none"}
+
+            # show graduation rate categories
+            analysis_multi_category_options = [
+                {"label": "Total", "value": "Total"},
+                {"label": "Subgroup", "value": "Subgroup"},
+                {"label": "Race/Ethnicity", "value": "Race/Ethnicity"},
+            ]
 
-        # begin analysis navigation and subnavigation
-        analysis_nav_container = {"display": "block"}
-        analysis_subnav_container = {"display": "block"}
+            analysis_multi_category_container = {"display": "block"}
 
-        # analysis_multiple_years.py
-        if "analysis_multiple" in current_page:
+            # use existing value or set default value to "Total"
+            if analysis_multi_category_value in [
+                "Total",
+                "Subgroup",
+                "Race/Ethnicity",
+            ]:
+                analysis_multi_category_value = analysis_multi_category_value
+            else:
+                analysis_multi_category_value = "Total"
+
+        elif analysis_multi_hs_group_value == "SAT":
             
-            # options and values for for HS/AHS/K12 (hs type)
-            if (
-                school_type == "HS"
-                or school_type == "AHS"
-                or (school_type == "K12" and analysis_type_value == "hs")
-            ):
-                analysis_multi_hs_group_options = [
-                    {"label": "Graduation Rate", "value": "Graduation Rate"},
-                    {"label": "SAT", "value": "SAT"},
-                ]
+            # change subject values to SAT specific descriptions
+            analysis_multi_subject_options = [
+                {"label": "EBRW", "value": "EBRW"},
+                {"label": "Math", "value": "Math"},
+            ]
 
-                analysis_multi_hs_group_container = {"display": "block"}
+            analysis_multi_subject_container = {"display": "block"}
 
-                if analysis_hs_group_value:
-                    analysis_multi_hs_group_value = analysis_hs_group_value
-                else:
-                    analysis_multi_hs_group_value = "Graduation Rate"
+            # use existing value or set default subject value to "EBRW"
+            if analysis_multi_subject_value not in ["EBRW", "Math"]:
+                analysis_multi_subject_value = "EBRW"
 
-            else:
-                analysis_multi_hs_group_options = []
-                analysis_multi_hs_group_value = ""
-                analysis_multi_hs_group_container = {"display": "none"}
-
-            # categories for HS/AHS/K12 (hs type)
-            if (
-                school_type == "HS"
-                or school_type == "AHS"
-                or (school_type == "K12" and analysis_type_value == "hs")
-            ):
-
-                if (
-                    analysis_multi_hs_group_value == "Graduation Rate"
-                    or analysis_multi_hs_group_value == ""
-                ):
-                    # hide subject and subcategory
-                    analysis_multi_subject_value = ""
-                    analysis_multi_subject_options = []
-                    analysis_multi_subject_container = {"display": "none"}
-
-                    # show graduation rate categories
-                    analysis_multi_category_options = [
-                        {"label": "Total", "value": "Total"},
-                        {"label": "Subgroup", "value": "Subgroup"},
-                        {"label": "Race/Ethnicity", "value": "Race/Ethnicity"},
-                    ]
-
-                    analysis_multi_category_container = {"display": "block"}
-
-                    # use existing value or set default value to "Total"
-                    if analysis_multi_category_value in [
-                        "Total",
-                        "Subgroup",
-                        "Race/Ethnicity",
-                    ]:
-                        analysis_multi_category_value = analysis_multi_category_value
-                    else:
-                        analysis_multi_category_value = "Total"
-
-                elif analysis_multi_hs_group_value == "SAT":
-                    
-                    # change subject values to SAT specific descriptions
-                    analysis_multi_subject_options = [
-                        {"label": "EBRW", "value": "EBRW"},
-                        {"label": "Math", "value": "Math"},
-                    ]
-
-                    analysis_multi_subject_container = {"display": "block"}
-
-                    # use existing value or set default subject value to "EBRW"
-                    if analysis_multi_subject_state in ["EBRW", "Math"]:
-                        analysis_multi_subject_value = analysis_multi_subject_state
-                    else:
-                        analysis_multi_subject_value = "EBRW"
-
-                    # SAT subject and categories (SAT has different subject values
-                    # than ELA & Math)
-                    analysis_multi_category_options = [
-                        {"label": "School Total", "value": "Total"},
-                        {"label": "Subgroup", "value": "Subgroup"},
-                        {"label": "Race/Ethnicity", "value": "Race/Ethnicity"},
-                    ]
-
-                    analysis_multi_category_container = {"display": "block"}
-
-                    # use existing value or set default subject value to "Total"
-                    if analysis_multi_category_value in [
-                        "Total",
-                        "Subgroup",
-                        "Race/Ethnicity",
-                    ]:
-                        analysis_multi_category_value = analysis_multi_category_value
-                    else:
-                        analysis_multi_category_value = "Total"
+            # SAT subject and categories (SAT has different subject values
+            # than ELA & Math)
+            analysis_multi_category_options = [
+                {"label": "School Total", "value": "Total"},
+                {"label": "Subgroup", "value": "Subgroup"},
+                {"label": "Race/Ethnicity", "value": "Race/Ethnicity"},
+            ]
+
+            analysis_multi_category_container = {"display": "block"}
 
+            # use existing value or set default subject value to "Total"
+            if analysis_multi_category_value in [
+                "Total",
+                "Subgroup",
+                "Race/Ethnicity",
+            ]:
+                analysis_multi_category_value = analysis_multi_category_value
             else:
+                analysis_multi_category_value = "Total"
 
-                # subject and categories for K8 and K12 (k8 type)
-                if school_type == "K8" or (
-                    school_type == "K12" and analysis_type_value == "k8"
-                ):
-                    
-                    # subject for both K8 and K12 schools (k8 type)
-                    analysis_multi_subject_options = [
-                        {"label": "ELA", "value": "ELA"},
-                        {"label": "Math", "value": "Math"},
-                        {"label": "IREAD", "value": "IREAD"}
-                    ]
-
-                    analysis_multi_subject_container = {"display": "block"}
-
-                    # default subject ("ELA")
-                    if analysis_multi_subject_state in ["ELA", "Math", "IREAD"]:
-                        analysis_multi_subject_value = analysis_multi_subject_state
-                    else:
-                        analysis_multi_subject_value = "ELA"
-
-                    analysis_multi_category_container = {"display": "block"}
-
-                    # ELA/Math and IREAD have different options
-                    if analysis_multi_subject_value == "IREAD" or \
-                        analysis_multi_subject_state == "IREAD":
-
-                        # IREAD Categories (substitute Total for Grade)
-                        analysis_multi_category_options = [
-                            {"label": "Total", "value": "Total"},
-                            {"label": "Subgroup", "value": "Subgroup"},
-                            {"label": "Race/Ethnicity", "value": "Race/Ethnicity"}
-                        ]
-
-                        # use existing value or set default subject value to "Total"
-                        if analysis_multi_category_value in [
-                            "Total",
-                            "Subgroup",
-                            "Race/Ethnicity",
-                        ]:
-                            analysis_multi_category_value = analysis_multi_category_value
-                        else:
-                            analysis_multi_category_value = "Total"
-                    
-                    else:
-                        # ILEARN Categories (substitute Grade for Total)
-                        analysis_multi_category_options = [
-                            {"label": "Grade", "value": "Grade"},
-                            {"label": "Subgroup", "value": "Subgroup"},
-                            {"label": "Race/Ethnicity", "value": "Race/Ethnicity"}
-                        ]
-
-                        # use existing value or set default subject value to "Grade"
-                        if analysis_multi_category_value in [
-                            "Grade",
-                            "Subgroup",
-                            "Race/Ethnicity",
-                        ]:
-                            analysis_multi_category_value = analysis_multi_category_value
-                        else:
-                            analysis_multi_category_value = "Grade"
-
-            # get years for subcategoires
-            if school_type == "K8" and analysis_type_value == "hs":
-                analysis_type_value = "k8"
-
-            # NOTE: Guest schools do not have financial data so we include
-            # them here.
-            if (
-                "academic" in current_page
-                or "analysis_single" in current_page
-                or "analysis_multiple" in current_page
-                or selected_school["Guest"].values[0] == "Y"
-            ):
-                if (
-                    "academic_information" in current_page
-                    or "analysis_single" in current_page
-                    or "analysis_multiple" in current_page
-                ) and analysis_type_value == "hs":
-                    years = get_academic_dropdown_years(school_id, "HS")
+    else:
 
-                else:
-                    years = get_academic_dropdown_years(school_id, school_type)
+        # subject and categories for K8 and K12 (k8 type)
+        if school_type == "K8" or (
+            school_type == "K12" and analysis_type_value == "k8"
+        ):
+            
+            # subject for both K8 and K12 schools (k8 type)
+            analysis_multi_subject_options = [
+                {"label": "ELA", "value": "ELA"},
+                {"label": "Math", "value": "Math"},
+                {"label": "IREAD", "value": "IREAD"}
+            ]
 
-            # subcategories for all schools
-            if analysis_multi_category_value == "Grade":
-                grades = get_gradespan(school_id, year_value, years)
+            analysis_multi_subject_container = {"display": "block"}
 
-                if grades:
-                    analysis_multi_subcategory_options = [
-                        {"label": g, "value": "Grade " + g} for g in grades
-                    ]
-                    analysis_multi_subcategory_options.append(
-                        {"label": "School Total", "value": "Total"}
-                    )
+            # default subject ("ELA")
+            if analysis_multi_subject_value not in ["ELA", "Math", "IREAD"]:
+                analysis_multi_subject_value = "ELA"
 
-                    grade_strings = ["Grade " + g for g in grades]
+            analysis_multi_category_container = {"display": "block"}
 
-                    if analysis_multi_subcategory_value in grade_strings:
-                        analysis_multi_subcategory_value = (
-                            analysis_multi_subcategory_value
-                        )
-                    else:
-                        analysis_multi_subcategory_value = "Total"
+            # ELA/Math and IREAD have different options
+            if analysis_multi_subject_value == "IREAD":
 
-                    analysis_multi_subcategory_container = {"display": "block"}
+                # IREAD Categories (substitute Total for Grade)
+                analysis_multi_category_options = [
+                    {"label": "Total", "value": "Total"},
+                    {"label": "Subgroup", "value": "Subgroup"},
+                    {"label": "Race/Ethnicity", "value": "Race/Ethnicity"}
+                ]
 
+                # use existing value or set default subject value to "Total"
+                if analysis_multi_category_value in [
+                    "Total",
+                    "Subgroup",
+                    "Race/Ethnicity",
+                ]:
+                    analysis_multi_category_value = analysis_multi_category_value
                 else:
-                    analysis_multi_subcategory_options = []
-                    analysis_multi_subcategory_value = "No Data"
-                    analysis_multi_subcategory_container = {"display": "block"}
-
-            elif analysis_multi_category_value == "Race/Ethnicity":
-
-                ethnicity = get_ethnicity(
-                    school_id,
-                    analysis_type_value,
-                    analysis_multi_hs_group_value,
-                    analysis_multi_subject_value,           
-                    year_value,
-                    years
-                )
-                
-                analysis_multi_subcategory_options = [
-                    {"label": e, "value": e} for e in ethnicity
+                    analysis_multi_category_value = "Total"
+            
+            else:
+                # ILEARN Categories (substitute Grade for Total)
+                analysis_multi_category_options = [
+                    {"label": "Grade", "value": "Grade"},
+                    {"label": "Subgroup", "value": "Subgroup"},
+                    {"label": "Race/Ethnicity", "value": "Race/Ethnicity"}
                 ]
-                ethnicity.sort()
 
-                if ethnicity:
-                    if analysis_multi_subcategory_value in ethnicity:
-                        analysis_multi_subcategory_value = (
-                            analysis_multi_subcategory_value
-                        )
-                    else:
-                        analysis_multi_subcategory_value = ethnicity[0]
+                # use existing value or set default subject value to "Grade"
+                if analysis_multi_category_value in [
+                    "Grade",
+                    "Subgroup",
+                    "Race/Ethnicity",
+                ]:
+                    analysis_multi_category_value = analysis_multi_category_value
+                else:
+                    analysis_multi_category_value = "Grade"
 
-                    analysis_multi_subcategory_container = {"display": "block"}
+    return (
+        analysis_multi_hs_group_options,
+        analysis_multi_hs_group_value,
+        analysis_multi_hs_group_container,
+        analysis_multi_subject_options,
+        analysis_multi_subject_value,
+        analysis_multi_subject_container,
+        analysis_multi_category_options,
+        analysis_multi_category_value,
+        analysis_multi_category_container,
+    )
 
-                else:
-                    analysis_multi_subcategory_options = []
-                    analysis_multi_subcategory_value = "No Race/Ethnicity Data"
-                    analysis_multi_subcategory_container = {"display": "block"}
-
-            elif analysis_multi_category_value == "Subgroup":
-                subgroup = get_subgroup(
-                    school_id,
-                    analysis_type_value,
-                    analysis_multi_hs_group_value,
-                    analysis_multi_subject_value,
-                    year_value,
-                    years
-                )
-                subgroup.sort()
 
-                if subgroup:
-                    analysis_multi_subcategory_options = [
-                        {"label": s, "value": s} for s in subgroup
-                    ]
+# 2) academic_analysis_multiple_years.py subcategories (the grades, ethnicities,
+# or subgroups with data for the selected school) - the "analysis-multi-page"
+# store is a State, so this runs after analysis_multi_navigation() when the
+# page is opened
+@callback(
+    Output("analysis-multi-subcategory-radio", "options"),
+    Output("analysis-multi-subcategory-radio", "value"),
+    Output("analysis-multi-subcategory-radio-container", "style"),
+    Input("charter-dropdown", "value"),
+    Input("year-dropdown", "value"),
+    Input("analysis-type-radio", "value"),
+    Input("analysis-multi-hs-group-radio", "value"),
+    Input("analysis-multi-subject-radio", "value"),
+    Input("analysis-multi-category-radio", "value"),
+    Input("analysis-multi-subcategory-radio", "value"),
+    State("analysis-multi-page", "data"),
+)
+def analysis_multi_subcategory(
+    school_id: str,
+    year_value: str,
+    analysis_type_value: str,
+    analysis_multi_hs_group_value: str,
+    analysis_multi_subject_value: str,
+    analysis_multi_category_value: str,
+    analysis_multi_subcategory_value: str,
+    current_page: str,
+):
+    school_type = school_directory.get(school_id).school_type
 
-                    if analysis_multi_subcategory_value in subgroup:
-                        analysis_multi_subcategory_value = (
-                            analysis_multi_subcategory_value
-                        )
+    if school_type == "K8" and analysis_type_value == "hs":
+        analysis_type_value = "k8"
 
-                    else:
-                        analysis_multi_subcategory_value = subgroup[0]
+    if analysis_type_value == "hs":
+        years = get_academic_dropdown_years(school_id, "HS")
+    else:
+        years = get_academic_dropdown_years(school_id, school_type)
 
-                    analysis_multi_subcategory_container = {"display": "block"}
+    # subcategories for all schools
+    if analysis_multi_category_value == "Grade":
+        grades = get_gradespan(school_id, year_value, years)
 
-                else:
-                    analysis_multi_subcategory_options = []
-                    analysis_multi_subcategory_value = "No Subgroup Data"
-                    analysis_multi_subcategory_container = {"display": "block"}
+        if grades:
+            analysis_multi_subcategory_options = [
+                {"label": g, "value": "Grade " + g} for g in grades
+            ]
+            analysis_multi_subcategory_options.append(
+                {"label": "School Total", "value": "Total"}
+            )
+
+            grade_strings = ["Grade " + g for g in grades]
 
-            # for SAT ('School Total') and Grad Rate ('Total) set single value,
-            # with no options
+            if analysis_multi_subcategory_value in grade_strings:
+                analysis_multi_subcategory_value = (
+                    analysis_multi_subcategory_value
+                )
             else:
                 analysis_multi_subcategory_value = "Total"
-                analysis_multi_subcategory_options = []
-                analysis_multi_subcategory_container = {"display": "none"}
 
-        else:  # analysis_single_year page has no radio buttons other than 'type'
+            analysis_multi_subcategory_container = {"display": "block"}
+
+        else:
             analysis_multi_subcategory_options = []
-            analysis_multi_subcategory_value = ""
-            analysis_multi_subcategory_container = {"display": "none"}
+            analysis_multi_subcategory_value = "No Data"
+            analysis_multi_subcategory_container = {"display": "block"}
+
+    elif analysis_multi_category_value == "Race/Ethnicity":
+
+        ethnicity = get_ethnicity(
+            school_id,
+            analysis_type_value,
+            analysis_multi_hs_group_value,
+            analysis_multi_subject_value,           
+            year_value,
+            years
+        )
+        
+        analysis_multi_subcategory_options = [
+            {"label": e, "value": e} for e in ethnicity
+        ]
+        ethnicity.sort()
 
-            analysis_multi_hs_group_options = []
-            analysis_multi_hs_group_value = ""
-            analysis_multi_hs_group_container = {"display": "none"}
+        if ethnicity:
+            if analysis_multi_subcategory_value in ethnicity:
+                analysis_multi_subcategory_value = (
+                    analysis_multi_subcategory_value
+                )
+            else:
+                analysis_multi_subcategory_value = ethnicity[0]
 
-            analysis_multi_subject_options = []
-            analysis_multi_subject_value = ""
-            analysis_multi_subject_container = {"display": "none"}
+            analysis_multi_subcategory_container = {"display": "block"}
 
-            analysis_multi_category_options = []
-            analysis_multi_category_value = ""
-            analysis_multi_category_container = {"display": "none"}
+        else:
+            analysis_multi_subcategory_options = []
+            analysis_multi_subcategory_value = "No Race/Ethnicity Data"
+            analysis_multi_subcategory_container = {"display": "block"}
+
+    elif analysis_multi_category_value == "Subgroup":
+        subgroup = get_subgroup(
+            school_id,
+            analysis_type_value,
+            analysis_multi_hs_group_value,
+            analysis_multi_subject_value,
+            year_value,
+            years
+        )
+        subgroup.sort()
 
-    # all other pages have no sub_navigation (other than Financal Tabs
-    # [School][Network] subnavigation - those are currently part of the individual
-    # pages)
-    # TODO: Move Financial Tab [School][Network] subnavigation here
-    else:
-        # analysis both
-        analysis_type_value = "k8"
+        if subgroup:
+            analysis_multi_subcategory_options = [
+                {"label": s, "value": s} for s in subgroup
+            ]
 
-        # analysis multi
-        analysis_nav_container = {"display": "none"}
-        analysis_subnav_container = {"display": "none"}
+            if analysis_multi_subcategory_value in subgroup:
+                analysis_multi_subcategory_value = (
+                    analysis_multi_subcategory_value
+                )
 
-        analysis_multi_hs_group_options = []
-        analysis_multi_hs_group_value = ""
-        analysis_multi_hs_group_container = {"display": "none"}
+            else:
+                analysis_multi_subcategory_value = subgroup[0]
 
-        analysis_multi_subject_options = []
-        analysis_multi_subject_value = ""
-        analysis_multi_subject_container = {"display": "none"}
+            analysis_multi_subcategory_container = {"display": "block"}
 
-        analysis_multi_category_options = []
-        analysis_multi_category_value = ""
-        analysis_multi_category_container = {"display": "none"}
+        else:
+            analysis_multi_subcategory_options = []
+            analysis_multi_subcategory_value = "No Subgroup Data"
+            analysis_multi_subcategory_container = {"display": "block"}
 
+    # for SAT ('School Total') and Grad Rate ('Total) set single value,
+    # with no options
+    else:
+        analysis_multi_subcategory_value = "Total"
         analysis_multi_subcategory_options = []
-        analysis_multi_subcategory_value = ""
         analysis_multi_subcategory_container = {"display": "none"}
 
-        # academic info
-        info_nav_container = {"display": "none"}
-        info_subnav_container = {"display": "none"}
-        info_type_container = {"display": "none"}
-        info_category_container = {"display": "none"}
-
-        info_type_options = []
-        info_type_value = ""
-
-        info_category_options = []
-        info_category_value = ""
-
     return (
-        info_type_options,
-        info_type_value,
-        info_type_container,
-        info_category_options,
-        info_category_value,
-        info_category_container,
-        info_subnav_container,
-        info_nav_container,
-        analysis_multi_hs_group_options,
-        analysis_multi_hs_group_value,
-        analysis_multi_hs_group_container,
-        analysis_multi_subject_options,
-        analysis_multi_subject_value,
-        analysis_multi_subject_container,
-        analysis_multi_category_options,
-        analysis_multi_category_value,
-        analysis_multi_category_container,
         analysis_multi_subcategory_options,
         analysis_multi_subcategory_value,
         analysis_multi_subcategory_container,
-        analysis_subnav_container,
-        analysis_nav_container,
     )
 
 
@@ -1157,8 +1130,7 @@ def navigation(
     Output("url", "href"), Input("charter-dropdown", "value"), Input("url", "href")
 )
 def redirect_hs(school: str, current_page: str):
-    selected_school = get_school_index(school)
-    school_type = selected_school["School Type"].values[0]
+    school_type = school_directory.get(school).school_type
 
     current_page = current_page.rsplit("/", 1)[-1]
 
@@ -1427,54 +1399,59 @@ def layout():
                                     html.Div(
                                         [
                                             html.Div(
-                                                create_radio_layout(
-                                                    "analysis-multi", "hs-group"
-                                                ),
-                                                className="tabs",
+                                                [
+                                                    html.Div(
+                                                        create_radio_layout(
+                                                            "analysis-multi", "hs-group"
+                                                        ),
+                                                        className="tabs",
+                                                    ),
+                                                ],
+                                                className="bare-container--flex--center twelve columns",
                                             ),
                                         ],
-                                        className="bare-container--flex--center twelve columns",
+                                        className="row",
                                     ),
-                                ],
-                                className="row",
-                            ),
-                            html.Div(
-                                [
                                     html.Div(
                                         [
                                             html.Div(
-                                                create_radio_layout(
-                                                    "analysis-multi", "subject", "six"
-                                                ),
-                                                className="tabs",
-                                            ),
-                                            html.Div(
-                                                create_radio_layout(
-                                                    "analysis-multi", "category", "six"
-                                                ),
-                                                className="tabs",
+                                                [
+                                                    html.Div(
+                                                        create_radio_layout(
+                                                            "analysis-multi", "subject", "six"
+                                                        ),
+                                                        className="tabs",
+                                                    ),
+                                                    html.Div(
+                                                        create_radio_layout(
+                                                            "analysis-multi", "category", "six"
+                                                        ),
+                                                        className="tabs",
+                                                    ),
+                                                ],
+                                                className="bare-container--flex--center_subnav twelve columns",
                                             ),
                                         ],
-                                        className="bare-container--flex--center_subnav twelve columns",
+                                        className="row",
                                     ),
-                                ],
-                                className="row",
-                            ),
-                            html.Div(
-                                [
                                     html.Div(
                                         [
                                             html.Div(
-                                                create_radio_layout(
-                                                    "analysis-multi", "subcategory"
-                                                ),
-                                                className="tabs",
+                                                [
+                                                    html.Div(
+                                                        create_radio_layout(
+                                                            "analysis-multi", "subcategory"
+                                                        ),
+                                                        className="tabs",
+                                                    ),
+                                                ],
+                                                className="bare-container--flex--center twelve columns",
                                             ),
                                         ],
-                                        className="bare-container--flex--center twelve columns",
+                                        className="row",
                                     ),
                                 ],
-                                className="row",
+                                id="analysis-multi-navigation-container",
                             ),
                         ],
                         id="analysis-navigation-container",
@@ -0,0 +1,148 @@
+###########################################
+# ICSB Dashboard - Data Backend Benchmark #
+###########################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Compares the sqlite and snapshot (Parquet, see pages/snapshot.py) backends
+# on the loaders behind the heaviest callbacks (academic information, metrics,
+# and analysis pages and attendance). "cold" is the first call after the
+# backend is opened (new connections / datasets, empty query and academic data
+# caches - the OS file cache is not dropped); "warm" is the average of repeated
+# calls with the backend open and the app caches emptied before each call, so
+# both measure the storage reads. Also checks that both backends return the
+# same data. Run from the app directory (requires pyarrow):
+#
+#   python benchmark_data_backends.py              # DATABASE_PATH / SNAPSHOT_PATH
+#   python benchmark_data_backends.py --synthetic  # generated (typed) database
+#
+# The snapshot is exported first if there is none at SNAPSHOT_PATH.
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+repeat = 10
+
+
+def heavy_calls(load_data):
+    """
+    Returns (name, function) pairs for the loaders behind the heaviest callbacks.
+    """
+    year = str(load_data.current_academic_year)
+
+    k8_schools = load_data.get_school_coordinates(int(year), "K8")["School ID"]
+    hs_schools = load_data.get_school_coordinates(int(year), "HS")["School ID"]
+
+    k8 = str(k8_schools.iloc[0])
+    hs = str(hs_schools.iloc[0])
+    k8_list = [str(s) for s in k8_schools.iloc[:20]]
+
+    return [
+        ("academic_information (K8)", lambda: load_data.get_academic_data([k8], "K8", year, "info")),
+        ("academic_metrics (K8)", lambda: load_data.get_academic_data([k8], "K8", year, "metrics")),
+        ("academic_analysis (K8)", lambda: load_data.get_academic_data(k8_list, "K8", year, "analysis")),
+        ("academic_metrics (HS)", lambda: load_data.get_academic_data([hs], "HS", year, "metrics")),
+        ("attendance (K8)", lambda: load_data.get_attendance_data(k8, "K8", year)),
+    ]
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(a, b, check_dtype=False)
+        except AssertionError:
+            return False
+        return True
+
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+
+    return a == b
+
+
+def _clear(load_data):
+    load_data.clear_query_cache()
+    load_data.clear_academic_data_cache()
+
+
+def measure(load_data, backend, calls) -> dict:
+    """
+    Returns:
+        dict: name -> (cold seconds, warm seconds, result)
+    """
+    results = {}
+
+    for name, call in calls:
+        load_data.engine.dispose()
+        load_data.use_data_backend(backend)
+        _clear(load_data)
+
+        start = time.perf_counter()
+        result = call()
+        cold = time.perf_counter() - start
+
+        warm = 0.0
+        for _ in range(repeat):
+            _clear(load_data)
+            start = time.perf_counter()
+            call()
+            warm += time.perf_counter() - start
+
+        results[name] = (cold, warm / repeat, result)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sqlite and snapshot backends.")
+    parser.add_argument(
+        "--synthetic", action="store_true", help="use a generated (typed) database"
+    )
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from migrate_database import create_synthetic_database
+
+        directory = tempfile.mkdtemp()
+        os.environ["DATABASE_PATH"] = os.path.join(directory, "synthetic_schools.db")
+        os.environ["SNAPSHOT_PATH"] = os.path.join(directory, "snapshot")
+        create_synthetic_database(os.environ["DATABASE_PATH"])
+
+    from pages import load_data
+    from pages.snapshot import snapshot_version
+
+    if args.synthetic:
+        load_data.create_database_indexes()
+        load_data.convert_to_typed_schema()
+
+    if snapshot_version(load_data.snapshot_path) is None:
+        load_data.export_data_snapshot()
+
+    calls = heavy_calls(load_data)
+
+    sqlite = measure(load_data, "sqlite", calls)
+    snapshot = measure(load_data, "snapshot", calls)
+
+    load_data.use_data_backend("sqlite")
+
+    print("{:<28}{:>14}{:>14}{:>14}{:>14}  {}".format(
+        "", "sqlite cold", "snapshot cold", "sqlite warm", "snapshot warm", "results"
+    ))
+
+    for name, _ in calls:
+        s_cold, s_warm, s_result = sqlite[name]
+        a_cold, a_warm, a_result = snapshot[name]
+
+        print("{:<28}{:>12.1f}ms{:>12.1f}ms{:>12.1f}ms{:>12.1f}ms  {}".format(
+            name, s_cold * 1000, a_cold * 1000, s_warm * 1000, a_warm * 1000,
+            "match" if _same(s_result, a_result) else "DIFFER",
+        ))
+
+
+if __name__ == "__main__":
+    main()
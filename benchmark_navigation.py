@@ -0,0 +1,366 @@
+#########################################
+# ICSB Dashboard - Navigation Benchmark #
+#########################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Counts the callbacks and database queries behind each user action (initial
+# load, page changes, school/year changes, and radio clicks). The actions are
+# replayed against the app's own /_dash-update-component endpoint the way the
+# browser does: a changed property fires every callback with that property as
+# an Input (once all of the Inputs, States, and Outputs are in the layout),
+# the returned properties fire the next callbacks, and new page content fires
+# the callbacks of the new components. Queries are the statements run on the
+# data engine (the query and academic data caches are emptied before each
+# action; the callback output cache is off). Clientside callbacks are counted,
+# but run in the browser, and background callbacks are counted, but not run.
+# Run from the app directory:
+#
+#   python benchmark_navigation.py              # DATABASE_PATH
+#   python benchmark_navigation.py --synthetic  # generated database
+#   python benchmark_navigation.py --verbose    # list the callbacks
+
+import argparse
+import os
+import tempfile
+from collections import Counter
+
+base_url = "http://localhost"
+
+
+def _walk(component, found: dict):
+    """
+    Adds {id: props} for every component (with a string id) in a layout.
+    """
+    if isinstance(component, list):
+        for c in component:
+            _walk(c, found)
+
+    elif isinstance(component, dict) and "props" in component:
+        props = component["props"]
+
+        if isinstance(props.get("id"), str):
+            found[props["id"]] = {k: v for k, v in props.items() if k != "children"}
+
+        for value in props.values():
+            if isinstance(value, (list, dict)):
+                _walk(value, found)
+
+
+class BrowserSession:
+    """
+    A logged in browser: the component properties in the layout, and the
+    callbacks fired by each change.
+
+    Args:
+        app_module: the app (app.py)
+        user_id (int): the users.db login (0 is admin)
+    """
+
+    def __init__(self, app_module, user_id: int = 0):
+        from dash._callback import GLOBAL_CALLBACK_LIST
+        from dash._utils import split_callback_id
+
+        self.client = app_module.server.test_client()
+
+        with self.client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+
+        self.layout = self.client.get("/_dash-layout").get_json()
+        self.callbacks = {}
+
+        for spec in GLOBAL_CALLBACK_LIST + app_module.app._callback_list:
+            key = spec["output"]
+            outputs = split_callback_id(key)
+
+            self.callbacks[key] = dict(
+                outputs=outputs if isinstance(outputs, list) else [outputs],
+                inputs=spec["inputs"],
+                state=spec["state"],
+                initial=not spec.get("prevent_initial_call"),
+                clientside=spec.get("clientside_function") is not None,
+                background=bool(spec.get("long")),
+            )
+
+        self.components = {}
+        self.subtrees = {}
+        self.errors = Counter()
+        _walk(self.layout, self.components)
+
+    def _present(self, callback) -> bool:
+        return all(
+            c["id"] in self.components
+            for c in callback["inputs"] + callback["state"] + callback["outputs"]
+        )
+
+    def _triggered(self, changed: set, skip=None) -> dict:
+        """
+        Returns:
+            dict: callback key -> changed inputs ("id.property"), for the
+            callbacks with any of the [changed] (id, property) as an Input
+        """
+        fired = {}
+
+        for key, callback in self.callbacks.items():
+            if key == skip or not self._present(callback):
+                continue
+
+            hits = {
+                i["id"] + "." + i["property"] for i in callback["inputs"]
+                if (i["id"], i["property"]) in changed
+            }
+
+            if hits:
+                fired[key] = hits
+
+        return fired
+
+    def _insert(self, parent: str, children) -> dict:
+        """
+        Replaces the components below [parent] with [children].
+
+        Returns:
+            dict: the initial callbacks of the new components
+        """
+        for old in self.subtrees.pop(parent, ()):
+            self.components.pop(old, None)
+
+        found = {}
+        _walk(children, found)
+
+        self.subtrees[parent] = set(found)
+        self.components.update(found)
+
+        fired = {}
+
+        for key, callback in self.callbacks.items():
+            ids = {c["id"] for c in callback["inputs"] + callback["outputs"]}
+
+            if callback["initial"] and ids & set(found) and self._present(callback):
+                fired[key] = set()
+
+        return fired
+
+    def _value(self, item):
+        return self.components[item["id"]].get(item["property"])
+
+    def _request(self, key: str, changed: set) -> dict:
+        callback = self.callbacks[key]
+
+        payload = {
+            "output": key,
+            "outputs": callback["outputs"] if key.startswith("..") else callback["outputs"][0],
+            "inputs": [dict(i, value=self._value(i)) for i in callback["inputs"]],
+            "state": [dict(s, value=self._value(s)) for s in callback["state"]],
+            "changedPropIds": sorted(changed),
+        }
+
+        response = self.client.post("/_dash-update-component", json=payload)
+
+        # 204 is PreventUpdate
+        if response.status_code != 200:
+            if response.status_code != 204:
+                self.errors[key] += 1
+            return {}
+
+        return response.get_json().get("response", {})
+
+    def run(self, fired: dict) -> Counter:
+        """
+        Runs the [fired] callbacks and every callback that they trigger.
+
+        Returns:
+            Counter: callback key -> number of calls
+        """
+        calls = Counter()
+        pending = dict(fired)
+
+        while pending:
+            # wait for callbacks whose Outputs are Inputs of another pending callback
+            blocked = set()
+            for key in pending:
+                outputs = {(o["id"], o["property"]) for o in self.callbacks[key]["outputs"]}
+                for other in pending:
+                    if other != key and outputs & {
+                        (i["id"], i["property"]) for i in self.callbacks[other]["inputs"]
+                    }:
+                        blocked.add(other)
+
+            key = next((k for k in pending if k not in blocked), next(iter(pending)))
+            changed = pending.pop(key)
+            callback = self.callbacks[key]
+
+            # its components were removed (e.g., by a page change)
+            if not self._present(callback):
+                continue
+
+            calls[key] += 1
+
+            if callback["clientside"] or callback["background"]:
+                continue
+
+            updated = set()
+
+            for component, props in self._request(key, changed).items():
+                if component not in self.components:
+                    continue
+
+                for prop, value in props.items():
+                    self.components[component][prop] = value
+                    updated.add((component, prop))
+
+                    if prop == "children":
+                        for k, v in self._insert(component, value).items():
+                            pending.setdefault(k, set()).update(v)
+
+            for k, v in self._triggered(updated, skip=key).items():
+                pending.setdefault(k, set()).update(v)
+
+        return calls
+
+    def load(self, path: str) -> Counter:
+        """
+        The initial page load (every initial callback of the layout).
+        """
+        self._locate(path)
+
+        return self.run(
+            {
+                key: set() for key, callback in self.callbacks.items()
+                if callback["initial"] and self._present(callback)
+            }
+        )
+
+    def _locate(self, path: str) -> set:
+        changed = set()
+
+        for component, props in self.components.items():
+            if props.get("pathname") is not None or component in ("url", "_pages_location"):
+                props["href"] = base_url + path
+                props["pathname"] = path
+                props["search"] = ""
+                changed |= {(component, "href"), (component, "pathname"), (component, "search")}
+
+        return changed
+
+    def navigate(self, path: str) -> Counter:
+        """
+        Follows a link (a new url).
+        """
+        return self.run(self._triggered(self._locate(path)))
+
+    def select(self, component: str, prop: str, value) -> Counter:
+        """
+        Changes a component property (a dropdown or radio selection).
+        """
+        self.components[component][prop] = value
+
+        return self.run(self._triggered({(component, prop)}))
+
+
+def _name(key: str) -> str:
+    # the first output identifies the callback
+    return key.strip(".").split("...")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the callbacks and queries of each user action.")
+    parser.add_argument("--synthetic", action="store_true", help="use a generated database")
+    parser.add_argument("--verbose", action="store_true", help="list the callbacks of each action")
+    args = parser.parse_args()
+
+    os.environ["CALLBACK_CACHE"] = "off"
+    os.environ["DATA_RELOAD_INTERVAL"] = "0"
+    os.environ.setdefault("BACKGROUND_CALLBACK_PATH", tempfile.mkdtemp())
+
+    # the login is stored in the (signed) flask session
+    os.environ.setdefault("SECRET_KEY", os.urandom(24).hex())
+
+    if args.synthetic:
+        from migrate_database import create_synthetic_database
+
+        directory = tempfile.mkdtemp()
+        os.environ["DATABASE_PATH"] = os.path.join(directory, "synthetic_schools.db")
+        create_synthetic_database(os.environ["DATABASE_PATH"])
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    import app
+    from pages import load_data
+
+    queries = Counter()
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if conn.engine is load_data.engine:
+            queries["total"] += 1
+
+    # failed callbacks are counted (see errors), not logged
+    app.server.logger.disabled = True
+
+    browser = BrowserSession(app)
+
+    def action(name, call):
+        load_data.clear_query_cache()
+        load_data.clear_academic_data_cache()
+        queries.clear()
+        browser.errors.clear()
+
+        calls = call()
+        kinds = Counter()
+
+        for key, n in calls.items():
+            callback = browser.callbacks[key]
+            kinds["clientside" if callback["clientside"] else
+                  "background" if callback["background"] else "server"] += n
+
+        print("{:<40}{:>10}{:>12}{:>12}{:>10}{:>8}".format(
+            name, kinds["server"], kinds["clientside"], kinds["background"],
+            queries["total"], sum(browser.errors.values()),
+        ))
+
+        if args.verbose:
+            for key, n in sorted(calls.items(), key=lambda c: _name(c[0])):
+                print("    {:<60}{:>4}".format(_name(key)[:60], n))
+
+    print("{:<40}{:>10}{:>12}{:>12}{:>10}{:>8}".format(
+        "", "callbacks", "clientside", "background", "queries", "errors"
+    ))
+
+    action("load /about", lambda: browser.load("/about"))
+
+    schools = [o["value"] for o in browser.components["charter-dropdown"].get("options") or []]
+    year = browser.components["year-dropdown"].get("value")
+
+    action("open /academic_information", lambda: browser.navigate("/academic_information"))
+    action("select category (grade)", lambda: browser.select(
+        "academic-information-category-radio", "value", "grade"
+    ))
+    action("select category (iread)", lambda: browser.select(
+        "academic-information-category-radio", "value", "iread"
+    ))
+    action("open /academic_information_growth", lambda: browser.navigate("/academic_information_growth"))
+    action("open /academic_analysis_multiple_year", lambda: browser.navigate(
+        "/academic_analysis_multiple_year"
+    ))
+    action("select category (subgroup)", lambda: browser.select(
+        "analysis-multi-category-radio", "value", "Subgroup"
+    ))
+    action("select subject (math)", lambda: browser.select(
+        "analysis-multi-subject-radio", "value", "Math"
+    ))
+    action("select year", lambda: browser.select("year-dropdown", "value", str(int(year) - 1)))
+    action("open /academic_analysis_single_year", lambda: browser.navigate(
+        "/academic_analysis_single_year"
+    ))
+    action("select school", lambda: browser.select("charter-dropdown", "value", schools[-1]))
+    action("open /academic_metrics", lambda: browser.navigate("/academic_metrics"))
+    action("open /financial_information", lambda: browser.navigate("/financial_information"))
+    action("open /about", lambda: browser.navigate("/about"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#############################################
+# ICSB Dashboard - transpose_data Benchmark #
+#############################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Times transpose_data() for a full K8 school and a full HS school with five
+# years of data (every grade, ethnicity, and subgroup category) and compares
+# the keyed merge with the cross-merge & substring match it replaced. Does not
+# need the database:
+#
+#   python benchmark_transpose_data.py
+
+import timeit
+import numpy as np
+import pandas as pd
+
+from pages.globals import grades, ethnicity, subgroup
+from pages.process_data import transpose_data, category_key
+
+years = [2019, 2021, 2022, 2023, 2024]
+categories = ["Total"] + grades + ethnicity + subgroup + ["Male", "Female"]
+repeat = 20
+
+
+def school_frame(school_type: str) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+
+    data = {
+        "Year": years,
+        "School ID": ["1234"] * len(years),
+        "School Name": ["School"] * len(years),
+        "Corporation ID": ["5678"] * len(years),
+        "Corporation Name": ["Corporation"] * len(years),
+        "Low Grade": ["3"] * len(years),
+        "High Grade": ["8"] * len(years),
+    }
+
+    def add(column):
+        data[column] = rng.integers(1, 100, len(years)) / 100
+
+    for category in categories:
+        if school_type == "K8":
+            for subject in ["ELA", "Math"]:
+                add(category + "|" + subject + " Total Tested")
+                add(category + "|" + subject + " Proficient %")
+            add(category + "|IREAD Test N")
+            add(category + "|IREAD Proficient %")
+        else:
+            for subject in ["EBRW", "Math"]:
+                add(category + "|" + subject + " Total Tested")
+                add(category + "|" + subject + " At Benchmark")
+                add(category + "|" + subject + " Benchmark %")
+            add(category + "|Cohort Count")
+            add(category + "|Graduation Rate")
+
+    return pd.DataFrame(data)
+
+
+def legacy_merge(proficiency_data: pd.DataFrame, tested_data: pd.DataFrame):
+    # the cross-merge & substring match used by transpose_data() before the
+    # keyed merge
+    merged_data = proficiency_data.merge(tested_data, how="cross")
+
+    merged_data = merged_data.replace(
+        {
+            "Non English Language Learners": "Temp1",
+            "English Language Learners": "Temp2",
+        },
+        regex=True,
+    )
+
+    merged_data = merged_data[
+        [a in b for a, b in zip(merged_data["Substring"], merged_data["Category"])]
+    ]
+
+    return merged_data.replace(
+        {
+            "Temp1": "Non English Language Learners",
+            "Temp2": "English Language Learners",
+        },
+        regex=True,
+    )
+
+
+def keyed_merge(proficiency_data: pd.DataFrame, tested_data: pd.DataFrame):
+    proficiency_data = proficiency_data.assign(
+        Key=category_key(proficiency_data["Category"])
+    )
+    tested_data = tested_data.assign(Key=category_key(tested_data["Substring"]))
+
+    return proficiency_data.merge(tested_data, how="inner", on="Key")
+
+
+def merge_inputs(df: pd.DataFrame, school_type: str):
+    if school_type == "K8":
+        tested = df.filter(regex="Total Tested|Test N", axis=1).columns
+        substring_dict = {" Total Tested": "", " Test N": ""}
+    else:
+        tested = df.filter(regex="Total Tested|Cohort Count", axis=1).columns
+        substring_dict = {" Total Tested": "", r"\|Cohort Count": "|Graduation"}
+
+    proficiency = [c for c in df.columns if "|" in c and c not in tested]
+
+    tested_data = pd.DataFrame(
+        {"Substring": pd.Series(tested).replace(substring_dict, regex=True)}
+    )
+    proficiency_data = pd.DataFrame({"Category": proficiency})
+
+    for year in years:
+        tested_data[str(year)] = np.arange(len(tested_data))
+        proficiency_data[str(year)] = np.arange(len(proficiency_data))
+
+    return proficiency_data, tested_data
+
+
+def main():
+    for school_type in ["K8", "HS"]:
+        df = school_frame(school_type)
+        params = {"type": school_type}
+
+        proficiency_data, tested_data = merge_inputs(df, school_type)
+
+        legacy = timeit.timeit(
+            lambda: legacy_merge(proficiency_data, tested_data), number=repeat
+        ) / repeat
+        keyed = timeit.timeit(
+            lambda: keyed_merge(proficiency_data, tested_data), number=repeat
+        ) / repeat
+        total = timeit.timeit(lambda: transpose_data(df, params), number=repeat) / repeat
+
+        print(
+            school_type + " (" + str(len(proficiency_data)) + " x "
+            + str(len(tested_data)) + " categories): cross-merge "
+            + "{:.1f}".format(legacy * 1000) + "ms, keyed merge "
+            + "{:.1f}".format(keyed * 1000) + "ms ("
+            + "{:.0f}".format(legacy / keyed) + "x), transpose_data "
+            + "{:.1f}".format(total * 1000) + "ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+##########################################
+# ICSB Dashboard - Comparison School Job #
+##########################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Precomputes the comparison school lists used by the academic analysis pages
+# (closest schools with sufficient grade span overlap, for every school, year,
+# and school type) and stores them in the comparison_schools table. Also
+# rebuilds the academic_facts, state aggregate, and school_stns tables and
+# creates any missing indexes (see migrate_database.py). Run this from the app
+# directory any time academic data is added to the database:
+#
+#   python build_comparison_schools.py
+#
+# Any school/year/type not in the table is computed live by the app.
+
+import time
+
+from pages.load_data import (
+    build_comparison_schools_table, build_academic_facts_table,
+    build_state_aggregate_tables, build_school_stns_table, create_database_indexes
+)
+
+
+def main():
+    start = time.time()
+
+    create_database_indexes()
+
+    facts = build_academic_facts_table()
+
+    build_state_aggregate_tables()
+
+    build_school_stns_table()
+
+    count = build_comparison_schools_table()
+
+    print(
+        "Wrote " + str(facts) + " rows to academic_facts and "
+        + str(count) + " rows to comparison_schools in "
+        + "{:.1f}".format(time.time() - start) + "s"
+    )
+
+
+if __name__ == "__main__":
+    main()
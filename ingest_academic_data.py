@@ -0,0 +1,437 @@
+############################################
+# ICSB Dashboard - Academic Data Ingestion #
+############################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Adds updated IDOE academic files to the database. Drop the csv files into
+# data/incoming (named for the table they belong to, e.g.,
+# academic_data_k8_2024.csv, or use --table) and run from the app directory:
+#
+#   python ingest_academic_data.py                 # load data/incoming/*.csv
+#   python ingest_academic_data.py --dry-run       # validate only
+#   python ingest_academic_data.py --table academic_data_hs grad_2024.csv
+#
+# Each file is read in chunks. Headers are matched to the table columns
+# ignoring case, spaces, and punctuation (so "Grade 3|ELA Total Tested" and the
+# headers the app displays both map to "Grade3|ELATotalTested"). Every value
+# is checked against the column type: category columns may only hold numbers,
+# "***", or blanks. The rows of every (school, year) in a file replace the
+# existing rows for that (school, year) and nothing else; all files are
+# loaded in a single transaction, so either all of them are loaded or none
+# are. The academic_facts tables are updated for the same (school, year)
+# pairs, and comparison_schools rows for the affected years are removed (the
+# app computes them live until build_comparison_schools.py is run again). The
+# state aggregate tables are rebuilt after the files are loaded.
+# Files loaded from a folder are moved to its processed subfolder.
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from pages.load_data import (
+    database_path, academic_fact_sources, suppression_mask_column, split_academic_column,
+    _get_academic_facts, build_state_aggregate_tables
+)
+from pages.suppressed import pack_suppression_mask
+
+incoming_path = "data/incoming"
+chunk_size = 5000
+
+# headers IDOE uses for the key columns -> table column
+header_aliases = {
+    "idoeschoolid": "SchoolID",
+    "schoolnumber": "SchoolID",
+    "idoecorporationid": "CorporationID",
+    "corpid": "CorporationID",
+    "corporationnumber": "CorporationID",
+    "schoolyear": "Year",
+}
+
+comparison_school_types = {
+    "academic_data_k8": ["K8"],
+    "academic_data_hs": ["HS", "AHS"],
+}
+
+
+class IngestError(Exception):
+    pass
+
+
+def header_key(header: str) -> str:
+    return re.sub(r"[^a-z0-9|%&]", "", str(header).lower())
+
+
+def map_headers(headers, columns) -> dict:
+    """
+    Returns:
+        dict: file header -> table column (None for headers with no match)
+    """
+    keys = {header_key(c): c for c in columns}
+    keys.update({k: v for k, v in header_aliases.items() if v in columns})
+
+    return {h: keys.get(header_key(h)) for h in headers}
+
+
+def get_table_schema(conn, table) -> dict:
+    """
+    Returns:
+        dict: column -> True if the column has numeric (INTEGER, REAL, or
+        NUMERIC) affinity, in table order
+    """
+    rows = conn.execute('PRAGMA table_info("{}")'.format(table)).fetchall()
+
+    # (cid, name, type, notnull, default, pk) - sqlite affinity rules
+    return {
+        row[1]: bool(re.search("INT|REAL|FLOA|DOUB|NUM|DEC", row[2].upper()))
+        for row in rows
+    }
+
+
+def validate_chunk(chunk, schema, id_column, typed):
+    """
+    Vectorized checks of a chunk of (string) values. chunk.index is the row
+    number in the file.
+
+    Returns:
+        tuple: (values, suppressed, errors) - values has None for blanks,
+        numbers for numeric columns, and stripped strings otherwise (category
+        columns of untyped tables keep "***", sqlite stores the numbers as
+        numbers); suppressed is a boolean frame of the "***" cells of category
+        columns; errors is a list of messages
+    """
+    errors = []
+
+    text = chunk.apply(lambda s: s.str.strip())
+    blank = text == ""
+
+    categories = [c for c in text.columns if split_academic_column(c) is not None]
+
+    suppressed = (text == "***") & pd.Series(
+        [c in categories for c in text.columns], index=text.columns
+    )
+
+    values = text.where(~blank, None)
+
+    for col in text.columns:
+        numeric_type = schema[col]
+
+        if not (col in categories or numeric_type or col in (id_column, "Year")):
+            continue
+
+        cleaned = text[col].str.replace(",", "", regex=False)
+        numbers = pd.to_numeric(cleaned, errors="coerce")
+        invalid = numbers.isna() & ~blank[col] & ~suppressed[col]
+
+        if invalid.any():
+            errors.append(
+                col + ": " + str(int(invalid.sum())) + " invalid values (e.g., '"
+                + text[col][invalid].iloc[0] + "' on line "
+                + str(int(invalid[invalid].index[0]) + 2) + ")"
+            )
+
+        if numeric_type and (typed or col not in categories):
+            values[col] = numbers.astype(object).where(numbers.notna(), None)
+        else:
+            values[col] = cleaned.where(~blank[col], None)
+
+    for col in (id_column, "Year"):
+        missing = pd.to_numeric(values[col], errors="coerce").isna()
+
+        if missing.any():
+            errors.append(
+                col + ": missing on " + str(int(missing.sum())) + " rows (e.g., line "
+                + str(int(missing[missing].index[0]) + 2) + ")"
+            )
+
+    return values, suppressed, errors
+
+
+def _table_exists(conn, table) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _executemany(conn, sql, frame):
+    conn.executemany(
+        sql,
+        (
+            tuple(None if (isinstance(v, float) and np.isnan(v)) else v for v in row)
+            for row in frame.itertuples(index=False, name=None)
+        ),
+    )
+
+
+def ingest_file(conn, path, table, add_columns, state):
+    """
+    Validates and loads one file (inside the caller's transaction).
+
+    Returns:
+        tuple: (rows, list of (id, year) partitions)
+    """
+    id_column = academic_fact_sources[table][0]
+
+    schema = get_table_schema(conn, table)
+    typed = suppression_mask_column in schema
+
+    reader = pd.read_csv(
+        path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding="utf-8-sig"
+    )
+
+    rows = 0
+    partitions = []
+    start_row = 0
+
+    for chunk in reader:
+        if start_row == 0:
+            mapping = map_headers(chunk.columns, [c for c in schema if c != suppression_mask_column])
+
+            unknown = [h for h, c in mapping.items() if c is None]
+            new_columns = [h for h in unknown if split_academic_column(header_key(h)) is not None]
+
+            if unknown and not (add_columns and len(new_columns) == len(unknown)):
+                raise IngestError(
+                    "unknown columns: " + ", ".join(unknown)
+                    + ("" if add_columns else " (new category columns can be added with --add-columns)")
+                )
+
+            # new category columns keep the file's header (minus spaces)
+            for header in new_columns:
+                column = re.sub(r"\s", "", header)
+                conn.execute(
+                    'ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(
+                        table, column, "REAL" if typed else "TEXT"
+                    )
+                )
+                schema[column] = typed
+                mapping[header] = column
+
+            duplicates = pd.Series(list(mapping.values())).duplicated()
+            if duplicates.any():
+                raise IngestError(
+                    "more than one header maps to " + ", ".join(
+                        pd.Series(list(mapping.values()))[duplicates].tolist()
+                    )
+                )
+
+            for required in (id_column, "Year"):
+                if required not in mapping.values():
+                    raise IngestError("no " + required + " column")
+
+        chunk = chunk.rename(columns=mapping)
+        chunk.index = range(start_row, start_row + len(chunk.index))
+
+        values, suppressed, errors = validate_chunk(chunk, schema, id_column, typed)
+
+        if errors:
+            raise IngestError("; ".join(errors))
+
+        values[id_column] = values[id_column].astype(float).astype(int)
+        values["Year"] = values["Year"].astype(float).astype(int)
+
+        keys = list(dict.fromkeys(zip(values[id_column], values["Year"])))
+
+        # replace the rows for each (school, year) - only the first time it is
+        # seen in this run, so rows from earlier chunks/files are kept
+        new_keys = [k for k in keys if (table, k) not in state["replaced"]]
+
+        conn.executemany(
+            'DELETE FROM "{}" WHERE "{}" = ? AND Year = ?'.format(table, id_column), new_keys
+        )
+        state["replaced"].update((table, k) for k in new_keys)
+
+        columns = list(values.columns)
+        insert = values
+
+        if typed:
+            if "positions" not in state:
+                rows_ = conn.execute("SELECT Position, ColumnName FROM suppressed_columns")
+                state["positions"] = {name: int(position) for position, name in rows_}
+
+            positions = state["positions"]
+            flagged = [c for c in columns if suppressed[c].any()]
+
+            for col in flagged:
+                if col not in positions:
+                    positions[col] = len(positions)
+                    conn.execute(
+                        "INSERT INTO suppressed_columns (Position, ColumnName) VALUES (?, ?)",
+                        (positions[col], col),
+                    )
+
+            mask = np.zeros((len(values.index), len(positions)), dtype=bool)
+            for col in flagged:
+                mask[:, positions[col]] = suppressed[col].to_numpy(dtype=bool)
+
+            insert = values.assign(**{suppression_mask_column: pack_suppression_mask(mask)})
+            columns = columns + [suppression_mask_column]
+
+        _executemany(
+            conn,
+            'INSERT INTO "{}" ({}) VALUES ({})'.format(
+                table, ", ".join('"' + c + '"' for c in columns), ", ".join("?" * len(columns))
+            ),
+            insert[columns],
+        )
+
+        # academic_facts are built from the "***" form of the values
+        if state["facts"]:
+            facts_data = values.copy()
+            for col in columns:
+                if col in suppressed.columns and suppressed[col].any():
+                    facts_data[col] = facts_data[col].where(~suppressed[col], "***")
+
+            for missing in ("SchoolType", "LowGrade", "HighGrade", academic_fact_sources[table][1]):
+                if missing not in facts_data.columns:
+                    facts_data[missing] = None
+
+            entities, facts = _get_academic_facts(table, facts_data)
+
+            for derived in ("academic_facts", "academic_fact_entities"):
+                conn.executemany(
+                    "DELETE FROM {} WHERE Source = ? AND ID = ? AND Year = ?".format(derived),
+                    [(table,) + k for k in new_keys],
+                )
+
+            _executemany(
+                conn,
+                "INSERT INTO academic_fact_entities ({}) VALUES ({})".format(
+                    ", ".join(entities.columns), ", ".join("?" * len(entities.columns))
+                ),
+                entities,
+            )
+            _executemany(
+                conn,
+                "INSERT INTO academic_facts ({}) VALUES ({})".format(
+                    ", ".join(facts.columns), ", ".join("?" * len(facts.columns))
+                ),
+                facts,
+            )
+
+        rows += len(values.index)
+        partitions.extend(new_keys)
+        start_row += len(chunk.index)
+
+    return rows, partitions
+
+
+def _file_table(path, table):
+    if table:
+        return table
+
+    name = os.path.basename(path)
+
+    for candidate in sorted(academic_fact_sources, key=len, reverse=True):
+        if name.startswith(candidate):
+            return candidate
+
+    raise IngestError(
+        "cannot tell which table " + name + " belongs to (name it after the table or use --table)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load IDOE academic csv files into the database.")
+    parser.add_argument("files", nargs="*", help="csv files or folders (default: " + incoming_path + ")")
+    parser.add_argument("--table", choices=list(academic_fact_sources), help="table for all files")
+    parser.add_argument("--dry-run", action="store_true", help="validate without saving")
+    parser.add_argument(
+        "--add-columns", action="store_true", help="add new category columns to the table"
+    )
+    args = parser.parse_args()
+
+    # files found in a folder are moved to [folder]/processed once loaded
+    paths = []
+    folders = {}
+    for item in args.files or [incoming_path]:
+        if os.path.isdir(item):
+            for path in sorted(glob.glob(os.path.join(item, "*.csv"))):
+                paths.append(path)
+                folders[path] = item
+        else:
+            paths.append(item)
+
+    if not paths:
+        print("no csv files to load")
+        return
+
+    start = time.time()
+
+    conn = sqlite3.connect(database_path, isolation_level=None)
+
+    state = {"replaced": set(), "facts": _table_exists(conn, "academic_facts")}
+    affected = {}
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+
+        for path in paths:
+            table = _file_table(path, args.table)
+
+            try:
+                rows, partitions = ingest_file(conn, path, table, args.add_columns, state)
+            except (IngestError, ValueError) as e:
+                raise IngestError(os.path.basename(path) + ": " + str(e))
+
+            affected.setdefault(table, set()).update(partitions)
+
+            print(
+                os.path.basename(path) + ": " + str(rows) + " rows, "
+                + str(len(set(partitions))) + " (id, year) partitions -> " + table
+            )
+
+        years = set(
+            (table, year) for table, keys in affected.items() for _, year in keys
+            if table in comparison_school_types
+        )
+
+        if years and _table_exists(conn, "comparison_schools"):
+            conn.executemany(
+                "DELETE FROM comparison_schools WHERE Year = ? AND SchoolType = ?",
+                [(year, t) for table, year in years for t in comparison_school_types[table]],
+            )
+
+        if args.dry_run:
+            conn.execute("ROLLBACK")
+            print("dry run - nothing saved")
+        else:
+            conn.execute("COMMIT")
+
+    except IngestError as e:
+        conn.execute("ROLLBACK")
+        print("error: " + str(e) + " - nothing saved")
+        sys.exit(1)
+
+    finally:
+        conn.close()
+
+    if args.dry_run:
+        return
+
+    # the state aggregates are computed from academic_data_hs
+    if "academic_data_hs" in affected:
+        build_state_aggregate_tables()
+
+    for path, folder in folders.items():
+        processed = os.path.join(folder, "processed")
+        os.makedirs(processed, exist_ok=True)
+        shutil.move(path, os.path.join(processed, os.path.basename(path)))
+
+    print("Loaded " + str(len(paths)) + " files in " + "{:.1f}".format(time.time() - start) + "s")
+
+    if years:
+        print("Run build_comparison_schools.py to update comparison schools for the new data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,561 @@
+###################################################
+# ICSB Dashboard - Database Indexes & Query Audit #
+###################################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# Creates and verifies the indexes in load_data.database_indexes and audits
+# the queries issued by load_data: every loader is called with sample
+# arguments, each SELECT sent to sqlite is captured, and EXPLAIN QUERY PLAN
+# is used to report any full table scan. Run from the app directory:
+#
+#   python migrate_database.py migrate            # create & verify indexes
+#   python migrate_database.py verify             # verify indexes only
+#   python migrate_database.py typed              # convert to typed schema
+#   python migrate_database.py facts              # build academic_facts
+#   python migrate_database.py snapshot           # export Parquet snapshot
+#   python migrate_database.py audit              # query plan audit
+#   python migrate_database.py audit --synthetic  # audit a generated db (CI)
+#
+# --synthetic builds a small database with the same tables and key columns as
+# indiana_schools.db in a temporary directory, migrates it, and audits it, so
+# it does not need the real data (add --typed to convert it to the typed
+# schema first). The synthetic database also gets the academic_facts tables
+# (add --wide to audit the wide table queries instead). migrate/verify/audit
+# exit with status 1 if there are missing indexes or unexpected full table
+# scans.
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# load_data functions that read an entire table by design (school directory,
+# availability index, facts job, state graduation average and its table,
+# column name catalog):
+# function (or DatabaseSnapshot class) -> tables
+expected_scans = {
+    "SchoolDirectory": "school_index",
+    "AcademicAvailabilityIndex": "academic_data_k8|academic_data_hs",
+    "build_academic_facts_table": "(academic|corporation)_data_(k8|hs)",
+    "_get_state_graduation_averages": "academic_data_hs",
+    "_get_state_aggregate": "state_graduation_averages",
+    "SuppressedColumnRegistry": "suppressed_columns",
+    "ColumnNameCatalog": "sqlite_master",
+}
+
+sample_years = [2022, 2023]
+
+k8_schools = [(1001, "K8"), (1004, "K8"), (1006, "K8")]
+hs_schools = [(1002, "HS"), (1005, "HS"), (1003, "AHS"), (1007, "AHS")]
+corporation_id = 5000
+
+grades = ["Grade3", "Grade4", "Grade5", "Grade6", "Grade7", "Grade8"]
+ethnicity = [
+    "AmericanIndian", "Asian", "Black", "Hispanic", "Multiracial",
+    "NativeHawaiianorOtherPacificIslander", "White",
+]
+subgroup = [
+    "PaidMeals", "FreeorReducedPriceMeals", "GeneralEducation", "SpecialEducation",
+    "EnglishLanguageLearners", "NonEnglishLanguageLearners",
+]
+
+
+def _academic_columns(school_type, rng):
+    """
+    Returns a dict of synthetic proficiency/tested values in the raw column
+    format of the academic tables (e.g., "Grade3|ELATotalTested").
+    """
+    columns = {}
+
+    def add(tested, passed, name):
+        total = int(rng.integers(20, 200))
+        columns[name + tested] = total
+        columns[name + passed] = int(rng.integers(0, total))
+
+    if school_type == "K8":
+        for category in ["Total"] + grades + ethnicity + subgroup:
+            for subject in ["ELA", "Math"]:
+                add(subject + "TotalTested", subject + "TotalProficient", category + "|")
+        for category in ["Total"] + ethnicity + subgroup:
+            add("IREADTestN", "IREADPassN", category + "|")
+    else:
+        for category in ["Total"] + ethnicity + subgroup:
+            for subject in ["EBRW", "Math"]:
+                add(subject + "TotalTested", subject + "AtBenchmark", category + "|")
+            add("CohortCount", "Graduates", category + "|")
+        add("CohortCount", "Graduates", "NonWaiver|")
+        add("GradAll", "CCR", "AHS|")
+
+    return columns
+
+
+def create_synthetic_database(path):
+    """
+    Writes a small database with every table (and the columns the loaders
+    filter and select on) that load_data queries.
+    """
+    rng = np.random.default_rng(0)
+
+    school_index = []
+    academic = {"K8": [], "HS": []}
+    corporation = {"K8": [], "HS": []}
+
+    for school_id, school_type in k8_schools + hs_schools:
+        school_index.append(
+            {
+                "SchoolID": school_id, "SchoolName": "School " + str(school_id),
+                "SchoolType": school_type, "Guest": "", "Network": "None",
+                "GEOCorp": corporation_id, "CorporationID": school_id + 100,
+                "GroupID": 1,
+            }
+        )
+
+    for year in sample_years:
+        for school_id, school_type in k8_schools + hs_schools:
+            table = "K8" if school_type == "K8" else "HS"
+            academic[table].append(
+                {
+                    "Year": year, "SchoolID": school_id,
+                    "SchoolName": "School " + str(school_id),
+                    "SchoolType": school_type, "CorporationID": school_id + 100,
+                    "CorporationName": "School " + str(school_id),
+                    "LowGrade": "3" if table == "K8" else "9",
+                    "HighGrade": "8" if table == "K8" else "12",
+                    "Lat": 39.7 + rng.random() / 10, "Lon": -86.1 + rng.random() / 10,
+                    "AttendanceRate": 0.9, "StudentsChronicallyAbsent": 10,
+                    "TotalStudentCount": 300,
+                    **_academic_columns(table, rng),
+                }
+            )
+
+        for table in ["K8", "HS"]:
+            corporation[table].append(
+                {
+                    "Year": year, "CorporationID": corporation_id,
+                    "CorporationName": "Corporation",
+                    "LowGrade": "KG", "HighGrade": "12",
+                    "AttendanceRate": 0.9, "StudentsChronicallyAbsent": 10,
+                    "TotalStudentCount": 3000,
+                    **_academic_columns(table, rng),
+                }
+            )
+
+    students = [(str(100000 + i), 1001) for i in range(20)]
+
+    tables = {
+        "school_index": pd.DataFrame(school_index),
+        "academic_data_k8": pd.DataFrame(academic["K8"]),
+        "academic_data_hs": pd.DataFrame(academic["HS"]),
+        "corporation_data_k8": pd.DataFrame(corporation["K8"]),
+        "corporation_data_hs": pd.DataFrame(corporation["HS"]),
+        "growth_data": pd.DataFrame(
+            [
+                {
+                    "TestYear": year, "MajorityEnrolledSchoolID": school_id,
+                    "STN": stn, "Subject": "ELA", "GradeLevel": "Grade 4",
+                    "Ethnicity": "White", "Day162": "True",
+                    "ILEARNGrowthLevel": "Adequate Growth",
+                }
+                for year in sample_years for stn, school_id in students
+            ]
+        ),
+        "ilearn_student": pd.DataFrame(
+            [
+                {
+                    "SchoolID": school_id, "STN": stn, "CurrentGrade": 4,
+                    "TestedGrade": 4, "ELAProficiency": "At Proficiency",
+                    "MathProficiency": "Below Proficiency",
+                }
+                for stn, school_id in students
+            ]
+        ),
+        "iread_student": pd.DataFrame(
+            [
+                {
+                    "SchoolID": school_id, "STN": stn, "TestYear": year,
+                    "TestedGrade": 3, "Status": "Pass" if int(stn) % 2 else "Did Not Pass",
+                    "ExemptionStatus": "",
+                }
+                for year in sample_years for stn, school_id in students
+            ]
+        ),
+        "WIDA": pd.DataFrame(
+            [
+                {"STN": stn, "Year": year, "Composite": 3.0}
+                for year in sample_years for stn, _ in students
+            ]
+        ),
+        "financial_data": pd.DataFrame(
+            [
+                {"SchoolID": school_id, "Category": category, "2023": 100.0, "2022": 100.0}
+                for school_id, _ in k8_schools + hs_schools
+                for category in ["ADM Average", "Total Revenue"]
+            ]
+        ),
+        "financial_ratios": pd.DataFrame(
+            [{"CorporationID": school_id + 100, "Year": 2023} for school_id, _ in k8_schools]
+        ),
+        "adm_all": pd.DataFrame(
+            [
+                {
+                    "CorporationID": school_id + 100, "2022Fall Non Virtual ADM": 300,
+                    "2023Spring Non Virtual ADM": 310, "2023Fall Non Virtual ADM": 320,
+                }
+                for school_id, _ in k8_schools + hs_schools
+            ]
+        ),
+        "demographic_data_corp": pd.DataFrame(
+            [
+                {"CorporationID": corporation_id, "Year": year, "StateGrade": "B",
+                 "FederalRating": "", "Total Enrollment": 3000}
+                for year in sample_years
+            ]
+        ),
+        "demographic_data_school": pd.DataFrame(
+            [
+                {"SchoolID": school_id, "Year": year, "Total Enrollment": 300}
+                for year in sample_years for school_id, _ in k8_schools + hs_schools
+            ]
+        ),
+    }
+
+    with sqlite3.connect(path) as conn:
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False)
+
+
+def loader_calls(load_data):
+    """
+    Returns (name, function) pairs that exercise every query in load_data.
+    The build_*_table jobs rewrite tables, so they are not called (the audit
+    must not change the database it reads).
+    """
+    k8, hs, ahs = "1001", "1002", "1003"
+    k8_list = [k8, "1004", "1006"]
+    year = str(sample_years[-1])
+    corp = str(k8_schools[0][0] + 100)
+
+    def snapshot(name):
+        def call():
+            getattr(load_data, name).reload()
+            getattr(load_data, name)._refresh()
+        return call
+
+    return [
+        ("get_current_year", load_data.get_current_year),
+        ("school_directory", snapshot("school_directory")),
+        ("academic_availability", snapshot("academic_availability")),
+        ("get_academic_growth_dropdown_years", lambda: load_data.get_academic_growth_dropdown_years(k8)),
+        ("get_financial_dropdown_years", lambda: load_data.get_financial_dropdown_years(k8, "financial_information")),
+        ("get_adm", lambda: load_data.get_adm(corp)),
+        ("get_graduation_data", load_data.get_graduation_data),
+        ("get_financial_data", lambda: load_data.get_financial_data(k8)),
+        ("get_financial_ratios", lambda: load_data.get_financial_ratios(corp)),
+        ("get_corp_demographic_data", lambda: load_data.get_corp_demographic_data(corporation_id)),
+        ("get_school_demographic_data", lambda: load_data.get_school_demographic_data(k8)),
+        ("get_letter_grades", lambda: load_data.get_letter_grades(corporation_id)),
+        ("get_school_stns", lambda: load_data.get_school_stns(k8)),
+        ("get_wida_student_data", lambda: load_data.get_wida_student_data(k8, year)),
+        ("get_iread_student_data", lambda: load_data.get_iread_student_data(k8, year)),
+        ("get_ilearn_student_data", lambda: load_data.get_ilearn_student_data(k8)),
+        ("get_student_level_ilearn", lambda: load_data.get_student_level_ilearn(k8, "ELA")),
+        ("get_ahs_averages", lambda: load_data.get_ahs_averages(year)),
+        ("get_attendance_data", lambda: [
+            load_data.get_attendance_data(school, school_type, year)
+            for school, school_type in [(k8, "K8"), (hs, "HS"), (corp, "corp_K8"), (corp, "corp_HS")]
+        ]),
+        ("get_proficiency_data", lambda: load_data.get_proficiency_data(k8)),
+        ("get_corporation_academic_data", lambda: load_data.get_corporation_academic_data(k8, "K8", year)),
+        ("get_growth_data", lambda: load_data.get_growth_data(k8, year)),
+        ("get_school_coordinates", lambda: [
+            load_data.get_school_coordinates(int(year), school_type)
+            for school_type in ["K8", "HS", "AHS"]
+        ]),
+        ("get_comparison_school_list", lambda: load_data.get_comparison_school_list(k8, year, "K8", 20)),
+        ("get_academic_data", lambda: [
+            load_data.get_academic_data(schools, school_type, year, page)
+            for schools, school_type in [([k8], "K8"), (k8_list, "K8"), ([hs], "HS"), ([ahs], "AHS")]
+            for page in ["info", "metrics", "analysis"]
+        ]),
+        ("get_year_over_year_data", lambda: [
+            load_data.get_year_over_year_data(school, comparisons, category, year, flag)
+            for school, comparisons, category, flag in [
+                (k8, k8_list[1:], "Total|ELA", "k8"),
+                (k8, k8_list[1:], "Total|IREAD", "k8"),
+                (hs, ["1005"], "Total|EBRW", "sat"),
+                (hs, ["1005"], "Total|", "grad"),
+            ]
+        ]),
+    ]
+
+
+def _query_source(load_data):
+    """
+    Returns the name of the innermost load_data function (or the class of the
+    DatabaseSnapshot being built) that issued the current query.
+    """
+    frame = sys._getframe()
+
+    while frame is not None:
+        if frame.f_globals.get("__name__") == load_data.__name__:
+            name = frame.f_code.co_name
+
+            if isinstance(frame.f_locals.get("self"), load_data.DatabaseSnapshot):
+                return type(frame.f_locals["self"]).__name__
+
+            if name not in ("run_query", "_execute_query", "_read_table", "_refresh"):
+                return name
+
+        frame = frame.f_back
+
+    return None
+
+
+def capture_queries(load_data):
+    """
+    Calls every loader and records each SELECT sent to sqlite.
+
+    Returns:
+        tuple: (list of (loader, function, sql), dict of loader -> exception)
+        where function is the load_data function that issued the query
+    """
+    from sqlalchemy import event
+
+    queries = []
+    errors = {}
+    current = {"loader": None}
+
+    def trace(statement):
+        if re.match(r"\s*(SELECT|WITH)\b", statement, re.IGNORECASE):
+            queries.append((current["loader"], _query_source(load_data), statement))
+
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(trace)
+
+    event.listen(load_data.engine, "connect", on_connect)
+
+    # start with fresh connections (so they are traced) and empty caches (so
+    # every query actually reaches the database)
+    load_data.engine.dispose()
+    load_data.clear_query_cache()
+    load_data.clear_academic_data_cache()
+
+    for name, call in loader_calls(load_data):
+        current["loader"] = name
+
+        try:
+            call()
+        except Exception as e:
+            errors[name] = e
+
+    event.remove(load_data.engine, "connect", on_connect)
+    load_data.engine.dispose()
+
+    return queries, errors
+
+
+def find_table_scans(load_data, queries):
+    """
+    Runs EXPLAIN QUERY PLAN for each captured query.
+
+    A "SCAN" step is a full table scan unless it only reads a covering index
+    or the rowid (a "SCAN ... USING INDEX" still visits every row).
+
+    Returns:
+        list: (function, table, plan detail, sql, expected) for each full scan
+    """
+    scans = []
+    seen = set()
+
+    with sqlite3.connect(load_data.database_path) as conn:
+        for _, function, sql in queries:
+            if (function, sql) in seen:
+                continue
+            seen.add((function, sql))
+
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+
+            for row in plan:
+                detail = row[-1]
+                match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+
+                if match and not re.search("COVERING INDEX|INTEGER PRIMARY KEY", detail):
+                    table = match.group(1)
+                    expected = bool(
+                        re.fullmatch(expected_scans.get(function, "$^"), table)
+                    )
+                    scans.append((function, table, detail, sql, expected))
+
+    return scans
+
+
+def migrate(load_data):
+    created = load_data.create_database_indexes()
+
+    for name in created:
+        print("created " + name)
+
+    return verify(load_data)
+
+
+def verify(load_data):
+    problems = load_data.verify_database_indexes()
+
+    for name, problem in problems.items():
+        print("index " + name + ": " + problem)
+
+    if not problems:
+        print(str(len(load_data.database_indexes)) + " indexes verified")
+
+    return not problems
+
+
+def typed(load_data):
+    converted = load_data.convert_to_typed_schema()
+
+    for table, count in converted.items():
+        print(table + ": " + str(count) + " typed columns")
+
+    return verify(load_data)
+
+
+def facts(load_data):
+    count = load_data.build_academic_facts_table()
+
+    print("academic_facts: " + str(count) + " rows")
+
+    return verify(load_data)
+
+
+def aggregates(load_data):
+    counts = load_data.build_state_aggregate_tables()
+
+    for table, count in counts.items():
+        print(table + ": " + str(count) + " rows")
+
+    return verify(load_data)
+
+
+def stns(load_data):
+    count = load_data.build_school_stns_table()
+
+    print("school_stns: " + str(count) + " rows")
+
+    return verify(load_data)
+
+
+def snapshot(load_data):
+    counts = load_data.export_data_snapshot()
+
+    print(
+        "exported " + str(len(counts)) + " tables (" + str(sum(counts.values()))
+        + " rows) to " + load_data.snapshot_path
+    )
+
+    return True
+
+
+def audit(load_data):
+    queries, errors = capture_queries(load_data)
+    scans = find_table_scans(load_data, queries)
+
+    print(
+        str(len(set(sql for *_, sql in queries))) + " distinct queries from "
+        + str(len(set(function for _, function, _ in queries))) + " functions"
+    )
+
+    for name, error in errors.items():
+        print("error: " + name + " did not complete (" + repr(error) + ")")
+
+    for function, table, detail, sql, expected in scans:
+        label = "expected scan" if expected else "FULL TABLE SCAN"
+        print(label + ": " + str(function) + ": " + detail)
+
+        if not expected:
+            print("    " + " ".join(sql.split()))
+
+    return not errors and all(expected for *_, expected in scans)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create and verify indexes and audit load_data query plans."
+    )
+    parser.add_argument(
+        "command", choices=[
+            "migrate", "verify", "typed", "facts", "aggregates", "stns", "snapshot", "audit"
+        ],
+    )
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="create, migrate, and use a synthetic database",
+    )
+    parser.add_argument(
+        "--typed",
+        action="store_true",
+        help="convert the synthetic database to the typed schema",
+    )
+    parser.add_argument(
+        "--wide",
+        action="store_true",
+        help="do not build the derived tables (academic_facts, state aggregates, "
+        "school_stns) for the synthetic database",
+    )
+    args = parser.parse_args()
+
+    # the synthetic database is written to a scratch directory, removed on exit
+    directory = None
+
+    if args.synthetic:
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "synthetic_schools.db")
+        create_synthetic_database(path)
+
+        # load_data creates its engine when it is imported
+        os.environ["DATABASE_PATH"] = path
+        os.environ["COMPARISON_CACHE_PATH"] = os.path.join(directory, "comparison_cache")
+
+    try:
+        from pages import load_data
+
+        if args.command == "typed" or (args.synthetic and args.typed):
+            ok = typed(load_data)
+        elif args.command == "migrate" or args.synthetic:
+            ok = migrate(load_data)
+        else:
+            ok = verify(load_data)
+
+        # facts are built from the (typed) wide tables
+        if args.command == "facts" or (args.synthetic and not args.wide):
+            ok = facts(load_data) and ok
+
+        if args.command == "aggregates" or (args.synthetic and not args.wide):
+            ok = aggregates(load_data) and ok
+
+        if args.command == "stns" or (args.synthetic and not args.wide):
+            ok = stns(load_data) and ok
+
+        if args.command == "snapshot":
+            ok = snapshot(load_data) and ok
+
+        if args.command == "audit":
+            ok = audit(load_data) and ok
+
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,13 +19,15 @@ from .globals import (
 )
 from .load_data import (
     get_excluded_years,
-    get_school_index,
+    school_directory,
     get_financial_data,
     get_corp_demographic_data,
     get_school_demographic_data,
     get_adm,
     get_attendance_data
 )
+
+from .callback_cache import cached_callback
 from .charts import loading_fig, no_data_fig_label, make_line_chart, make_demographics_bar_chart
 from .tables import no_data_table, no_data_page, create_key_table, create_single_header_table
 from .layouts import create_line_fig_layout
@@ -49,6 +51,7 @@ dash.register_page(__name__, path="/about", order=0, top_nav=True)
     Input("year-dropdown", "value"),
     Input("charter-dropdown", "value"),
 )
+@cached_callback()
 def update_about_page(year: str, school: str):
     if not school:
         raise PreventUpdate
@@ -58,9 +61,9 @@ def update_about_page(year: str, school: str):
     previous_year_numeric = selected_year_numeric - 1
     previous_year_string = str(previous_year_numeric)
 
-    selected_school = get_school_index(school)
-    selected_school_type = selected_school["School Type"].values[0]
-    selected_school_id = int(selected_school["School ID"].values[0])
+    selected_school = school_directory.get(school)
+    selected_school_type = selected_school.school_type
+    selected_school_id = int(selected_school.school_id)
 
     year_title = previous_year_string + "-" + selected_year_string[-2:]
     enroll_title = "Enrollment " + "(" + year_title + ")"
@@ -134,7 +137,7 @@ def update_about_page(year: str, school: str):
         empty_container = {"display": "none"}
 
         # Enrollment table
-        corp_id = str(selected_school["GEO Corp"].values[0])
+        corp_id = str(selected_school.geo_corp)
 
         corp_demographics = get_corp_demographic_data(corp_id)
         corp_demographics = corp_demographics.loc[
@@ -272,7 +275,7 @@ def update_about_page(year: str, school: str):
 
     if financial_data.empty:
 
-        adm_values = get_adm(int(selected_school["Corporation ID"].values[0]))
+        adm_values = get_adm(selected_school.corporation_id)
 
     else:
         financial_data = financial_data.drop(["School ID", "School Name"], axis=1)
@@ -11,10 +11,10 @@ from dash.exceptions import PreventUpdate
 import pandas as pd
 
 # import local functions
-from .load_data import get_school_index, get_year_over_year_data, get_school_coordinates
+from .load_data import school_directory, get_year_over_year_data, get_comparison_school_list
+from .callback_cache import background_job
 from .tables import no_data_page
-from .layouts import create_year_over_year_layout
-from .calculations import check_for_gradespan_overlap, calculate_comparison_school_list
+from .layouts import create_year_over_year_layout, create_loading_layout
 
 dash.register_page(
     __name__,
@@ -47,8 +47,8 @@ def set_dropdown_options(
     if input_trigger == "charter-dropdown":
         comparison_schools = []
 
-    selected_school = get_school_index(school_id)
-    school_type = selected_school["School Type"].values[0]
+    selected_school = school_directory.get(school_id)
+    school_type = selected_school.school_type
 
     # Get School ID, School Name, Lat & Lon for all schools in the set for selected year
     # SQL query depends on school type
@@ -58,35 +58,18 @@ def set_dropdown_options(
         else:
             school_type = "K8"
 
-    schools_by_distance = get_school_coordinates(numeric_year, school_type)
-
-    # Drop any school not testing at least 20 students. "Total|ELATotalTested" is a proxy
-    # for school size here (probably only impacts ~20 schools)
-    # the second condition ensures that the school is retained if it exists
-    if school_type == "K8":
-        schools_by_distance = schools_by_distance[
-            (schools_by_distance["Total|ELA Total Tested"] >= 20)
-            | (schools_by_distance["School ID"] == int(school_id))
-        ]
+    # Comparison schools must have at least a two grade overlap with the selected
+    # school (skipped for AHS - they don't have a gradespan in the technical sense)
+    # and K8 comparison schools must test at least 20 students ("Total|ELATotalTested"
+    # is a proxy for school size here - probably only impacts ~20 schools). Lists
+    # are precomputed (see build_comparison_schools_table())
+    comparison_list = get_comparison_school_list(school_id, numeric_year, school_type, 20)
 
     # If school doesn't exist
-    if int(school_id) not in schools_by_distance["School ID"].values:
+    if comparison_list is None:
         return [], [], []
 
     else:
-        # NOTE: Before we do the distance check, we reduce the size of the df removing
-        # schools where there is no or only one grade overlap between the comparison schools.
-        # the variable "overlap" is one less than the the number of grades that we want as a
-        # minimum (a value of "1" means a 2 grade overlap, "2" means 3 grade overlap, etc.).
-
-        # Skip this step for AHS (don't have a gradespan in the technical sense)
-        if school_type != "AHS":
-            schools_by_distance = check_for_gradespan_overlap(
-                school_id, schools_by_distance
-            )
- 
-        comparison_list = calculate_comparison_school_list(school_id, schools_by_distance, 20)
-
         # Set default display selections to all schools in the list
         default_options = [
             {"label": name, "value": id} for name, id in comparison_list.items()
@@ -155,8 +138,20 @@ def set_dropdown_options(
     Input("analysis-multi-hs-group-radio", "value"),
     [Input("analysis-multi-comparison-dropdown", "value")],
     State("analysis-multi-subcategory-radio", "value"),
+    background=True,
+    progress=Output("analysis-multi-progress", "children"),
+    running=[
+        (
+            Output("analysis-multi-loading-container", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("url", "href")],
 )
+@background_job()
 def update_academic_analysis_multiple_years(
+    set_progress,
     school: str,
     year: str,
     analysis_type_value: str,
@@ -170,9 +165,9 @@ def update_academic_analysis_multiple_years(
 
     string_year = year
 
-    selected_school = get_school_index(school)
-    school_type = selected_school["School Type"].values[0]
-    school_name = selected_school["School Name"].values[0]
+    selected_school = school_directory.get(school)
+    school_type = selected_school.school_type
+    school_name = selected_school.school_name
     school_name = school_name.strip()
 
     # this radio button doesn't always play nice for some reason
@@ -196,6 +191,8 @@ def update_academic_analysis_multiple_years(
     analysis__multi_notes_label = ""
     analysis__multi_notes_string = ""
 
+    set_progress("Loading year over year data for " + school_name + " . . .")
+
     if (
         school_type == "HS"
         or school_type == "AHS"
@@ -453,6 +450,7 @@ def update_academic_analysis_multiple_years(
 
 layout = html.Div(
     [
+        create_loading_layout("analysis-multi"),
         html.Div(
             [
                 html.Div(
@@ -521,7 +519,9 @@ layout = html.Div(
                 ),
             ],
             id="multi-academic-analysis-page",
-        )
+        ),
+        # runs the year over year navigation (see app.py)
+        dcc.Store(id="analysis-multi-page", data="academic_analysis_multiple_year"),
     ],
     id="main-container",
 )
@@ -6,7 +6,7 @@
 # date:     02/21/24
 
 import dash
-from dash import ctx, dcc, html, Input, Output, callback
+from dash import ctx, dcc, html, Input, Output, State, callback
 from dash.exceptions import PreventUpdate
 import pandas as pd
 
@@ -18,23 +18,24 @@ from .globals import (
 )
 
 from .load_data import (
-    current_academic_year,
-    get_school_index,
-    get_school_coordinates,
+    data_version,
+    school_directory,
+    get_comparison_school_list,
     get_ahs_averages,
     get_academic_data
 )
+from .callback_cache import background_job
 
-from .calculations import (
-    check_for_gradespan_overlap,
-    calculate_comparison_school_list
-)
+from .calculations import to_numeric_columns
 from .charts import no_data_fig_label, make_bar_chart, make_group_bar_chart
 from .tables import create_comparison_table, no_data_page, no_data_table
 
 from .layouts import (
+    barchart_layout_shape,
     create_barchart_layout,
+    create_loading_layout,
     create_hs_analysis_layout,
+    patch_barchart_layout,
 )
 
 from .string_helpers import (
@@ -67,7 +68,7 @@ def set_dropdown_options(
 ):
 
     if not year:
-        year = current_academic_year
+        year = data_version().current_academic_year
 
     string_year = year
     numeric_year = int(string_year)
@@ -79,8 +80,8 @@ def set_dropdown_options(
     if input_trigger == "charter-dropdown":
         existing_comparison_schools_list = []
 
-    selected_school = get_school_index(school_id)
-    selected_school_type = selected_school["School Type"].values[0]
+    selected_school = school_directory.get(school_id)
+    selected_school_type = selected_school.school_type
 
     # Get School ID, School Name, Lat & Lon for all schools in the
     # set for selected year. SQL query depends on school type
@@ -90,40 +91,26 @@ def set_dropdown_options(
         else:
             selected_school_type = "K8"
 
-    schools_by_distance = get_school_coordinates(numeric_year, selected_school_type)
-
-    # Drop any school not testing at least 20 students (k8 only- probably
-    # impacts ~20 schools). Using "Total|ELATotalTested" as a proxy for school size
-    if selected_school_type == "K8":
-        schools_by_distance["Total|ELA Total Tested"] = \
-            pd.to_numeric(schools_by_distance["Total|ELA Total Tested"], errors="coerce")
-        schools_by_distance = schools_by_distance[
-            schools_by_distance["Total|ELA Total Tested"] >= 20
-        ]
+    # Comparison schools must have at least a two grade overlap with the selected
+    # school (skipped for AHS - they don't have a 'gradespan' in the technical sense).
+    # K8 schools (both selected and comparison) must test at least 20 students - using
+    # "Total|ELATotalTested" as a proxy for school size (probably impacts ~20 schools).
+    # Lists are precomputed (see build_comparison_schools_table())
+    num_schools_to_display = 40
+
+    comparison_list = get_comparison_school_list(
+        school_id,
+        numeric_year,
+        selected_school_type,
+        num_schools_to_display,
+        check_school_tested=True,
+    )
 
-    # NOTE: There is some time cost for running the dropdown selection function (typically
-    # ~0.8 - 1.2s), so we want to exit out as early as possible if we know it isn't necessary
-    if int(school_id) not in schools_by_distance["School ID"].values:
+    # exit out early if the selected school is not in the set
+    if comparison_list is None:
         return [], [], []
 
     else:
-        # NOTE: Before we do the distance check, we reduce the size of the df by removing
-        # schools where there is no, or only a one grade overlap between the comparison schools.
-        # the variable "overlap" is one less than the the number of grades that we want as a
-        # minimum (a value of "1" means a 2 grade overlap, "2" means 3 grade overlap, etc.).
-
-        # Skip this step for AHS (don't have a 'gradespan' in the technical sense)
-        if selected_school_type != "AHS":
-            schools_by_distance = check_for_gradespan_overlap(
-                school_id, schools_by_distance
-            )
-
-        num_schools_to_display = 40
-
-        comparison_list = calculate_comparison_school_list(
-            school_id, schools_by_distance, num_schools_to_display
-        )
-
         # place new comparison schools into list of dicts
         new_comparison_schools = [
             {"label": name, "value": id} for name, id in comparison_list.items()
@@ -269,13 +256,27 @@ def set_dropdown_options(
     Output("hs-analysis-single-empty-container", "style"),
     Output("hs-analysis-single-no-data", "children"),
     Output("single-year-analysis-notes", "children"),
+    Output("analysis-single-chart-shapes", "data"),
     Input("charter-dropdown", "value"),
     Input("year-dropdown", "value"),
     Input("analysis-type-radio", "value"),
     [Input("analysis-single-comparison-dropdown", "value")],
+    State("analysis-single-chart-shapes", "data"),
+    background=True,
+    progress=Output("analysis-single-progress", "children"),
+    running=[
+        (
+            Output("analysis-single-loading-container", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("url", "href")],
 )
+@background_job()
 def update_academic_analysis_single_year(
-    school_id: str, year: str, analysis_type_value: str, comparison_school_list: list
+    set_progress, school_id: str, year: str, analysis_type_value: str, comparison_school_list: list,
+    chart_shapes_state: dict
 ):
     if not school_id:
         raise PreventUpdate
@@ -283,9 +284,9 @@ def update_academic_analysis_single_year(
     string_year = year
     numeric_year = int(string_year)
 
-    selected_school = get_school_index(school_id)
-    selected_school_type = selected_school["School Type"].values[0]
-    school_name = selected_school["School Name"].values[0]
+    selected_school = school_directory.get(school_id)
+    selected_school_type = selected_school.school_type
+    school_name = selected_school.school_name
     school_name = school_name.strip()
 
     # Radio buttons don't play nice
@@ -358,7 +359,9 @@ def update_academic_analysis_single_year(
             school_type = selected_school_type
 
         list_of_schools = [school_id] + comparison_school_list
+        set_progress("Loading data for " + str(len(list_of_schools)) + " schools . . .")
         raw_hs_analysis_data = get_academic_data(list_of_schools, school_type, numeric_year, "analysis")
+        set_progress("Building tables and charts . . .")
         
         hs_analysis_data = raw_hs_analysis_data.loc[
                 raw_hs_analysis_data["Year"] == numeric_year
@@ -378,10 +381,7 @@ def update_academic_analysis_single_year(
 
             # force all to numeric (this removes '***' strings) - we
             # later use NaN as a proxy
-            for col in hs_cols:
-                hs_analysis_data[col] = pd.to_numeric(
-                    hs_analysis_data[col], errors="coerce"
-                )
+            to_numeric_columns(hs_analysis_data, hs_cols)
 
             # # drop all columns where the row at school_name_idx has a NaN value
             school_name_idx = hs_analysis_data.index[
@@ -553,7 +553,9 @@ def update_academic_analysis_single_year(
             # add school_id first
             list_of_schools = [school_id] + comparison_school_list
 
+            set_progress("Loading data for " + str(len(list_of_schools)) + " schools . . .")
             raw_k8_analysis_data = get_academic_data(list_of_schools, school_type, numeric_year, "analysis")
+            set_progress("Building tables and charts . . .")
 
             k8_analysis_data = raw_k8_analysis_data.loc[
                     raw_k8_analysis_data["Year"] == numeric_year
@@ -572,10 +574,7 @@ def update_academic_analysis_single_year(
                 if col not in ["School Name", "School ID", "Low Grade", "High Grade"]
             ]
 
-            for col in numeric_columns:
-                k8_analysis_data[col] = pd.to_numeric(
-                    k8_analysis_data[col], errors="coerce"
-                )
+            to_numeric_columns(k8_analysis_data, numeric_columns)
 
             k8_analysis_data = k8_analysis_data.reset_index(drop=True)
 
@@ -1027,50 +1026,84 @@ def update_academic_analysis_single_year(
         )
     ]
 
+    charts = {
+        "fig14c": fig14c,
+        "fig14d": fig14d,
+        "fig_iread": fig_iread,
+        "fig16a1": fig16a1,
+        "fig16c1": fig16c1,
+        "fig16b1": fig16b1,
+        "fig16a2": fig16a2,
+        "fig16c2": fig16c2,
+        "fig16b2": fig16b2,
+        "grad_overview": grad_overview,
+        "grad_ethnicity": grad_ethnicity,
+        "grad_subgroup": grad_subgroup,
+        "sat_overview": sat_overview,
+        "sat_ethnicity_ebrw": sat_ethnicity_ebrw,
+        "sat_ethnicity_math": sat_ethnicity_math,
+        "sat_subgroup_ebrw": sat_subgroup_ebrw,
+        "sat_subgroup_math": sat_subgroup_math,
+    }
+
+    # if only the comparison schools have changed, the charts that are
+    # displayed with the same shape are patched rather than replaced
+    chart_shapes = {
+        "key": [school_id, string_year, analysis_type_value],
+        "shapes": {name: barchart_layout_shape(chart) for name, chart in charts.items()},
+    }
+
+    if chart_shapes_state and chart_shapes_state["key"] == chart_shapes["key"]:
+        for name, shape in chart_shapes["shapes"].items():
+            if shape and chart_shapes_state["shapes"].get(name) == shape:
+                charts[name] = patch_barchart_layout(charts[name])
+
     return (
         analysis_single_dropdown_container,
-        fig14c,
-        fig14d,
-        fig_iread,
-        fig16a1,
+        charts["fig14c"],
+        charts["fig14d"],
+        charts["fig_iread"],
+        charts["fig16a1"],
         fig16a1_container,
-        fig16c1,
+        charts["fig16c1"],
         fig16c1_container,
-        fig16b1,
+        charts["fig16b1"],
         fig16b1_container,
-        fig16a2,
+        charts["fig16a2"],
         fig16a2_container,
-        fig16c2,
+        charts["fig16c2"],
         fig16c2_container,
-        fig16b2,
+        charts["fig16b2"],
         fig16b2_container,
         k8_analysis_main_container,
         k8_analysis_empty_container,
         k8_analysis_no_data,
-        grad_overview,
+        charts["grad_overview"],
         grad_overview_container,
-        grad_ethnicity,
+        charts["grad_ethnicity"],
         grad_ethnicity_container,
-        grad_subgroup,
+        charts["grad_subgroup"],
         grad_subgroup_container,
-        sat_overview,
+        charts["sat_overview"],
         sat_overview_container,
-        sat_ethnicity_ebrw,
-        sat_ethnicity_math,
+        charts["sat_ethnicity_ebrw"],
+        charts["sat_ethnicity_math"],
         sat_ethnicity_container,
-        sat_subgroup_ebrw,
-        sat_subgroup_math,
+        charts["sat_subgroup_ebrw"],
+        charts["sat_subgroup_math"],
         sat_subgroup_container,
         hs_analysis_main_container,
         hs_analysis_empty_container,
         hs_analysis_no_data,
-        academic_analysis_notes
+        academic_analysis_notes,
+        chart_shapes,
     )
 
 
 def layout():
     return html.Div(
         [
+            create_loading_layout("analysis-single"),
             html.Div(
                 [
                     html.Div(
@@ -1242,7 +1275,9 @@ def layout():
                     ),
                 ],
                 id="single-academic-analysis-page",
-            )
+            ),
+            # the shapes of the displayed charts (see update_academic_analysis_single_year())
+            dcc.Store(id="analysis-single-chart-shapes"),
         ],
         id="main-container",
     )
@@ -8,7 +8,7 @@
 # TODO: Break down into three pages: ILEARN; IREAD; WIDA
 
 import dash
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, Input, Output, callback, clientside_callback
 from dash.exceptions import PreventUpdate
 import numpy as np
 import pandas as pd
@@ -27,15 +27,17 @@ from .globals import (
 )
 
 from .load_data import (
-    get_school_stns,
     get_iread_student_data,
     get_wida_student_data,
     get_proficiency_data,
-    get_school_index,
+    column_families,
+    school_directory,
     get_excluded_years,
     get_academic_data
 )
 
+from .callback_cache import cached_callback
+
 from .tables import (
     no_data_page,
     create_multi_header_table_with_container,
@@ -47,7 +49,7 @@ from .tables import (
 
 from .charts import no_data_fig_label, make_stacked_bar, make_line_chart
 from .layouts import set_table_layout, create_line_fig_layout
-from .calculations import round_percentages
+from .calculations import round_percentages, to_numeric_columns
 from .string_helpers import natural_keys
 
 dash.register_page(
@@ -61,35 +63,23 @@ dash.register_page(
 
 @callback(
     Output("iread-school-level-layout", "children"),
-    Output("iread-school-level-layout-container", "style"),
     Output("iread-school-details", "children"),
-    Output("iread-school-details-container", "style"),
     Output("wida-breakdown", "children"),
-    Output("wida-breakdown-container", "style"),
     Output("wida-iread-table", "children"),
-    Output("wida-iread-table-container", "style"),
     Output("iread-ilearn-ela-table", "children"),
     Output("iread-ilearn-math-table", "children"),    
-    Output("ilearn-iread-table-container", "style"),        
     Output("proficiency-grades-ela", "children"),
     Output("ela-grade-bar-fig", "children"),
-    Output("proficiency-ela-grades-container", "style"),
     Output("proficiency-ethnicity-ela", "children"),
     Output("ela-ethnicity-bar-fig", "children"),
-    Output("proficiency-ela-ethnicity-container", "style"),
     Output("proficiency-subgroup-ela", "children"),
     Output("ela-subgroup-bar-fig", "children"),
-    Output("proficiency-ela-subgroup-container", "style"),
     Output("proficiency-grades-math", "children"),
     Output("math-grade-bar-fig", "children"),
-    Output("proficiency-math-grades-container", "style"),
     Output("proficiency-ethnicity-math", "children"),
     Output("math-ethnicity-bar-fig", "children"),
-    Output("proficiency-math-ethnicity-container", "style"),
     Output("proficiency-subgroup-math", "children"),
     Output("math-subgroup-bar-fig", "children"),
-    Output("proficiency-math-subgroup-container", "style"),
-    Output("k8-table-container", "style"),
     Output("k12-grad-overview-table", "children"),
     Output("k12-grad-ethnicity-table", "children"),
     Output("k12-grad-subgroup-table", "children"),
@@ -99,40 +89,33 @@ dash.register_page(
     Output("k12-sat-ethnicity-table", "children"),
     Output("k12-sat-subgroup-table", "children"),
     Output("k12-sat-table-container", "style"),
-    Output("academic-information-main-container", "style"),
-    Output("academic-information-empty-container", "style"),
     Output("academic-information-no-data", "children"),
     Output("academic-information-notes-string", "children"),
-    Output("academic-information-notes-string-container", "style"),   
+    Output("academic-information-visibility", "data"),
     Input("charter-dropdown", "value"),
     Input("year-dropdown", "value"),
     Input("academic-information-type-radio", "value"),
-    Input("academic-information-category-radio", "value"),
 )
-def update_academic_information_page(
-    school: str, year: str, radio_type: str, radio_category: str
-):
+@cached_callback()
+def update_academic_information_page(school: str, year: str, radio_type: str):
     if not school:
         raise PreventUpdate
 
     selected_year_string = year
     selected_year_numeric = int(selected_year_string)
 
-    selected_school = get_school_index(school)
-    selected_school_type = selected_school["School Type"].values[0]
-    selected_school_id = int(selected_school["School ID"].values[0])
-    selected_school_name = selected_school["School Name"].values[0]
+    selected_school = school_directory.get(school)
+    selected_school_type = selected_school.school_type
+    selected_school_id = int(selected_school.school_id)
+    selected_school_name = selected_school.school_name
 
-    is_guest = True if selected_school["Guest"].values[0] == "Y" else False
+    is_guest = selected_school.guest
 
     excluded_years = get_excluded_years(selected_year_string)
 
     if not radio_type:
         radio_type = "k8"
 
-    if not radio_category:
-        radio_category = "all"
-
     k12_grad_overview_table = []  # type: list 
     k12_grad_ethnicity_table = []  # type: list 
     k12_grad_subgroup_table = []  # type: list 
@@ -164,11 +147,9 @@ def update_academic_information_page(
     math_subgroup_bar_fig = []  # type: list 
 
     academic_information_notes_string = ""
-    academic_information_notes_string_container = {"display": "none"}
     
     # the default is to display nothing
     main_container = {"display": "none"}
-    empty_container = {"display": "none"}
     
     no_display_data = no_data_page("No Data to Display.", "Academic Information")
 
@@ -180,114 +161,14 @@ def update_academic_information_page(
         of the length of time that the student attended the testing school, and the 2023 calculation included students in the \
         cohort of the school in which the student spent the majority of time enrolled."
     
-    # category selection determines which divs are displayed by default
-    if radio_category == "grade":
-        proficiency_ela_grades_container = {"display": "block"}
-        proficiency_math_grades_container = {"display": "block"}        
-        k8_table_container = {"display": "block"}        
-        academic_information_notes_string_container = {"display": "block"}
-
-        iread_school_level_layout_container = {"display": "none"} 
-        iread_school_details_container = {"display": "none"}
-        ilearn_iread_table_container = {"display": "none"}
-        wida_breakdown_container = {"display": "none"}
-        wida_iread_details_table_container = {"display": "none"}
-        proficiency_ela_subgroup_container = {"display": "none"}
-        proficiency_math_subgroup_container = {"display": "none"}
-        proficiency_ela_ethnicity_container = {"display": "none"}
-        proficiency_math_ethnicity_container = {"display": "none"}
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
-            
-    elif radio_category == "ethnicity":
-        proficiency_ela_ethnicity_container = {"display": "block"}
-        proficiency_math_ethnicity_container = {"display": "block"}
-        k8_table_container = {"display": "block"}        
-        academic_information_notes_string_container = {"display": "block"}
-
-        iread_school_level_layout_container = {"display": "none"} 
-        iread_school_details_container = {"display": "none"}
-        ilearn_iread_table_container = {"display": "none"}
-        wida_breakdown_container = {"display": "none"}
-        wida_iread_details_table_container = {"display": "none"}
-        proficiency_ela_subgroup_container = {"display": "none"}
-        proficiency_math_subgroup_container = {"display": "none"}
-        proficiency_ela_grades_container = {"display": "none"}
-        proficiency_math_grades_container = {"display": "none"}
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
-
-    elif radio_category == "subgroup":
-        proficiency_ela_subgroup_container = {"display": "block"}
-        proficiency_math_subgroup_container = {"display": "block"}
-        k8_table_container = {"display": "block"}        
-        academic_information_notes_string_container = {"display": "block"}
-
-        iread_school_level_layout_container = {"display": "none"} 
-        iread_school_details_container = {"display": "none"}
-        ilearn_iread_table_container = {"display": "none"}
-        wida_breakdown_container = {"display": "none"}
-        wida_iread_details_table_container = {"display": "none"}
-        proficiency_ela_ethnicity_container = {"display": "none"}
-        proficiency_math_ethnicity_container = {"display": "none"}
-        proficiency_ela_grades_container = {"display": "none"}
-        proficiency_math_grades_container = {"display": "none"}
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
-
-    elif radio_category == "iread":
-        iread_school_level_layout_container = {"display": "block"} 
-        iread_school_details_container = {"display": "block"}
-        ilearn_iread_table_container = {"display": "block"}
-        k8_table_container = {"display": "block"}
-
-        wida_breakdown_container = {"display": "none"}
-        wida_iread_details_table_container = {"display": "none"}
-        proficiency_ela_grades_container = {"display": "none"}
-        proficiency_ela_ethnicity_container = {"display": "none"}
-        proficiency_ela_subgroup_container = {"display": "none"}
-        proficiency_math_grades_container = {"display": "none"}
-        proficiency_math_ethnicity_container = {"display": "none"}
-        proficiency_math_subgroup_container = {"display": "none"}
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
-        academic_information_notes_string_container = {"display": "none"}
-
-    elif radio_category == "wida":
-        wida_breakdown_container = {"display": "block"}
-        wida_iread_details_table_container = {"display": "block"}
-        k8_table_container = {"display": "block"}
-
-        iread_school_level_layout_container = {"display": "none"}
-        iread_school_details_container = {"display": "none"}
-        ilearn_iread_table_container = {"display": "none"}          
-        proficiency_ela_grades_container = {"display": "none"}
-        proficiency_ela_ethnicity_container = {"display": "none"}
-        proficiency_ela_subgroup_container = {"display": "none"}
-        proficiency_math_grades_container = {"display": "none"}
-        proficiency_math_ethnicity_container = {"display": "none"}
-        proficiency_math_subgroup_container = {"display": "none"}
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
-        academic_information_notes_string_container = {"display": "none"}
-
-    elif radio_category == "all":
-        iread_school_level_layout_container = {"display": "block"}
-        iread_school_details_container = {"display": "block"} 
-        ilearn_iread_table_container = {"display": "block"}                 
-        wida_breakdown_container = {"display": "block"}
-        wida_iread_details_table_container = {"display": "block"}
-        proficiency_ela_grades_container = {"display": "block"}
-        proficiency_math_grades_container = {"display": "block"}
-        proficiency_ela_ethnicity_container = {"display": "block"}
-        proficiency_math_ethnicity_container = {"display": "block"}
-        proficiency_ela_subgroup_container = {"display": "block"}
-        proficiency_math_subgroup_container = {"display": "block"}
-        academic_information_notes_string_container = {"display": "block"}
-        k8_table_container = {"display": "block"}
-        
-        k12_sat_table_container = {"display": "none"}
-        k12_grad_table_container = {"display": "none"}
+    k12_grad_table_container = {"display": "none"}
+    k12_sat_table_container = {"display": "none"}
+
+    # the category radio selects which of the tables are displayed in the
+    # browser (see the clientside_callback below), so switching categories
+    # does not rebuild the page. All of them are built here, and visibility
+    # records which are available
+    visibility = {"level": None, "notes": False, "iread": True, "wida": True}
 
     # High School Data
     if (
@@ -297,18 +178,7 @@ def update_academic_information_page(
         or (selected_school_type == "K12" and radio_type == "hs")
     ):
 
-        iread_school_level_layout_container = {"display": "none"}
-        iread_school_details_container = {"display": "none"} 
-        ilearn_iread_table_container = {"display": "none"}                 
-        wida_breakdown_container = {"display": "none"}
-        wida_iread_details_table_container = {"display": "none"}
-        proficiency_ela_grades_container = {"display": "none"}
-        proficiency_math_grades_container = {"display": "none"}
-        proficiency_ela_ethnicity_container = {"display": "none"}
-        proficiency_math_ethnicity_container = {"display": "none"}
-        proficiency_ela_subgroup_container = {"display": "none"}
-        proficiency_math_subgroup_container = {"display": "none"}
-        k8_table_container = {"display": "none"}
+        visibility["level"] = "hs"
 
         if selected_school_type == "K12":
             school_type = "HS"
@@ -491,7 +361,7 @@ def update_academic_information_page(
 
             academic_information_notes_string = "Beginning with the 2021-22 SY, SAT replaced ISTEP+ as the state mandated HS assessment. \
                 Beginning with the 2023 cohort, all students in grade 11 are required to take the SAT per federal requirements."
-            academic_information_notes_string_container = {"display": "block"}
+            visibility["notes"] = True
     # End HS block
 
     # Begin K8 block
@@ -506,6 +376,8 @@ def update_academic_information_page(
         else:
             school_type = selected_school_type
 
+        visibility["level"] = "k8"
+
         list_of_schools = [school]
 
         # NOTE: there is no ilearn/iread data available for 2020
@@ -519,12 +391,11 @@ def update_academic_information_page(
 
         if len(k8_info_data.index) < 0:
 
-            k8_table_container = {"display": "none"}
+            visibility["level"] = None
             no_display_data = no_data_page("No Data to Display.", "Academic Proficiency")
             
         else:
 
-            k8_table_container = {"display": "block"}
             main_container = {"display": "block"}
 
             ilearn_table_data = k8_info_data.copy()
@@ -702,7 +573,7 @@ def update_academic_information_page(
             )
 
         ## ILEARN proficiency breakdown stacked bar charts
-            raw_k8_info_data = get_proficiency_data(school)
+            raw_k8_info_data = get_proficiency_data(school, ["ilearn_proficiency"])
 
             ilearn_proficency_data = raw_k8_info_data.loc[
                 raw_k8_info_data["Year"] == selected_year_numeric
@@ -711,15 +582,11 @@ def update_academic_information_page(
             ilearn_proficency_data = ilearn_proficency_data.dropna(axis=1)
             ilearn_proficency_data = ilearn_proficency_data.reset_index()
 
-            for col in ilearn_proficency_data.columns:
-                ilearn_proficency_data[col] = pd.to_numeric(
-                    ilearn_proficency_data[col], errors="coerce"
-                )
+            to_numeric_columns(ilearn_proficency_data)
 
             # this keeps ELA and Math as well, which we drop later
             ilearn_proficency_data = ilearn_proficency_data.filter(
-                regex=r"ELA Below|ELA At|ELA Approaching|ELA Above|ELA Total|Math Below|Math At|Math Approaching|Math Above|Math Total",
-                axis=1,
+                regex=column_families["ilearn_proficiency"], axis=1,
             )
 
             proficiency_rating = [
@@ -998,15 +865,9 @@ def update_academic_information_page(
 
             iread_student_data = pd.DataFrame()
 
-            if radio_category == "iread":
-                main_container = {"display": "none"}
-                empty_container = {"display": "block"}
-                academic_information_notes_string_container = {"display": "none"}
-                no_display_data = no_data_page("No Data to Display.", "IREAD")
-
-            else:
-                iread_school_level_layout = []
-                iread_school_details = []
+            iread_school_level_layout = []
+            iread_school_details = []
+            visibility["iread"] = False
 
         else:
             main_container = {"display": "block"}
@@ -1026,12 +887,7 @@ def update_academic_information_page(
             )
 
             ## get student level IREAD data (ICSB Schools Only)
-            iread_student_data = get_iread_student_data(school)
-
-            if excluded_years:
-                iread_student_data = iread_student_data[
-                    ~iread_student_data["Year"].astype(int).isin(excluded_years)
-                ]
+            iread_student_data = get_iread_student_data(school, selected_year_numeric)
 
             # If school has no student level data (or is a Guest school), hide
             # school details
@@ -1317,44 +1173,21 @@ def update_academic_information_page(
         # Guests will never have WIDA data 
         if is_guest == True:
             
-            if radio_category == "wida":
-                main_container = {"display": "none"}
-                empty_container = {"display": "block"}
-                academic_information_notes_string_container = {"display": "none"}
-                no_display_data = no_data_page("No Data to Display.", "WIDA")
-            
-            else:
-                wida_iread_details_table = []
-                wida_breakdown = []
+            wida_iread_details_table = []
+            wida_breakdown = []
+            visibility["wida"] = False
         else:
 
             # NOTE: Currently, the WIDA LINK file does not have a School ID column,
-            # so we have to get a list of all STNs associated with the school (from
-            # both IREAD and ILEARN data files) and then match
-            all_stns = get_school_stns(school)
+            # so student level wida data is matched to the school by the STNs
+            # in its IREAD and ILEARN data (see get_wida_student_data())
+            wida_student_data = get_wida_student_data(school, selected_year_numeric)
 
-            stn_list = list(set(all_stns["STN"].to_list()))
-
-            # Get student level wida data for the school by matching
-            # against stn_list.
-            wida_student_data = get_wida_student_data(stn_list)
-
-            if excluded_years:
-                wida_student_data = wida_student_data[
-                    ~wida_student_data["Year"].astype(int).isin(excluded_years)
-                ]
-            
             if len(wida_student_data.index) < 1:
 
-                if radio_category == "wida":
-                    main_container = {"display": "none"}
-                    empty_container = {"display": "block"}
-                    academic_information_notes_string_container = {"display": "none"}
-                    no_display_data = no_data_page("No Data to Display.", "WIDA")
-                
-                else:
-                    wida_iread_details_table = []
-                    wida_breakdown = []
+                wida_iread_details_table = []
+                wida_breakdown = []
+                visibility["wida"] = False
 
             else:
                 main_container = {"display": "block"}
@@ -1502,8 +1335,6 @@ def update_academic_information_page(
 
                     main_container = {"display": "block"}
 
-                    all_stns = get_school_stns(school)
-
                     wida_student_data["STN"] = wida_student_data["STN"].astype(str)
 
                     # NOTE: For many schools the number of students (STNs) with
@@ -1658,37 +1489,27 @@ def update_academic_information_page(
 # c) measure raw scale score avg
 # Avg ELA over time for IREAD No Pass
 
+    visibility["main"] = main_container
+
     return (
         iread_school_level_layout,
-        iread_school_level_layout_container,
         iread_school_details,
-        iread_school_details_container,
         wida_breakdown,
-        wida_breakdown_container,
         wida_iread_details_table,
-        wida_iread_details_table_container,
         iread_ilearn_ela_table,
         iread_ilearn_math_table,
-        ilearn_iread_table_container,        
         proficiency_grades_ela,
         ela_grade_bar_fig,
-        proficiency_ela_grades_container,
         proficiency_ethnicity_ela,
         ela_ethnicity_bar_fig,
-        proficiency_ela_ethnicity_container,
         proficiency_subgroup_ela,
         ela_subgroup_bar_fig,
-        proficiency_ela_subgroup_container,
         proficiency_grades_math,
         math_grade_bar_fig,
-        proficiency_math_grades_container,
         proficiency_ethnicity_math,
         math_ethnicity_bar_fig,
-        proficiency_math_ethnicity_container,
         proficiency_subgroup_math,
         math_subgroup_bar_fig,
-        proficiency_math_subgroup_container,
-        k8_table_container,
         k12_grad_overview_table,
         k12_grad_ethnicity_table,
         k12_grad_subgroup_table,
@@ -1698,14 +1519,79 @@ def update_academic_information_page(
         k12_sat_ethnicity_table,
         k12_sat_subgroup_table,
         k12_sat_table_container,
-        main_container,
-        empty_container,
         no_display_data,
         academic_information_notes_string,
-        academic_information_notes_string_container
+        visibility,
     )
 
 
+# category selection determines which divs are displayed. Runs in the browser
+# so that switching categories does not go back to the server
+clientside_callback(
+    """
+    function(visibility, category) {
+        const show = {"display": "block"};
+        const hide = {"display": "none"};
+        const data = visibility || {};
+        const k8 = data.level === "k8";
+
+        category = category || "all";
+
+        const shown = function(selected) {
+            return k8 && (category === "all" || category === selected) ? show : hide;
+        };
+
+        // the IREAD or WIDA category is selected, but the school has no data
+        const missing = k8 && (category === "iread" || category === "wida") && !data[category];
+
+        const notes = !missing &&
+            (data.notes || ["all", "grade", "ethnicity", "subgroup"].includes(category));
+
+        return [
+            shown("iread"),
+            shown("iread"),
+            shown("wida"),
+            shown("wida"),
+            shown("iread"),
+            shown("grade"),
+            shown("ethnicity"),
+            shown("subgroup"),
+            shown("grade"),
+            shown("ethnicity"),
+            shown("subgroup"),
+            k8 ? show : hide,
+            missing ? hide : (data.main || hide),
+            missing ? show : hide,
+            missing ? hide : show,
+            missing && category === "iread" ? show : hide,
+            missing && category === "wida" ? show : hide,
+            notes ? show : hide,
+        ];
+    }
+    """,
+    Output("iread-school-level-layout-container", "style"),
+    Output("iread-school-details-container", "style"),
+    Output("wida-breakdown-container", "style"),
+    Output("wida-iread-table-container", "style"),
+    Output("ilearn-iread-table-container", "style"),
+    Output("proficiency-ela-grades-container", "style"),
+    Output("proficiency-ela-ethnicity-container", "style"),
+    Output("proficiency-ela-subgroup-container", "style"),
+    Output("proficiency-math-grades-container", "style"),
+    Output("proficiency-math-ethnicity-container", "style"),
+    Output("proficiency-math-subgroup-container", "style"),
+    Output("k8-table-container", "style"),
+    Output("academic-information-main-container", "style"),
+    Output("academic-information-empty-container", "style"),
+    Output("academic-information-no-data", "style"),
+    Output("academic-information-no-iread-data", "style"),
+    Output("academic-information-no-wida-data", "style"),
+    Output("academic-information-notes-string-container", "style"),
+    Input("academic-information-visibility", "data"),
+    Input("academic-information-category-radio", "value"),
+)
+
+
 # this needs to be a function in order for it to be called
 # correctly by subnav_academic_information()
 def layout():
@@ -1995,9 +1881,20 @@ def layout():
             html.Div(
                 [
                     html.Div(id="academic-information-no-data"),
+                    html.Div(
+                        no_data_page("No Data to Display.", "IREAD"),
+                        id="academic-information-no-iread-data",
+                    ),
+                    html.Div(
+                        no_data_page("No Data to Display.", "WIDA"),
+                        id="academic-information-no-wida-data",
+                    ),
                 ],
                 id="academic-information-empty-container",
             ),
+            dcc.Store(id="academic-information-visibility"),
+            # the page of the academic information navigation (see app.py)
+            dcc.Store(id="academic-information-page", data="academic_information"),
         ],
         id="main-container",
     )
\ No newline at end of file
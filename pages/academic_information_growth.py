@@ -6,12 +6,12 @@
 # date:     03/25/24
 
 import dash
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, Input, Output, callback, clientside_callback
 from dash.exceptions import PreventUpdate
 import pandas as pd
 
 # import local functions
-from .load_data import get_school_index, get_growth_data, get_excluded_years
+from .load_data import school_directory, get_growth_data
 from .process_data import process_growth_data
 from .tables import no_data_page, create_growth_table
 from .charts import make_growth_chart
@@ -35,9 +35,8 @@ dash.register_page(
     Output("academic-growth-notes-string", "children"),
     Input("charter-dropdown", "value"),
     Input("year-dropdown", "value"),
-    Input("academic-information-category-radio", "value"),
 )
-def update_academic_info_growth_page(school: str, year: str, radio_category: str):
+def update_academic_info_growth_page(school: str, year: str):
     if not school:
         raise PreventUpdate
 
@@ -45,11 +44,7 @@ def update_academic_info_growth_page(school: str, year: str, radio_category: str
     string_year = year
     selected_year_string = "2019" if string_year == "2020" else string_year
 
-    selected_school = get_school_index(school)
-
-    # Radio buttons don't play nice
-    if not radio_category:
-        radio_category = "all"
+    selected_school = school_directory.get(school)
 
     # default styles (all values empty - only empty_container displayed)
     growth_grades_ela = []
@@ -83,15 +78,11 @@ def update_academic_info_growth_page(school: str, year: str, radio_category: str
     # NOTE: Growth data shows: byGrade, byEthnicity, bySES, byEL Status, & by Sped Status
     # Also available in the data, but not currently shown: Homeless Status and High Ability Status
 
-    # all students who are coded as "Majority Enrolled" at the school
-    growth_data = get_growth_data(school)
-
-    excluded_years = get_excluded_years(selected_year_string)
+    # all students who are coded as "Majority Enrolled" at the school for
+    # the selected year and earlier
+    growth_data = get_growth_data(school, selected_year_string)
 
-    if excluded_years:
-        growth_data = growth_data[~growth_data["Test Year"].isin(excluded_years)]
-
-    if len(growth_data.index) == 0 or selected_school["Guest"].values[0] == "Y":
+    if len(growth_data.index) == 0 or selected_school.guest:
         main_growth_container = {"display": "none"}
         empty_growth_container = {"display": "block"}
 
@@ -362,31 +353,6 @@ def update_academic_info_growth_page(school: str, year: str, radio_category: str
             label_subgroup_growth_math,
         )
 
-        if radio_category == "grade":
-            growth_ethnicity_ela = []
-            growth_ethnicity_math = []
-            growth_subgroup_ela = []
-            growth_subgroup_math = []
-        elif radio_category == "ethnicity":
-            growth_grades_ela = []
-            growth_grades_math = []
-            growth_subgroup_ela = []
-            growth_subgroup_math = []
-        elif radio_category == "subgroup":
-            growth_grades_ela = []
-            growth_grades_math = []
-            growth_ethnicity_ela = []
-            growth_ethnicity_math = []
-        elif radio_category == "all":
-            pass
-        else:
-            growth_grades_ela = []
-            growth_grades_math = []
-            growth_ethnicity_ela = []
-            growth_ethnicity_math = []
-            growth_subgroup_ela = []
-            growth_subgroup_math = []
-
     academic_growth_notes_string = "State growth data comes from IDOE's LINK. Identifying information \
         is scrubbed and data is aggregated before display. The calculation includes all students who were \
         enrolled in the selected school for the most number of days that student was enrolled in any school \
@@ -409,11 +375,44 @@ def update_academic_info_growth_page(school: str, year: str, radio_category: str
         academic_growth_notes_string
     )
 
+
+# category selection determines which growth tables are displayed (in the
+# browser - all of them are built by update_academic_info_growth_page)
+clientside_callback(
+    """
+    function(category) {
+        const shown = function(selected) {
+            return !category || category === "all" || category === selected ?
+                {"display": "block"} : {"display": "none"};
+        };
+
+        return [
+            shown("grade"),
+            shown("grade"),
+            shown("ethnicity"),
+            shown("ethnicity"),
+            shown("subgroup"),
+            shown("subgroup"),
+        ];
+    }
+    """,
+    Output("growth-grades-ela", "style"),
+    Output("growth-grades-math", "style"),
+    Output("growth-ethnicity-ela", "style"),
+    Output("growth-ethnicity-math", "style"),
+    Output("growth-subgroup-ela", "style"),
+    Output("growth-subgroup-math", "style"),
+    Input("academic-information-category-radio", "value"),
+)
+
+
 # this needs to be a function in order for it to be called correctly
 #  by subnav_academic_information()
 def layout():
     return html.Div(
         [
+            # the page of the academic information navigation (see app.py)
+            dcc.Store(id="academic-information-page", data="academic_information_growth"),
             html.Div(
                 [
                     dcc.Loading(
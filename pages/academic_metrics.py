@@ -18,9 +18,10 @@ from .globals import (
 )
 
 from .load_data import (
-    get_school_index,
+    school_directory,
     get_academic_data
 )
+from .callback_cache import background_job
 
 from .tables import (
     no_data_page,
@@ -29,7 +30,7 @@ from .tables import (
     create_proficiency_key
 )
 
-from .layouts import set_table_layout
+from .layouts import set_table_layout, create_loading_layout
 
 from .string_helpers import convert_to_svg_circle
 
@@ -70,8 +71,19 @@ dash.register_page(__name__, path="/academic_metrics", top_nav=True, order=9)
     Output("academic-metrics-no-data", "children"),
     Input("charter-dropdown", "value"),
     Input("year-dropdown", "value"),
+    background=True,
+    progress=Output("academic-metrics-progress", "children"),
+    running=[
+        (
+            Output("academic-metrics-loading-container", "style"),
+            {"display": "block"},
+            {"display": "none"},
+        ),
+    ],
+    cancel=[Input("url", "href")],
 )
-def update_academic_metrics(school: str, year: str):
+@background_job()
+def update_academic_metrics(set_progress, school: str, year: str):
     if not school:
         raise PreventUpdate
 
@@ -106,9 +118,9 @@ def update_academic_metrics(school: str, year: str):
 
     no_data_to_display = no_data_page("No Data to Display.", "Academic Metrics")
 
-    selected_school = get_school_index(school)
-    selected_school_type = selected_school["School Type"].values[0]
-    selected_school_id = int(selected_school["School ID"].values[0])
+    selected_school = school_directory.get(school)
+    selected_school_type = selected_school.school_type
+    selected_school_id = int(selected_school.school_id)
 
     # K8 Academic Metrics (for K8 and K12 schools)
     if selected_school_type == "K8" or selected_school_type == "K12":
@@ -118,7 +130,9 @@ def update_academic_metrics(school: str, year: str):
         else:
             school_type = selected_school_type
         
+        set_progress("Loading academic data . . .")
         metric_data = get_academic_data(list_of_schools, school_type, selected_year_numeric, "metrics")
+        set_progress("Calculating metrics . . .")
 
         if len(metric_data.index) > 0:
 
@@ -290,10 +304,6 @@ def update_academic_metrics(school: str, year: str):
             # metric_15abcd_data = convert_to_svg_circle(metric_15abcd_data)
             # table_15abcd = create_metric_table(metric_15abcd_label, metric_15abcd_data)
             # table_container_15abcd = set_table_layout(table_15abcd, table_15abcd, metric_15abcd_data.columns)
-            
-            print(combined_delta)
-            filename99 = ("combined_delta.csv")
-            combined_delta.to_csv(filename99, index=False)
 
             metric_16a_data = combined_delta[
                 (combined_delta["Category"].str.contains("|".join(category)))
@@ -320,7 +330,6 @@ def update_academic_metrics(school: str, year: str):
                 "subgroup compared with traditional school corporation.",
             ]
             metric_16b_data = convert_to_svg_circle(metric_16b_data)
-            print(metric_16b_data)
             table_16b = create_metric_table(metric_16b_label, metric_16b_data)
 
             table_container_16ab = set_table_layout(
@@ -368,7 +377,9 @@ def update_academic_metrics(school: str, year: str):
             selected_school_type = "HS"
 
         list_of_schools = [school]
+        set_progress("Loading academic data . . .")
         raw_metric_data = get_academic_data(list_of_schools, selected_school_type, selected_year_numeric, "metrics")
+        set_progress("Calculating metrics . . .")
 
         if len(raw_metric_data.index) > 0:
 
@@ -652,6 +663,7 @@ def update_academic_metrics(school: str, year: str):
 def layout():
     return html.Div(
         [
+            create_loading_layout("academic-metrics"),
             html.Div(
                 [
                     html.Div(
@@ -11,13 +11,13 @@ import itertools
 from typing import Tuple
 
 from .load_data import (
-    get_school_index,
+    school_directory,
     get_attendance_data
 )
 
 from .calculations import (
     calculate_year_over_year,
-    set_academic_rating,
+    insert_rating_columns,
     conditional_fillna,
     calculate_difference
 )
@@ -36,8 +36,8 @@ def calculate_attendance_metrics(school: str, school_type: str, year: str) -> pd
     Returns:
         pd.DataFrame: a dataframe with School, Diff, & Rate columns for each year
     """
-    selected_school = get_school_index(school)
-    corp_id = int(selected_school["GEO Corp"].values[0])
+    selected_school = school_directory.get(school)
+    corp_id = selected_school.geo_corp
 
     corp_type = "corp_" + school_type
 
@@ -115,19 +115,17 @@ def calculate_attendance_metrics(school: str, school_type: str, year: str) -> pd
     #       ii) a list of the threshold "limits" to be used in the calculation; and
     #       iii) an integer "flag" which tells the function which calculation to use.
 
-    [
-        attendance_metrics.insert(
-            i,
-            str(attendance_metrics.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            attendance_metrics.apply(
-                lambda x: set_academic_rating(
-                    x[attendance_metrics.columns[i - 1]], attendance_limits, 3
-                ),
-                axis=1,
-            ),
-        )
-        for i in range(attendance_metrics.shape[1], 1, -2)
-    ]
+    #   NOTE: the ratings for all columns are calculated in a single vectorized
+    #   pass by set_academic_ratings() (see insert_rating_columns())
+    insert_rating_columns(
+        attendance_metrics,
+        [
+            (i, i - 1, str(attendance_metrics.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(attendance_metrics.shape[1], 1, -2)
+        ],
+        attendance_limits,
+        3,
+    )
 
     # NOTE: Currently, chronic absenteeism is not officially in the
     # accountability system- we are calculating it above (using the
@@ -300,17 +298,15 @@ def calculate_metrics(year_over_year_data: pd.DataFrame, comparison_data: pd.Dat
     year_over_year_limits = [0.05, 0.02, 0]
 
     # see note in calculate_attendance_metrics()
-    [
-        year_over_year_data.insert(
-            i + 1,
-            str(year_over_year_data.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            year_over_year_data.apply(
-                lambda x: set_academic_rating(x[year_over_year_data.columns[i]], year_over_year_limits, 1),
-                axis=1,
-            ),
-        )
-        for i in range(year_over_year_data.shape[1] - 1, 4, -3)
-    ]
+    insert_rating_columns(
+        year_over_year_data,
+        [
+            (i + 1, i, str(year_over_year_data.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(year_over_year_data.shape[1] - 1, 4, -3)
+        ],
+        year_over_year_limits,
+        1,
+    )
 
     year_over_year_data = conditional_fillna(year_over_year_data)
 
@@ -347,19 +343,15 @@ def calculate_metrics(year_over_year_data: pd.DataFrame, comparison_data: pd.Dat
     # delta limits for ilearn
     comparison_limits = [0.1, 0.02, 0]
 
-    [
-        comparison_data.insert(
-            i + 1,
-            str(comparison_data.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            comparison_data.apply(
-                lambda x: set_academic_rating(
-                    x[comparison_data.columns[i]], comparison_limits, 1
-                ),
-                axis=1,
-            ),
-        )
-        for i in range(comparison_data.shape[1] - 1, 2, -3)
-    ]
+    insert_rating_columns(
+        comparison_data,
+        [
+            (i + 1, i, str(comparison_data.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(comparison_data.shape[1] - 1, 2, -3)
+        ],
+        comparison_limits,
+        1,
+    )
 
     comparison_data = conditional_fillna(comparison_data)
 
@@ -381,38 +373,30 @@ def calculate_high_school_metrics(merged_data: pd.DataFrame) -> pd.DataFrame:
     grad_limits_state = [0, -0.05, -0.15]
     state_grad_metric = data.loc[data["Category"] == "State Graduation Average"]
 
-    [
-        state_grad_metric.insert(
-            i + 1,
-            str(state_grad_metric.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            state_grad_metric.apply(
-                lambda x: set_academic_rating(
-                    x[state_grad_metric.columns[i]], grad_limits_state, 2
-                ),
-                axis=1,
-            ),
-        )
-        for i in range(state_grad_metric.shape[1] - 1, 1, -3)
-    ]
+    insert_rating_columns(
+        state_grad_metric,
+        [
+            (i + 1, i, str(state_grad_metric.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(state_grad_metric.shape[1] - 1, 1, -3)
+        ],
+        grad_limits_state,
+        2,
+    )
 
     grad_limits_local = [0, -0.05, -0.10]
     local_grad_metric = data[
         data["Category"].isin(["Total Graduation Rate", "Non Waiver Graduation Rate"])
     ]
 
-    [
-        local_grad_metric.insert(
-            i + 1,
-            str(local_grad_metric.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            local_grad_metric.apply(
-                lambda x: set_academic_rating(
-                    x[local_grad_metric.columns[i]], grad_limits_local, 2
-                ),
-                axis=1,
-            ),
-        )
-        for i in range(local_grad_metric.shape[1] - 1, 1, -3)
-    ]
+    insert_rating_columns(
+        local_grad_metric,
+        [
+            (i + 1, i, str(local_grad_metric.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(local_grad_metric.shape[1] - 1, 1, -3)
+        ],
+        grad_limits_local,
+        2,
+    )
 
     # NOTE: Strength of Diploma is not currently displayed
     strength_diploma = data[data["Category"] == "Strength of Diploma"]
@@ -494,19 +478,15 @@ def calculate_adult_high_school_metrics(values: pd.DataFrame) -> pd.DataFrame:
 
         # see calculate_year_over_year() for a description.
         ccr_limits = [0.5, 0.499, 0.234]
-        [
-            ahs_data.insert(
-                i,
-                str(ahs_data.columns[i - 1][:4]) + "Rate" + str(i),
-                ahs_data.apply(
-                    lambda x: set_academic_rating(
-                        x[ahs_data.columns[i - 1]], ccr_limits, 2
-                    ),
-                    axis=1,
-                ),
-            )
-            for i in range(ahs_data.shape[1], 1, -1)
-        ]
+        insert_rating_columns(
+            ahs_data,
+            [
+                (i, i - 1, str(ahs_data.columns[i - 1][:4]) + "Rate" + str(i))
+                for i in range(ahs_data.shape[1], 1, -1)
+            ],
+            ccr_limits,
+            2,
+        )
 
         # NOTE: State Letter Grades are no longer used. so
         # we create a 1 row dataframe using ahs_data cols,
@@ -611,17 +591,15 @@ def calculate_iread_metrics(data: pd.DataFrame) -> pd.DataFrame:
     data = data[data.columns.drop(list(data.filter(regex="Rate")))]
 
     # another slight variation left as an exercise for the reader
-    [
-        data.insert(
-            i - 1,
-            str(data.columns[i - 1])[: 7 - 3] + "Rate" + str(i),
-            data.apply(
-                lambda x: set_academic_rating(x[data.columns[i - 3]], iread_limits, 1),
-                axis=1,
-            ),
-        )
-        for i in range(data.shape[1], 1, -3)
-    ]
+    insert_rating_columns(
+        data,
+        [
+            (i - 1, i - 3, str(data.columns[i - 1])[: 7 - 3] + "Rate" + str(i))
+            for i in range(data.shape[1], 1, -3)
+        ],
+        iread_limits,
+        1,
+    )
 
     data = conditional_fillna(data)
     data.columns = data.columns.astype(str)
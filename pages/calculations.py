@@ -12,6 +12,58 @@ import numpy.typing as npt
 from typing import Tuple
 import scipy.spatial as spatial
 
+from .suppressed import (
+    SuppressedArray, SuppressedDtype, VALUE, MISSING, SUPPRESSED, NEGATIVE_SUPPRESSED,
+    render_suppressed
+)
+
+
+def as_numeric(series: pd.Series) -> pd.Series:
+    """
+    pd.to_numeric(errors="coerce") that returns numeric columns unchanged and
+    takes the values of SuppressedArray columns (e.g., academic columns with
+    suppressed cells) without parsing any strings.
+
+    Args:
+        series (pd.Series): a column
+
+    Returns:
+        pd.Series: the column as a numeric series ("***" and other strings
+        are NaN)
+    """
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series
+
+    if isinstance(series.dtype, SuppressedDtype):
+        return pd.Series(series.array.values, index=series.index, name=series.name)
+
+    return pd.to_numeric(series, errors="coerce")
+
+
+def to_numeric_columns(data: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """
+    Coerces [columns] (default: all columns) of [data] to numeric in place,
+    only converting the columns that are not already numeric.
+
+    Args:
+        data (pd.DataFrame): a dataframe
+        columns (list): the columns to convert
+
+    Returns:
+        pd.DataFrame: the same dataframe
+    """
+    if columns is None:
+        columns = data.columns
+
+    non_numeric = [
+        c for c in columns if not pd.api.types.is_numeric_dtype(data[c].dtype)
+    ]
+
+    for col in non_numeric:
+        data[col] = as_numeric(data[col])
+
+    return data
+
 
 def conditional_fillna(data: pd.DataFrame) -> pd.DataFrame:
     """
@@ -23,6 +75,8 @@ def conditional_fillna(data: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: the same dataframe with the nans filled
     """
+    render_suppressed(data)
+
     data.columns = data.columns.astype(str)
 
     fill_with_na = [i for i in data.columns if "Rate" in i or "Rating" in i]
@@ -49,7 +103,7 @@ def conditional_fillna(data: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
-def calculate_percentage(numerator: str, denominator: str) -> npt.NDArray:
+def calculate_percentage(numerator: str, denominator: str) -> SuppressedArray:
     """
     Calculates a percentage given a numerator and a denominator, while accounting for two
     special cases: a string representing insufficent n-size ("***") and certain conditions
@@ -63,28 +117,30 @@ def calculate_percentage(numerator: str, denominator: str) -> npt.NDArray:
         denominator (str): denominator (is a str to account for special cases)
 
     Returns:
-        float|None|str: see conditions
-    """
-    result = np.where(
-        (numerator == "***") | (denominator == "***"),
-        "***",
-        np.where(  # type: ignore
-            pd.to_numeric(numerator, errors="coerce").isna()
-            & pd.to_numeric(denominator, errors="coerce").isna(),
-            None,
-            np.where(
-                pd.to_numeric(numerator, errors="coerce").isna(),
-                0,
-                pd.to_numeric(numerator, errors="coerce")
-                / pd.to_numeric(denominator, errors="coerce"),
-            ),
+        SuppressedArray: see conditions (rendered as float|None|"***")
+    """
+    numerator = SuppressedArray.from_values(numerator)
+    denominator = SuppressedArray.from_values(denominator)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        quotient = numerator.values / denominator.values
+
+    result = SuppressedArray(
+        np.where(numerator.has_value, quotient, 0),
+        np.select(
+            [
+                numerator.suppressed | denominator.suppressed,
+                ~numerator.has_value & ~denominator.has_value,
+            ],
+            [SUPPRESSED, MISSING],
+            default=VALUE,
         ),
     )
 
     return result
 
 
-def calculate_difference(value1: str, value2: str) -> npt.NDArray:
+def calculate_difference(value1: str, value2: str) -> SuppressedArray:
     """
     Calculate the difference between two dataframes with specific mixed datatypes
     and conditions.
@@ -94,17 +150,19 @@ def calculate_difference(value1: str, value2: str) -> npt.NDArray:
         value2 (str): second value (is a str to account for special cases)
 
     Returns:
-        float|None|str: see conditions
+        SuppressedArray: value1 - value2, "***" if either value is "***", and
+        None if value1 has no value
     """
 
-    result = np.where(
-        (value1 == "***") | (value2 == "***"),
-        "***",
-        np.where(  # type: ignore
-            pd.to_numeric(value1, errors="coerce").isna(),
-            None,
-            pd.to_numeric(value1, errors="coerce")
-            - pd.to_numeric(value2, errors="coerce"),
+    value1 = SuppressedArray.from_values(value1)
+    value2 = SuppressedArray.from_values(value2)
+
+    result = SuppressedArray(
+        value1.values - value2.values,
+        np.select(
+            [value1.suppressed | value2.suppressed, ~value1.has_value],
+            [SUPPRESSED, MISSING],
+            default=VALUE,
         ),
     )
 
@@ -201,11 +259,13 @@ def calculate_proficiency(df: pd.DataFrame) -> pd.DataFrame:
             # value of NaN means it was a "***" before being converted to numeric
             # we use sum/all because there could be one or many columns
 
+            tested_sum = as_numeric(data[tested]).sum()
+
             if (
-                pd.to_numeric(data[tested], errors="coerce").sum() == 0
+                tested_sum == 0
                 or pd.isna(data[tested]).all()
             ) | (
-                pd.to_numeric(data[tested], errors="coerce").sum() > 0
+                tested_sum > 0
                 and pd.isna(data[total_proficient]).all()
             ):
                 data = data.drop([tested, total_proficient], axis=1)
@@ -252,8 +312,7 @@ def recalculate_total_proficiency(
         if c not in ["School Name", "School ID", "Low Grade", "High Grade"]
     ]
 
-    for col in numeric_columns:
-        revised_data[col] = pd.to_numeric(revised_data[col], errors="coerce")
+    to_numeric_columns(revised_data, numeric_columns)
 
     # get a list of the school grades offered by the school
     all_cols = school_data.columns.to_list()
@@ -286,7 +345,7 @@ def recalculate_total_proficiency(
     return revised_totals
 
 
-def calculate_year_over_year(current_year: pd.Series, previous_year: pd.Series) -> npt.NDArray:
+def calculate_year_over_year(current_year: pd.Series, previous_year: pd.Series) -> SuppressedArray:
     """
     Calculates year_over_year differences, accounting for string representation ("***")
     of insufficent n-size (there is available data, but not enough of it to show under privacy laws).
@@ -306,27 +365,22 @@ def calculate_year_over_year(current_year: pd.Series, previous_year: pd.Series)
         previous_year (pd.Series): a series of previous year values for all categories
 
     Returns:
-        np.ndarray: Either the difference between the current and previous year values, None,
-        or a string ("***")
-    """
-    result = np.where(
-        (current_year == 0) & ((previous_year.isna()) | (previous_year == "***")),
-        "-***",
-        np.where(
-            (current_year == "***") | (previous_year == "***"),
-            "***",
-            np.where(  # type: ignore
-                (pd.to_numeric(current_year, errors="coerce").isna())
-                & (pd.to_numeric(previous_year, errors="coerce").isna()),
-                None,
-                np.where(  # type: ignore
-                    (~pd.to_numeric(current_year, errors="coerce").isna())
-                    & (pd.to_numeric(previous_year, errors="coerce").isna()),
-                    None,
-                    pd.to_numeric(current_year, errors="coerce")
-                    - pd.to_numeric(previous_year, errors="coerce"),
-                ),
-            ),
+        SuppressedArray: Either the difference between the current and previous year values,
+        None, "***", or "-***"
+    """
+    current_year = SuppressedArray.from_values(current_year)
+    previous_year = SuppressedArray.from_values(previous_year)
+
+    result = SuppressedArray(
+        current_year.values - previous_year.values,
+        np.select(
+            [
+                (current_year == 0) & (previous_year.missing | previous_year.suppressed),
+                current_year.suppressed | previous_year.suppressed,
+                ~previous_year.has_value,
+            ],
+            [NEGATIVE_SUPPRESSED, SUPPRESSED, MISSING],
+            default=VALUE,
         ),
     )
 
@@ -416,6 +470,116 @@ def set_academic_rating(data: str | float | None, threshold: list, flag: int) ->
     return indicator
 
 
+def set_academic_ratings(data: pd.DataFrame, threshold: list, flag: int) -> pd.DataFrame:
+    """
+    Vectorized version of set_academic_rating(). Takes a block of columns (of
+    str, float, or None values) and returns a dataframe of the same shape with
+    the rating for each value, using a single np.select pass. Special values
+    are handled exactly as set_academic_rating() handles them ("***", "No Grade",
+    "No Data", and None are "NA" and "-***" is "DNMS"; NaN is "NA", except for
+    letter grades (flag 4) where it is "DNMS").
+
+    Args:
+        data (pd.DataFrame): Rating values (e.g., one or more "Diff" columns)
+        threshold (list): a list of floats (or strings for flag 4)
+        flag (int): a integer
+
+    Returns:
+        pd.DataFrame: metric ratings with the same index and columns as data
+    """
+    values = data.to_numpy(dtype=object)
+
+    # NOTE: The order of the conditions matter (np.select uses the first match)
+    is_na_string = (values == "***") | (values == "No Grade") | (values == "No Data")
+    is_negative_suppressed = values == "-***"
+    is_none = np.equal(values, None).astype(bool)
+
+    conditions = [is_na_string, is_negative_suppressed, is_none]
+    choices = ["NA", "DNMS", "NA"]
+
+    # letter_grade ratings (type string)
+    if flag == 4:
+        conditions += [values == threshold[0], values == threshold[1], values == threshold[2]]
+        choices += ["ES", "MS", "AS"]
+
+    else:
+        # numeric checks - ensure type is float (astype(float) calls float() on
+        # each value, so unconvertible strings raise just like set_academic_rating())
+        special = is_na_string | is_negative_suppressed | is_none
+        numeric = np.where(special, np.nan, values).astype(float)
+
+        with np.errstate(invalid="ignore"):
+            # academic ratings (numeric)
+            if flag == 1:
+                conditions += [
+                    np.isnan(numeric),
+                    numeric >= threshold[0],
+                    numeric > threshold[1],
+                    numeric >= threshold[2],
+                ]
+                choices += ["NA", "ES", "MS", "AS"]
+
+            # graduation rate ratings (numeric)
+            elif flag == 2:
+                conditions += [
+                    np.isnan(numeric),
+                    numeric >= threshold[0],
+                    (numeric < threshold[0]) & (numeric >= threshold[1]),
+                    (numeric < threshold[1]) & (numeric >= threshold[2]),
+                ]
+                choices += ["NA", "ES", "MS", "AS"]
+
+            # attendance rate ratings (numeric)
+            elif flag == 3:
+                conditions += [
+                    np.isnan(numeric),
+                    numeric > threshold[0],
+                    (numeric < threshold[0]) & (numeric >= threshold[1]),
+                ]
+                choices += ["NA", "ES", "MS"]
+
+            else:
+                raise ValueError("Unknown rating flag: " + str(flag))
+
+    ratings = np.select(conditions, choices, default="DNMS").astype(object)
+
+    return pd.DataFrame(ratings, index=data.index, columns=data.columns)
+
+
+def insert_rating_columns(
+    data: pd.DataFrame, rating_columns: list, threshold: list, flag: int
+) -> pd.DataFrame:
+    """
+    Rates a set of value columns using a single set_academic_ratings() call and
+    inserts each resulting rating column into the dataframe. Insert positions must
+    be in descending order and each value (and name) column must be to the left of
+    its insert position, so that inserting a column never shifts a position that
+    has yet to be processed.
+
+    Args:
+        data (pd.DataFrame): the dataframe (modified in place)
+        rating_columns (list): (insert position, value column position, rating column
+        name) tuples
+        threshold (list): a list of floats
+        flag (int): a integer
+
+    Returns:
+        pd.DataFrame: the same dataframe with the rating columns inserted
+    """
+    if not rating_columns:
+        return data
+
+    ratings = set_academic_ratings(
+        data.iloc[:, [value_position for _, value_position, _ in rating_columns]],
+        threshold,
+        flag,
+    )
+
+    for n, (position, _, name) in enumerate(rating_columns):
+        data.insert(position, name, ratings.iloc[:, n].to_numpy())
+
+    return data
+
 def round_nearest(data: pd.DataFrame, step: int) -> int:
     """
     Determine a tick value for a plotly chart based on the maximum value in a
@@ -620,93 +784,26 @@ def check_for_insufficient_n_size(data: pd.DataFrame) -> str:
     return df_string
 
 
-def find_nearest(
-    school_idx: pd.Index, values: pd.DataFrame
-) -> Tuple[np.ndarray, np.ndarray]:
+def gradespan_overlap_mask(
+    low_grades: npt.NDArray, high_grades: npt.NDArray, school_low: int, school_high: int
+) -> npt.NDArray:
     """
-    Based on https://stackoverflow.com/q/43020919/190597
-
-    Used to find the [20] nearest schools to the selected school.
-
-    Takes a dataframe of schools and their Lat and Lon coordinates and the index of the
-    selected school within that list. Calculates the distances of all schools in the
-    dataframe from the lat/lon coordinates of the selected school using the scipy.spatial
-    KDTree method, which is reasonably quick.
-
-    Other (maybe faster) options:
-    https://stackoverflow.com/questions/64996186/find-closest-lat-lon-observation-from-one-pandas-dataframe-for-each-observatio
-    https://stackoverflow.com/questions/71553537/how-to-find-nearest-nearest-place-by-lat-long-quickly
-    https://medium.com/bukalapak-data/geolocation-search-optimization-5b2ff11f013b
-    https://stackoverflow.com/questions/57974283/retreiving-neighbors-with-geohash-algorithm
+    Tests whether each school has sufficient grade overlap with the selected
+    school.
 
     Args:
-        school_idx (pd.Index): the dataFrame index of the selected school
-        data (pd.DataFrame): a dataframe of schools and their lat/lon coordinates
+        low_grades (np.ndarray): Low Grade (0-12) of each school
+        high_grades (np.ndarray): High Grade (0-12) of each school
+        school_low (int): Low Grade of the selected school
+        school_high (int): High Grade of the selected school
 
     Returns:
-        index (np.ndarray) & distance (np.ndarray): an array of dataframe indexes
-        and an array of distances (in miles)
-    """
-    data = values.copy()
-
-    # number of schools to return (add 1 to account for the fact that the selected school
-    # is included in the return set) - number needs to be high enough to ensure there are
-    # enough left once non-comparable grades are filtered out.
-    num_hits = 41
-
-    # the radius of earth in miles. For kilometers use 6372.8 km
-    R = 3959.87433
-
-    # as the selected school already exists in the "data" df,
-    # just pass in index and use that to find it
-    for col in data.columns:
-        data[col] = pd.to_numeric(data[col], errors="coerce")
-
-    phi = np.deg2rad(data["Lat"])
-    theta = np.deg2rad(data["Lon"])
-    data["x"] = R * np.cos(phi) * np.cos(theta)
-    data["y"] = R * np.cos(phi) * np.sin(theta)
-    data["z"] = R * np.sin(phi)
-
-    tree = spatial.KDTree(data[["x", "y", "z"]])
-
-    # gets a list of the indexes and distances in the data tree that
-    # match the [num_hits] number of "nearest neighbor" schools
-    distance, index = tree.query(data.iloc[school_idx][["x", "y", "z"]], k=num_hits)
-
-    return index, distance
-
-
-def check_for_gradespan_overlap(school_id: str, schools: pd.DataFrame) -> pd.DataFrame:
+        np.ndarray: boolean array - True where the school has sufficient grade overlap
     """
-    Gets the Low and High grades (0-12) for a selected school and then removes all
-    schools from the supplied dataframe where there is no, or less than a specified
-    number of grades that overlap with the selected school.
-
-    Args:
-        school_id (string): numeric id of the selected school
-        schools (pd.DataFrame): a dataframe of all possible comparison schools
-
-    Returns:
-        schools (pd.DataFrame): a dataframe filtered by the above condition
-    """
-
     # "overlap" should be one less than the the number of grades that we want as a
     # minimum (a value of "1" means a 2 grade overlap, "2" means 3 grade overlap, etc.).
     overlap = 1
 
-    schools = schools.replace({"Low Grade": {"PK": 0, "KG": 1}})
-
-    schools["Low Grade"] = schools["Low Grade"].astype(int)
-    schools["High Grade"] = schools["High Grade"].astype(int)
-    school_grade_span = (
-        schools.loc[schools["School ID"] == int(school_id)][["Low Grade", "High Grade"]]
-        .values[0]
-        .tolist()
-    )
-    school_low = school_grade_span[0]
-    school_high = school_grade_span[1]
-
     # In order to fit within the distance parameters, the tested school must:
     #   a)  have a low grade that is less than or equal to the selected school and
     #       a high grade minus the selected school's low grade that is greater than or
@@ -729,77 +826,178 @@ def check_for_gradespan_overlap(school_id: str, schools: pd.DataFrame) -> pd.Dat
     #       low grade, but high grade (4) minus the selected school's low grade (5) is not greater
     #       (-1) than the overlap (1).
 
-    schools = schools.loc[
-        (
-            (schools["Low Grade"] <= school_low)
-            & (schools["High Grade"] - school_low >= overlap)
-        )
-        | (
-            (schools["Low Grade"] >= school_low)
-            & (school_high - schools["Low Grade"] >= overlap)
-        ),
-        :,
-    ]
+    return (
+        (low_grades <= school_low) & (high_grades - school_low >= overlap)
+    ) | (
+        (low_grades >= school_low) & (school_high - low_grades >= overlap)
+    )
 
-    schools = schools.reset_index(drop=True)
 
-    return schools
+class SchoolSpatialIndex:
+    """
+    A KDTree of school locations for a single year and school type, built
+    once and reused for every comparison school search against that set.
+    The original (per request) approach took ~0.8 - 1.2s, most of it spent
+    converting coordinates and building the tree.
+
+    Based on https://stackoverflow.com/q/43020919/190597. Lat/Lon coordinates
+    are converted to 3-D cartesian coordinates so that euclidean distance can
+    be used. Other (maybe faster) options:
+    https://stackoverflow.com/questions/64996186/find-closest-lat-lon-observation-from-one-pandas-dataframe-for-each-observatio
+    https://stackoverflow.com/questions/71553537/how-to-find-nearest-nearest-place-by-lat-long-quickly
+    https://medium.com/bukalapak-data/geolocation-search-optimization-5b2ff11f013b
+    https://stackoverflow.com/questions/57974283/retreiving-neighbors-with-geohash-algorithm
 
+    Args:
+        schools (pd.DataFrame): Lat, Lon, School ID, School Name, Low Grade, High
+        Grade, and (optionally) "Total|ELA Total Tested" for each school
+    """
 
-def calculate_comparison_school_list(
-    school_id: str,
-    schools: pd.DataFrame,
-    max: int,
-) -> pd.DataFrame:
-    school_idx = schools[schools["School ID"] == int(school_id)].index
+    # the radius of earth in miles. For kilometers use 6372.8 km
+    R = 3959.87433
+
+    def __init__(self, schools: pd.DataFrame):
+        data = schools.copy()
 
-    # NOTE: This should never ever happen because we've already determined
-    # that the school exists in the check above. However, it did happen once,
-    # somehow, so we leave this in here just in case.
-    if school_idx.size == 0:
-        return [], [], []
+        to_numeric_columns(data, ["Lat", "Lon", "School ID"])
 
-    # kdtree spatial tree function returns two np arrays: an array of
-    # indexes and an array of distances
-    index_array, dist_array = find_nearest(school_idx, schools)
+        # schools without coordinates cannot be placed in the tree
+        data = data.dropna(subset=["Lat", "Lon", "School ID"]).reset_index(drop=True)
 
-    index_list = index_array[0].tolist()
-    distance_list = dist_array[0].tolist()
+        low_grades = data["Low Grade"].replace({"PK": 0, "KG": 1})
 
-    # Match School ID with indexes
-    closest_schools = pd.DataFrame()
+        self.school_ids = data["School ID"].astype(int).to_numpy()
+        self.school_names = data["School Name"].to_numpy()
+        self.low_grades = pd.to_numeric(low_grades, errors="coerce").to_numpy()
+        self.high_grades = pd.to_numeric(data["High Grade"], errors="coerce").to_numpy()
 
-    closest_schools["School ID"] = schools[schools.index.isin(index_list)]["School ID"]
+        if "Total|ELA Total Tested" in data.columns:
+            self.tested = as_numeric(data["Total|ELA Total Tested"]).to_numpy()
+        else:
+            self.tested = None
+
+        self.positions = {school_id: i for i, school_id in enumerate(self.school_ids)}
+
+        phi = np.deg2rad(data["Lat"].to_numpy())
+        theta = np.deg2rad(data["Lon"].to_numpy())
+        self.coordinates = np.column_stack(
+            [
+                self.R * np.cos(phi) * np.cos(theta),
+                self.R * np.cos(phi) * np.sin(theta),
+                self.R * np.sin(phi),
+            ]
+        )
 
-    # Merge the index and distances lists into a dataframe
-    distances = pd.DataFrame({"index": index_list, "y": distance_list})
-    distances = distances.set_index(list(distances)[0])
+        self.tree = spatial.KDTree(self.coordinates) if len(data.index) > 0 else None
+
+    def __contains__(self, school_id) -> bool:
+        return int(school_id) in self.positions
+
+    def __len__(self) -> int:
+        return len(self.school_ids)
+
+    def tested_count(self, school_id) -> float:
+        """
+        Returns:
+            float: "Total|ELA Total Tested" for the school (NaN if not available)
+        """
+        if self.tested is None or school_id not in self:
+            return np.nan
+
+        return self.tested[self.positions[int(school_id)]]
+
+    def nearest(
+        self, school_id, k: int, check_gradespan: bool = True, min_tested: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest schools to the selected school (excluding the selected
+        school), considering only those schools that have at least min_tested
+        tested students and, if check_gradespan is True, that pass the grade span
+        overlap test in gradespan_overlap_mask().
+
+        Args:
+            school_id (string|int): numeric id of the selected school
+            k (int): the maximum number of schools to return
+            check_gradespan (bool): whether to apply the grade span overlap filter
+            min_tested (int): the minimum "Total|ELA Total Tested" (k8 only)
+
+        Returns:
+            positions (np.ndarray) & distance (np.ndarray): positions of the schools
+            in the index and distances (in miles), in order of increasing distance
+        """
+        if self.tree is None or school_id not in self:
+            return np.array([], dtype=int), np.array([])
+
+        school_position = self.positions[int(school_id)]
+
+        mask = np.ones(len(self.school_ids), dtype=bool)
+
+        if check_gradespan:
+            mask &= gradespan_overlap_mask(
+                self.low_grades,
+                self.high_grades,
+                self.low_grades[school_position],
+                self.high_grades[school_position],
+            )
 
-    # Merge School ID with Distances by index
-    combined = closest_schools.join(distances)
+        if min_tested and self.tested is not None:
+            mask &= self.tested >= min_tested
 
-    # Merge the original df with the combined distance/SchoolID df
-    # (essentially just adding School Name)
-    comparison_set = pd.merge(combined, schools, on="School ID", how="inner")
-    comparison_set = comparison_set.rename(columns={"y": "Distance"})
+        mask[school_position] = False
 
-    # drop selected school (so it cannot be selected in the dropdown)
-    comparison_set = comparison_set.drop(
-        comparison_set[comparison_set["School ID"] == int(school_id)].index
-    )
+        eligible = int(mask.sum())
+        k = min(k, eligible)
 
-    # limit maximum dropdown to the [n] closest schools
-    num_schools_expanded = max
+        if k == 0:
+            return np.array([], dtype=int), np.array([])
 
-    comparison_set = comparison_set.sort_values(by=["Distance"], ascending=True)
+        # query progressively more neighbors until k of them pass the filters
+        num_hits = min(2 * k + 1, len(self.school_ids))
 
-    comparison_dropdown = comparison_set.head(num_schools_expanded)
+        while True:
+            distance, index = self.tree.query(
+                self.coordinates[school_position], k=num_hits
+            )
+            distance = np.atleast_1d(distance)
+            index = np.atleast_1d(index)
+
+            keep = mask[index]
+
+            if keep.sum() >= k or num_hits == len(self.school_ids):
+                break
+
+            num_hits = min(num_hits * 2, len(self.school_ids))
+
+        return index[keep][:k], distance[keep][:k]
+
+
+def calculate_comparison_school_list(
+    school_id: str,
+    spatial_index: SchoolSpatialIndex,
+    max: int,
+    check_gradespan: bool = True,
+    min_tested: int = 0,
+) -> dict:
+    """
+    Args:
+        school_id (string): numeric id of the selected school
+        spatial_index (SchoolSpatialIndex): the spatial index for the selected year
+        and school type
+        max (int): the maximum number of comparison schools
+        check_gradespan (bool): whether to apply the grade span overlap filter
+        min_tested (int): the minimum "Total|ELA Total Tested" (k8 only)
 
-    comparison_dict = dict(
-        zip(comparison_dropdown["School Name"], comparison_dropdown["School ID"])
+    Returns:
+        dict: School Name: School ID of the [max] closest comparable schools, in
+        order of increasing distance from the selected school
+    """
+    positions, _ = spatial_index.nearest(
+        school_id, max, check_gradespan=check_gradespan, min_tested=min_tested
     )
 
     # final list will be displayed in order of increasing distance from selected school
-    comparison_list = dict(comparison_dict.items())
+    comparison_list = dict(
+        zip(spatial_index.school_names[positions], spatial_index.school_ids[positions].tolist())
+    )
 
     return comparison_list
\ No newline at end of file
@@ -0,0 +1,421 @@
+##########################################
+# ICSB Dashboard - Callback Output Cache #
+##########################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# The large page callbacks are pure functions of their inputs and the data
+# being served, but build the same component trees every time anyone opens
+# the same school and year. cached_callback() memoizes their (pickled)
+# outputs, keyed by the callback, its arguments, the state of the database
+# file and the data version being served (see data_version_key()), and the
+# authorization scope of the logged in user (admin, network group, or school
+# login), so an output is never served to a user with a different set of
+# schools. Nothing is cached outside of a request by a logged in user.
+#
+# CALLBACK_CACHE selects the store: "disk" (default), an sqlite file at
+# CALLBACK_CACHE_PATH shared by all of the worker processes on the server,
+# "memory" (per process), or "off". Entries expire after CALLBACK_CACHE_TTL
+# seconds and the least recently used entries are evicted when the store is
+# larger than CALLBACK_CACHE_MAX_BYTES.
+#
+# NOTE: outputs are stored pickled, and unpickling runs code - anyone who can
+# write to the disk store can run code in the app. The file is created (and
+# kept) readable and writable by the server's user only; CALLBACK_CACHE_PATH
+# must be in a directory that no other user can write to.
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from dash import DiskcacheManager
+from flask import has_request_context
+from flask_login import current_user
+
+from .load_data import (
+    data_version, get_database_signature, pin_data_version, unpin_data_version,
+    dispose_inherited_connections
+)
+
+callback_cache_backend = os.getenv("CALLBACK_CACHE", "disk")
+callback_cache_path = os.getenv("CALLBACK_CACHE_PATH", "data/callback_cache.db")
+CALLBACK_CACHE_TTL = float(os.getenv("CALLBACK_CACHE_TTL", "3600"))
+CALLBACK_CACHE_MAX_BYTES = int(os.getenv("CALLBACK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# the number of background callback jobs that can run at the same time on the
+# server (by all of the worker processes), see BackgroundCallbackManager. 0
+# for no limit.
+BACKGROUND_CALLBACK_WORKERS = int(
+    os.getenv("BACKGROUND_CALLBACK_WORKERS", str(os.cpu_count() or 4))
+)
+
+
+class MemoryStore:
+    """
+    Per process LRU store of (expiry time, pickled output) by key.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += len(value)
+
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class DiskStore:
+    """
+    LRU store in an sqlite file that any number of processes can share. Each
+    thread has its own connection. A store that is locked (or cannot be
+    written) behaves like a miss - callbacks are never blocked on the cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # owner only (see above) - sqlite gives the -wal and -shm files the
+        # same permissions as the database file
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS callback_cache (
+                    Key TEXT PRIMARY KEY, Value BLOB, Size INTEGER,
+                    Expires REAL, Accessed REAL)
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_callback_cache_accessed "
+                "ON callback_cache (Accessed)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1)
+            self._local.conn = conn
+
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT Value, Expires FROM callback_cache WHERE Key = ?", (key,)
+                ).fetchone()
+
+                if row is None:
+                    return None
+
+                if row[1] < now:
+                    conn.execute("DELETE FROM callback_cache WHERE Key = ?", (key,))
+                    return None
+
+                conn.execute(
+                    "UPDATE callback_cache SET Accessed = ? WHERE Key = ?", (now, key)
+                )
+
+                return row[0]
+
+        except sqlite3.Error:
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO callback_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + ttl, now),
+                )
+                conn.execute("DELETE FROM callback_cache WHERE Expires < ?", (now,))
+
+                # keep the most recently used entries that fit in max_bytes
+                conn.execute(
+                    """
+                    DELETE FROM callback_cache WHERE Key IN (
+                        SELECT Key FROM (
+                            SELECT Key, SUM(Size) OVER (ORDER BY Accessed DESC, Key) AS Total
+                            FROM callback_cache)
+                        WHERE Total > ?)
+                    """,
+                    (self.max_bytes,),
+                )
+
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM callback_cache")
+        except sqlite3.Error:
+            pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_callback_store():
+    """
+    Returns:
+        MemoryStore|DiskStore: the store selected by CALLBACK_CACHE (created on
+        first use), or None if caching is off
+    """
+    global _store
+
+    if callback_cache_backend not in ("disk", "memory"):
+        return None
+
+    with _store_lock:
+        if _store is None:
+            if callback_cache_backend == "disk":
+                _store = DiskStore(callback_cache_path, CALLBACK_CACHE_MAX_BYTES)
+            else:
+                _store = MemoryStore(CALLBACK_CACHE_MAX_BYTES)
+
+        return _store
+
+
+def authorization_scope():
+    """
+    The set of schools the logged in user can see, following the charter
+    dropdown in app.py: every school (admin), a network's schools, or the
+    school of a school login.
+
+    Returns:
+        tuple: ("admin",), ("network", group id), or ("school", user id), or
+        None if there is no request or logged in user
+    """
+    if not has_request_context() or not current_user or not current_user.is_authenticated:
+        return None
+
+    if current_user.id == 0:
+        return ("admin",)
+
+    if current_user.group_id < 0:
+        return ("network", abs(current_user.group_id))
+
+    return ("school", current_user.id)
+
+
+def data_version_key():
+    """
+    The database file can change without a reload (the data is then read
+    from the new file, as run_query() does) and a reload can swap in a new
+    snapshot without changing the file, so both are part of the key.
+
+    Returns:
+        tuple: the signature of the database file (see
+        load_data.get_database_signature()) and of the version being served
+    """
+    return (get_database_signature(), data_version().signature)
+
+
+# values (in addition to the inputs) that key the results of background
+# callbacks, see app.py. Computed in the request that starts the job - the
+# job itself runs in another process, without a request or logged in user
+background_cache_by = [authorization_scope, data_version_key]
+
+
+class BackgroundCallbackManager(DiskcacheManager):
+    """
+    DiskcacheManager that limits the number of jobs running at once and does
+    not keep the result of a job that raised.
+
+    DiskcacheManager forks a new process for every job. Here each job also
+    takes one of [workers] slots (a file in [cache directory]/job_slots, locked
+    with flock before the fork and held by the job process until it exits or
+    is terminated), and a request that starts a job waits while all of the
+    slots are taken. Where flock is not available (Windows), there is no
+    limit.
+
+    With cache_by, Dash keeps every result (including the error of a failed
+    job) for expire seconds and replays it to everyone in the same
+    authorization scope. An error is returned once, to the request that
+    started the job, and the next request runs the callback again.
+
+    Args:
+        cache (diskcache.Cache): the job queue and results
+        cache_by (list): see DiskcacheManager
+        expire (float): see DiskcacheManager
+        workers (int): the number of slots (0 for no limit)
+    """
+
+    def __init__(
+        self, cache, cache_by=None, expire=None, workers=BACKGROUND_CALLBACK_WORKERS
+    ):
+        super().__init__(cache, cache_by=cache_by, expire=expire)
+        self.workers = workers
+        self.slot_path = os.path.join(cache.directory, "job_slots")
+
+    def _acquire_slot(self):
+        """
+        Returns:
+            the open (and locked) file of a free slot, once there is one, or
+            None if there is no limit
+        """
+        if fcntl is None or self.workers <= 0:
+            return None
+
+        os.makedirs(self.slot_path, exist_ok=True)
+
+        while True:
+            for i in range(self.workers):
+                slot = open(os.path.join(self.slot_path, str(i)), "a")
+
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except BlockingIOError:
+                    slot.close()
+
+            time.sleep(0.05)
+
+    def call_job_fn(self, key, job_fn, args, context):
+        slot = self._acquire_slot()
+
+        try:
+            return super().call_job_fn(key, job_fn, args, context)
+        finally:
+            # the lock is shared with the forked job, which keeps it
+            if slot is not None:
+                slot.close()
+
+    def get_result(self, key, job):
+        result = super().get_result(key, job)
+
+        if isinstance(result, dict) and "long_callback_error" in result:
+            self.clear_cache_entry(key)
+
+        return result
+
+
+def cached_callback(ttl: float = None):
+    """
+    Memoizes a Dash callback (apply below @callback). Outputs that cannot be
+    pickled, and callbacks that raise (e.g., PreventUpdate), are not cached.
+
+    Args:
+        ttl (float): seconds an output is kept (default: CALLBACK_CACHE_TTL)
+    """
+
+    def decorator(function):
+        name = function.__module__ + "." + function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args):
+            store = get_callback_store()
+            scope = authorization_scope()
+
+            if store is None or scope is None:
+                return function(*args)
+
+            key = hashlib.sha256(
+                repr((name, args, scope, data_version_key())).encode()
+            ).hexdigest()
+
+            value = store.get(key)
+
+            if value is not None:
+                return pickle.loads(value)
+
+            result = function(*args)
+
+            try:
+                value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                return result
+
+            store.set(key, value, CALLBACK_CACHE_TTL if ttl is None else ttl)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def background_job():
+    """
+    Runs a background callback (apply below @callback) on the data version of
+    the request that started it (see load_data.pin_data_version()), which is
+    the version its result is cached under (see data_version_key()), even if
+    new data is loaded before the job is done. Each job runs in a process
+    forked from a worker, and opens its own database connections.
+    """
+
+    def decorator(function):
+
+        @wraps(function)
+        def wrapper(*args):
+            token = pin_data_version()
+            dispose_inherited_connections()
+
+            try:
+                return function(*args)
+            finally:
+                unpin_data_version(token)
+
+        return wrapper
+
+    return decorator
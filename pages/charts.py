@@ -15,7 +15,7 @@ from typing import Tuple
 
 from .calculations import check_for_insufficient_n_size, check_for_no_data
 from .string_helpers import customwrap
-from .load_data import get_school_index
+from .load_data import school_directory
 from .globals import color
 
 
@@ -1267,8 +1267,8 @@ def make_group_bar_chart(
     """
     data = values.copy()
 
-    selected_school = get_school_index(str(school_id))
-    school_name = selected_school["School Name"].values[0]
+    selected_school = school_directory.get(str(school_id))
+    school_name = selected_school.school_name
 
     if "Low Grade" in data:
         data = data.drop(["Low Grade", "High Grade"], axis=1)
@@ -17,10 +17,12 @@ import plotly.graph_objects as go
 from .globals import max_display_years
 
 from .load_data import (
-    get_school_index,
+    school_directory,
     get_financial_data,
     get_financial_ratios,
 )
+
+from .callback_cache import cached_callback
 from .tables import no_data_page, no_data_table, create_financial_analysis_table
 from .charts import loading_fig
 from .calculations import round_nearest
@@ -37,12 +39,12 @@ dash.register_page(__name__, path="/financial_analysis", top_nav=True, order=3)
     State("financial-analysis-radio", "value"),
 )
 def financial_analysis_radio_selector(school: str, finance_value_state: str):
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
 
     value_default = "school-finance"
     finance_value = value_default
 
-    if selected_school["Network"].values[0] == "None":
+    if selected_school.network is None:
         finance_options = []
         radio_input_container = {"display": "none"}
 
@@ -57,7 +59,7 @@ def financial_analysis_radio_selector(school: str, finance_value_state: str):
         # when changing dropdown from a school with network to one without, we need to reset state
         if (
             finance_value_state == "network-finance"
-            and selected_school["Network"].values[0] == "None"
+            and selected_school.network is None
         ):
             finance_value = value_default
         else:
@@ -87,6 +89,7 @@ def financial_analysis_radio_selector(school: str, finance_value_state: str):
     Input("year-dropdown", "value"),
     Input(component_id="financial-analysis-radio", component_property="value"),
 )
+@cached_callback()
 def update_financial_analysis_page(school: str, year: str, radio_value: str):
     if not school:
         raise PreventUpdate
@@ -99,12 +102,12 @@ def update_financial_analysis_page(school: str, year: str, radio_value: str):
     empty_container = {"display": "none"}
     no_data_to_display = no_data_page("No Data to Display.", selected_year_string + " Financial Analysis")
 
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
 
     # ensure consistent data display throughout
     display_years = [str(previous_year_numeric)] + [year]
 
-    if selected_school["Guest"].values[0] == "Y":
+    if selected_school.guest:
         financial_analysis_notes_string = "SAMPLE DATA"
     else:
         financial_analysis_notes_string = (
@@ -112,9 +115,9 @@ def update_financial_analysis_page(school: str, year: str, radio_value: str):
         )
 
     if radio_value == "network-finance":
-        network_id = selected_school["Network"].values[0]
+        network_id = selected_school.network
 
-        if network_id != "None":
+        if network_id is not None:
             financial_data = get_financial_data(network_id)
         else:
             financial_data = {}
@@ -133,12 +136,12 @@ def update_financial_analysis_page(school: str, year: str, radio_value: str):
 
     else:
         # NOTE: If the selected school is a guest school, load dummy data.
-        if selected_school["Guest"].values[0] == "Y":
+        if selected_school.guest:
             school = "9999"
 
         financial_data = get_financial_data(school)
 
-        if selected_school["Network"].values[0] == "None":
+        if selected_school.network is None:
             RandE_title = selected_year_string + " Revenue and Expenses"
             AandL_title = selected_year_string + " Assets and Liabilities"
             FP_title = "2-Year Financial Position"
@@ -540,7 +543,7 @@ def update_financial_analysis_page(school: str, year: str, radio_value: str):
             # cannot use create_analysis_table() function here because of need for special operations
             # In addition, these values come from a separate data set, so may be empty even if other
             # data is available
-            school_corp = int(selected_school["Corporation ID"].values[0])
+            school_corp = selected_school.corporation_id
             financial_ratios_data = get_financial_ratios(school_corp)
             ratio_years = financial_ratios_data["Year"].astype(str).tolist()
 
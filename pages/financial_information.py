@@ -6,14 +6,14 @@
 # date:     03/25/24
 
 import dash
-from dash import html, dash_table, Input, State, Output, callback
+from dash import dcc, html, dash_table, Input, State, Output, callback, clientside_callback
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import pandas as pd
 import numpy as np
 
 from .globals import max_display_years
-from .load_data import get_school_index, get_financial_data
+from .load_data import school_directory, get_financial_data
 from .tables import no_data_page
 
 dash.register_page(__name__, top_nav=True, path="/financial_information", order=1)
@@ -28,12 +28,12 @@ dash.register_page(__name__, top_nav=True, path="/financial_information", order=
     State("financial-information-radio", "value"),
 )
 def radio_finance_info_selector(school: str, finance_value_state: str):
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
 
     value_default = "school-finance"
     finance_value = value_default
 
-    if selected_school["Network"].values[0] == "None":
+    if selected_school.network is None:
         finance_options = []
         radio_input_container = {"display": "none"}
 
@@ -48,7 +48,7 @@ def radio_finance_info_selector(school: str, finance_value_state: str):
         # when changing dropdown from a school with network to one without, we need to reset state
         if (
             finance_value_state == "network-finance"
-            and selected_school["Network"].values[0] == "None"
+            and selected_school.network is None
         ):
             finance_value = value_default
         else:
@@ -59,69 +59,23 @@ def radio_finance_info_selector(school: str, finance_value_state: str):
     return finance_options, finance_value, radio_input_container
 
 
-@callback(
-    Output("financial-information-table", "children"),
-    Output("financial-information-main-container", "style"),
-    Output("financial-information-empty-container", "style"),
-    Output("financial-information-no-data", "children"),
-    Input("charter-dropdown", "value"),
-    Input("year-dropdown", "value"),
-    Input(component_id="financial-information-radio", component_property="value"),
-)
-def update_financial_information_page(school: str, year: str, radio_value: str):
-    if not school:
-        raise PreventUpdate
+def create_financial_information_table(
+    financial_data: pd.DataFrame, selected_year_numeric: int, table_title: str
+) -> list:
+    """
+    Creates the financial information table for a school or network.
 
-    selected_year_string = year
-    selected_year_numeric = int(selected_year_string)
-    selected_school = get_school_index(school)
-
-    main_container = {"display": "block"}
-    empty_container = {"display": "none"}
-    no_data_to_display = no_data_page(
-        "No Data to Display", selected_year_string + " Financial Information"
-    )
-
-    if radio_value == "network-finance":
-        network_id = selected_school["Network"].values[0]
-
-        # network financial data
-        if network_id != "None":
-            financial_data = get_financial_data(network_id)
-
-        else:
-            financial_data = pd.DataFrame()
-
-        table_title = (
-            selected_year_string + " Financial Information ("
-                + financial_data["School Name"][0] + ")"
-        )
-
-    else:
-        # school financial data
-        # NOTE: If the selected school is a guest school, load dummy data (Schooly McSchoolface).
-        if selected_school["Guest"].values[0] == "Y":
-            school = "9999"
-
-        financial_data = get_financial_data(school)
-
-        # don't display the school name in table title if the school isn't part of a network
-        if selected_school["Network"].values[0] == "None":
-            if selected_school["Guest"].values[0] == "Y":
-                table_title = selected_year_string + " Financial Information (SAMPLE DATA)"
-            else:
-                table_title = selected_year_string + " Financial Information"
-        else:
-            table_title = (
-                selected_year_string + " Financial Information ("
-                + financial_data["School Name"][0]
-                + ")"
-            )
+    Args:
+        financial_data (pd.DataFrame): school or network financial data
+        selected_year_numeric (int): the selected year
+        table_title (str): the table label
 
+    Returns:
+        list: the financial information table, or an empty list if there is
+        no data for the selected year
+    """
     if len(financial_data.columns) <= 1 or financial_data.empty:
         financial_information_table = []
-        main_container = {"display": "none"}
-        empty_container = {"display": "block"}
 
     else:
         financial_data = financial_data.drop(["School ID", "School Name"], axis=1)
@@ -368,16 +322,111 @@ def update_financial_information_page(school: str, year: str, radio_value: str):
 
         else:
             financial_information_table = []
-            main_container = {"display": "none"}
-            empty_container = {"display": "block"}
+
+    return financial_information_table
+
+
+@callback(
+    Output("financial-information-table", "children"),
+    Output("financial-information-network-table", "children"),
+    Output("financial-information-no-data", "children"),
+    Output("financial-information-visibility", "data"),
+    Input("charter-dropdown", "value"),
+    Input("year-dropdown", "value"),
+)
+def update_financial_information_page(school: str, year: str):
+    if not school:
+        raise PreventUpdate
+
+    selected_year_string = year
+    selected_year_numeric = int(selected_year_string)
+    selected_school = school_directory.get(school)
+
+    no_data_to_display = no_data_page(
+        "No Data to Display", selected_year_string + " Financial Information"
+    )
+
+    # school financial data
+    # NOTE: If the selected school is a guest school, load dummy data (Schooly McSchoolface).
+    if selected_school.guest:
+        school = "9999"
+
+    financial_data = get_financial_data(school)
+
+    # don't display the school name in table title if the school isn't part of a network
+    if selected_school.network is None:
+        if selected_school.guest:
+            table_title = selected_year_string + " Financial Information (SAMPLE DATA)"
+        else:
+            table_title = selected_year_string + " Financial Information"
+    else:
+        table_title = (
+            selected_year_string + " Financial Information ("
+            + financial_data["School Name"][0]
+            + ")"
+        )
+
+    financial_information_table = create_financial_information_table(
+        financial_data, selected_year_numeric, table_title
+    )
+
+    # network financial data - both tables are built and the financial
+    # information radio selects which one is displayed (in the browser)
+    network_information_table = []  # type: list
+    network_id = selected_school.network
+
+    if network_id is not None:
+        network_data = get_financial_data(network_id)
+
+        if not network_data.empty:
+            network_title = (
+                selected_year_string + " Financial Information ("
+                    + network_data["School Name"][0] + ")"
+            )
+
+            network_information_table = create_financial_information_table(
+                network_data, selected_year_numeric, network_title
+            )
+
+    visibility = {
+        "school-finance": len(financial_information_table) > 0,
+        "network-finance": len(network_information_table) > 0,
+    }
 
     return (
         financial_information_table,
-        main_container,
-        empty_container,
+        network_information_table,
         no_data_to_display,
+        visibility,
     )
 
+
+# financial data type (school or network) determines which table is displayed
+clientside_callback(
+    """
+    function(visibility, radio_value) {
+        const show = {"display": "block"};
+        const hide = {"display": "none"};
+        const network = radio_value === "network-finance";
+        const available = (visibility || {})[network ? "network-finance" : "school-finance"];
+
+        return [
+            network ? hide : show,
+            network ? show : hide,
+            available ? show : hide,
+            available ? hide : show,
+        ];
+    }
+    """,
+    Output("financial-information-table", "style"),
+    Output("financial-information-network-table", "style"),
+    Output("financial-information-main-container", "style"),
+    Output("financial-information-empty-container", "style"),
+    Input("financial-information-visibility", "data"),
+    Input("financial-information-radio", "value"),
+)
+
+
 def layout():
     return html.Div(
         [
@@ -408,6 +457,7 @@ def layout():
             html.Div(
                 [
                     html.Div(id="financial-information-table", children=[]),
+                    html.Div(id="financial-information-network-table", children=[]),
                 ],
                 id="financial-information-main-container",
             ),
@@ -417,6 +467,7 @@ def layout():
                 ],
                 id="financial-information-empty-container",
             ),
+            dcc.Store(id="financial-information-visibility"),
         ],
         id="main-container",
     )
\ No newline at end of file
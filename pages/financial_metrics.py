@@ -12,7 +12,7 @@ from dash.exceptions import PreventUpdate
 import pandas as pd
 
 from .globals import max_display_years
-from .load_data import get_school_index, get_financial_data
+from .load_data import school_directory, get_financial_data
 from .calculate_metrics import calculate_financial_metrics
 from .tables import no_data_page, no_data_table, create_proficiency_key
 from .string_helpers import convert_to_svg_circle
@@ -29,12 +29,12 @@ dash.register_page(__name__, top_nav=True, path="/financial_metrics", order=2)
     State("financial-metrics-radio", "value"),
 )
 def radio_finance_info_selector(school: str, finance_value_state: str):
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
 
     value_default = "school-finance"
     finance_value = value_default
 
-    if selected_school["Network"].values[0] == "None":
+    if selected_school.network is None:
         finance_options = []
         radio_input_container = {"display": "none"}
 
@@ -49,7 +49,7 @@ def radio_finance_info_selector(school: str, finance_value_state: str):
         # when changing dropdown from a school with network to one without, we need to reset state
         if (
             finance_value_state == "network-finance"
-            and selected_school["Network"].values[0] == "None"
+            and selected_school.network is None
         ):
             finance_value = value_default
         else:
@@ -78,7 +78,7 @@ def update_financial_metrics(school: str, year: str, radio_value: str):
 
     selected_year_string = year
     selected_year_numeric = int(selected_year_string)
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
 
     financial_indicators_container = {"display": "block"}
     main_container = {"display": "block"}
@@ -86,9 +86,9 @@ def update_financial_metrics(school: str, year: str, radio_value: str):
     no_data_to_display = no_data_page("No Data to Display.", selected_year_string + " Financial Metrics")
 
     if radio_value == "network-finance":
-        network_id = selected_school["Network"].values[0]
+        network_id = selected_school.network
 
-        if network_id != "None":
+        if network_id is not None:
             financial_data = get_financial_data(network_id)
         else:
             financial_data = {}
@@ -101,14 +101,14 @@ def update_financial_metrics(school: str, year: str, radio_value: str):
 
     else:
         # NOTE: If the selected school is a guest school, load dummy data (Schooly McSchoolface).
-        if selected_school["Guest"].values[0] == "Y":
+        if selected_school.guest:
             school = "9999"
 
         financial_data = get_financial_data(school)
 
         # don't display school name in title if the school isn't part of a network
-        if selected_school["Network"].values[0] == "None":
-            if selected_school["Guest"].values[0] == "Y":
+        if selected_school.network is None:
+            if selected_school.guest:
                 table_title = selected_year_string + " Financial Accountability (SAMPLE DATA)"
             else:
                 table_title = selected_year_string + " Financial Accountability Metrics"
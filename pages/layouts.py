@@ -5,9 +5,12 @@
 # version:  1.15
 # date:     02/21/24
 
+import json
+
 import pandas as pd
 import numpy as np
-from dash import html
+from dash import html, dcc, Patch
+from dash.development.base_component import Component
 import dash_bootstrap_components as dbc
 
 from .string_helpers import (
@@ -16,7 +19,7 @@ from .string_helpers import (
     identify_missing_categories,
     create_school_label,
 )
-from .charts import make_group_bar_chart, make_multi_line_chart, make_line_chart
+from .charts import loading_fig, make_group_bar_chart, make_multi_line_chart, make_line_chart
 from .tables import create_comparison_table, no_data_page, create_single_header_table
 
 
@@ -275,7 +278,7 @@ def create_barchart_layout(
             html.Div(
                 [
                     html.Div(
-                        [html.Div(table)],
+                        [html.Div(table, className="bar-chart-table")],
                         className="container__close eleven columns",
                     ),
                 ],
@@ -297,7 +300,7 @@ def create_barchart_layout(
                 [
                     html.Div(
                         [
-                            html.Div(table),
+                            html.Div(table, className="bar-chart-table"),
                             html.P(
                                 children=[
                                     html.Span(
@@ -330,6 +333,144 @@ def create_barchart_layout(
     return layout
 
 
+# The parts of a create_barchart_layout() layout that depend on the schools
+# being compared, found by component type or class name rather than by their
+# position in the layout (see patch_barchart_layout()).
+barchart_parts = {
+    "label": lambda c: isinstance(c, html.Label),
+    "graph": lambda c: isinstance(c, dcc.Graph),
+    "table": lambda c: _has_class(c, "bar-chart-table"),
+    "categories": lambda c: _has_class(c, "category-string"),
+    "schools": lambda c: _has_class(c, "school-string"),
+}
+
+
+def _has_class(component, name: str) -> bool:
+    return name in (getattr(component, "className", None) or "").split()
+
+
+def _find_component(node, match, path: tuple = ()):
+    """
+    Finds the first component (depth first) in a layout for which match is
+    True.
+
+    Args:
+        node: a layout (a component or a list of components)
+        match (callable): component -> bool
+        path (tuple): the path to node
+
+    Returns:
+        tuple: (path, component), where path is the list indexes and
+        ("props", "children") keys that lead to the component in the layout
+        as it is sent to the browser (the way a Patch addresses it), or None
+    """
+    if isinstance(node, (list, tuple)):
+        for i, child in enumerate(node):
+            found = _find_component(child, match, path + (i,))
+
+            if found is not None:
+                return found
+
+    elif isinstance(node, Component):
+        if match(node):
+            return path, node
+
+        children = getattr(node, "children", None)
+
+        if children is not None:
+            return _find_component(children, match, path + ("props", "children"))
+
+    return None
+
+
+def _find_barchart_parts(layout: list) -> dict:
+    """
+    Returns:
+        dict: name -> (path, component) for each of the barchart_parts in layout
+    """
+    parts = {}
+
+    for name, match in barchart_parts.items():
+        found = _find_component(layout, match)
+
+        if found is not None:
+            parts[name] = found
+
+    return parts
+
+
+def barchart_layout_shape(layout: list) -> str:
+    """
+    Identifies a chart created by create_barchart_layout() (see
+    patch_barchart_layout()): the kind of chart and where each of its parts
+    is in the layout. A patch is only applied to a displayed chart of the
+    same shape.
+
+    Args:
+        layout (list): a chart layout
+
+    Returns:
+        str: "bar" or "group" (the kind of chart) followed by the path of
+        each part, or "" if the layout is not a create_barchart_layout()
+        chart with data
+    """
+    parts = _find_barchart_parts(layout)
+
+    if not {"label", "graph", "table"} <= set(parts):
+        return ""
+
+    figure = parts["graph"][1].figure
+
+    if not getattr(figure, "data", None):
+        return ""
+
+    kind = "group" if figure.layout.barmode == "group" else "bar"
+
+    paths = {name: list(path) for name, (path, _) in parts.items()}
+
+    return kind + " " + json.dumps(paths, sort_keys=True)
+
+
+def _set_patch(patch: Patch, path: tuple, value):
+    for key in path[:-1]:
+        patch = patch[key]
+
+    patch[path[-1]] = value
+
+
+def patch_barchart_layout(layout: list) -> Patch:
+    """
+    Takes a create_barchart_layout() layout and returns a Patch that updates a
+    displayed layout of the same shape (see barchart_layout_shape()) to it. Only
+    the parts that depend on the schools being compared are sent (the chart
+    label, the figure traces and x axis, the table, and the missing category
+    and school strings) - the containers and the rest of the figure layout
+    (y axis, fonts, and template) stay in place.
+
+    Args:
+        layout (list): a create_barchart_layout() layout
+
+    Returns:
+        Patch: a partial update of the layout
+    """
+    parts = _find_barchart_parts(layout)
+
+    patch = Patch()
+
+    graph_path, graph = parts["graph"]
+    _set_patch(patch, graph_path + ("props", "figure", "data"), graph.figure.data)
+    _set_patch(
+        patch, graph_path + ("props", "figure", "layout", "xaxis"), graph.figure.layout.xaxis
+    )
+
+    for name in ["label", "table", "categories", "schools"]:
+        if name in parts:
+            path, component = parts[name]
+            _set_patch(patch, path + ("props", "children"), component.children)
+
+    return patch
+
+
 def create_line_fig_layout(table: list, fig: list, label: str) -> list:
     """
     Creates a layout combining a px.line fig and dash datatable. If table and fig are identical, it means
@@ -465,6 +606,33 @@ def create_radio_layout(page: str, group_catagory: str = "", width: str = "twelv
     return radio_button_group
 
 
+def create_loading_layout(page: str) -> html.Div:
+    """
+    Creates a (hidden) placeholder for a page whose callback runs in the
+    background: a loading fig and a progress message, shown by the running
+    argument of the callback while it computes.
+
+    Args:
+        page (str): a string identifying the page (e.g., "analysis-single"), used
+        as part of the container and progress id names
+
+    Returns:
+        loading_layout (html.Div): the "[page]-loading-container" div
+    """
+
+    loading_layout = html.Div(
+        [
+            dcc.Graph(figure=loading_fig(), config={"displayModeBar": False}),
+            html.P(id=page + "-progress", className="banner"),
+        ],
+        id=page + "-loading-container",
+        style={"display": "none"},
+        className="no-print",
+    )
+
+    return loading_layout
+
+
 def create_year_over_year_layout(school_id: str, data: pd.DataFrame, school_id_list: list,
                                  label: str, msg: str) -> list:
     """
@@ -16,129 +16,1498 @@
 # Financial - 2022 (Audited) / 2023 (Q4)
 # Graduation Rate - 2022
 
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import diskcache
 import pandas as pd
 import numpy as np
 import re
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
 
 from .calculations import (
     calculate_percentage, conditional_fillna, calculate_proficiency,
     recalculate_total_proficiency, conditional_fillna, calculate_graduation_rate,
-    calculate_sat_rate
+    calculate_sat_rate, SchoolSpatialIndex, calculate_comparison_school_list,
+    as_numeric, to_numeric_columns
+)
+
+from .suppressed import (
+    pack_suppression_mask, unpack_suppression_mask, as_suppressed
 )
 
 from .process_data import transpose_data
 
-# NOTE: Consider moving engine instantiation to app.py
-engine = create_engine("sqlite:///data/indiana_schools.db")
+from .snapshot import (
+    TableQuery, ArrowSnapshot, export_snapshot, pointer_name as snapshot_pointer_name
+)
+
+# NOTE: Consider moving engine instantiation to app.py
+# DATABASE_PATH can be set to use a different database (e.g., a synthetic
+# one for migrate_database.py audit --synthetic)
+database_path = os.getenv("DATABASE_PATH", "data/indiana_schools.db")
+
+engine = create_engine("sqlite:///" + database_path)
+
+users = create_engine("sqlite:///users.db")
+
+print("Database Engine Created . . .")
+
+# DATA_BACKEND selects where single table reads (TableQuery) come from:
+# "sqlite" (default) or "snapshot", a columnar (Parquet) copy of the database
+# at SNAPSHOT_PATH written by export_data_snapshot(). Everything else is
+# always read from sqlite. See use_data_backend().
+data_backend = os.getenv("DATA_BACKEND", "sqlite")
+
+snapshot_path = os.getenv("SNAPSHOT_PATH", "data/snapshot")
+
+data_snapshot = None
+
+
+def _open_data_snapshot(backend: str, path: str):
+    """
+    Returns:
+        ArrowSnapshot: a reader for the snapshot at path, or None if the
+        backend is sqlite or the snapshot cannot be opened (no snapshot at
+        path, or pyarrow is not installed)
+    """
+    if backend != "snapshot":
+        return None
+
+    try:
+        return ArrowSnapshot(path)
+    except (ImportError, OSError) as e:
+        print("Snapshot backend unavailable (" + str(e) + "), using sqlite")
+
+    return None
+
+
+def use_data_backend(backend: str, path: str = None):
+    """
+    Switches the backend used for TableQuery reads (see reload_data()).
+    Falls back to sqlite if the snapshot cannot be opened.
+
+    Args:
+        backend (string): "sqlite" or "snapshot"
+        path (string): snapshot directory (default: snapshot_path)
+
+    Returns:
+        string: the backend in use
+    """
+    global data_backend, snapshot_path
+
+    data_backend = backend
+    snapshot_path = path or snapshot_path
+
+    reload_data(force=True)
+
+    return "snapshot" if data_snapshot is not None else "sqlite"
+
+
+# Process-wide LRU cache of run_query results. The same (query, params) pairs
+# (e.g., school_index, financial_data, and academic_data_k8 rows for the
+# selected school) are requested by multiple callbacks every time a school
+# is selected, so we keep the cleaned dataframes in memory and hand out
+# copies. The cache is bounded by the (deep) memory size of the stored
+# dataframes and is flushed whenever the database file changes.
+QUERY_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+_query_cache_state = {
+    "bytes": 0,
+    "signature": None,
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "invalidations": 0,
+}
+
+
+def get_database_signature():
+    """
+    Identifies the current state of the database file. Any write to an sqlite
+    db changes its mtime and/or size, so this is a cheap way to tell whether
+    cached results are stale without opening a connection.
+
+    Returns:
+        tuple: (mtime_ns, size) of the database file (and of its -wal file
+        if there is one), or None if the db file cannot be found
+    """
+    try:
+        stat = os.stat(engine.url.database)
+    except (OSError, TypeError):
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    # in WAL mode, committed writes live in the -wal file until checkpoint
+    wal_path = engine.url.database + "-wal"
+    if os.path.exists(wal_path):
+        wal_stat = os.stat(wal_path)
+        signature = signature + (wal_stat.st_mtime_ns, wal_stat.st_size)
+
+    # a new snapshot replaces the CURRENT file
+    if data_backend == "snapshot":
+        pointer = os.path.join(snapshot_path, snapshot_pointer_name)
+        if os.path.exists(pointer):
+            signature = signature + (os.stat(pointer).st_mtime_ns,)
+
+    return signature
+
+
+def _make_query_cache_key(q, conditions):
+    """
+    Builds a hashable cache key from the compiled sql text and the bound
+    parameters. Parameter values are repr'd so that lists and other
+    unhashable values can still be used as part of the key.
+    """
+    if conditions:
+        params = tuple(sorted((k, repr(v)) for k, v in conditions.items()))
+    else:
+        params = ()
+
+    return (str(q), params)
+
+
+def _check_query_cache_signature():
+    """
+    Clears the query cache if the database has changed since the cache was
+    last populated. Must be called while holding _query_cache_lock.
+    """
+    signature = get_database_signature()
+
+    if signature != _query_cache_state["signature"]:
+        if _query_cache:
+            _query_cache_state["invalidations"] += 1
+        _query_cache.clear()
+        _query_cache_state["bytes"] = 0
+        _query_cache_state["signature"] = signature
+
+
+def clear_query_cache():
+    """
+    Empties the run_query result cache (counters are left intact).
+    """
+    with _query_cache_lock:
+        _query_cache.clear()
+        _query_cache_state["bytes"] = 0
+        _query_cache_state["signature"] = None
+
+
+def get_query_cache_stats():
+    """
+    Returns run_query cache counters.
+
+    Returns:
+        dict: hits, misses, evictions, invalidations, number of entries,
+        current size in bytes, and the maximum size in bytes
+    """
+    with _query_cache_lock:
+        return {
+            "hits": _query_cache_state["hits"],
+            "misses": _query_cache_state["misses"],
+            "evictions": _query_cache_state["evictions"],
+            "invalidations": _query_cache_state["invalidations"],
+            "entries": len(_query_cache),
+            "bytes": _query_cache_state["bytes"],
+            "max_bytes": QUERY_CACHE_MAX_BYTES,
+        }
+
+
+def _clean_column_names(columns) -> pd.Index:
+    """
+    sqlite column headers do not have spaces between words. But we need to display the column names,
+    so we have to do a bunch of str.replace to account for all conditions. May be a better way, but
+    this is pretty fast. Adding a space between any lowercase character and any uppercase/number
+    character takes care of most of it. The other replace functions catch edge cases.
+    """
+    columns = pd.Index(columns).astype(str)
+    columns = columns.str.replace(r"([a-z])([A-Z1-9%])", r"\1 \2", regex=True)
+    columns = columns.str.replace(
+        r"([WADTO])([CATPB&])", r"\1 \2", regex=True
+    )
+    columns = columns.str.replace("EBRWand", "EBRW and") # better way to do this?    
+    columns = columns.str.replace(r"([A])([a])", r"\1 \2", regex=True)
+    columns = columns.str.replace(r"([1-9])([(])", r"\1 \2", regex=True)
+    columns = columns.str.replace("or ", " or ")
+
+    return columns.astype(str)
+
+
+# Display names are a function of the sqlite column name only, so the rules in
+# _clean_column_names() are applied once per column name and once per result
+# layout (the column tuple of a query), and run_query() maps headers with a
+# dict lookup. The reverse mapping (display name -> column name, for building
+# queries from display names) is ColumnNameCatalog.
+_display_names = {}
+_display_name_layouts = {}
+
+
+def display_column_names(columns) -> pd.Index:
+    """
+    Args:
+        columns (iterable): sqlite column names
+
+    Returns:
+        pd.Index: the display names (see _clean_column_names())
+    """
+    layout = tuple(columns)
+
+    names = _display_name_layouts.get(layout)
+
+    if names is None:
+        new = [c for c in dict.fromkeys(layout) if c not in _display_names]
+
+        if new:
+            _display_names.update(zip(new, _clean_column_names(new)))
+
+        names = pd.Index([_display_names[c] for c in layout], dtype=object)
+        _display_name_layouts[layout] = names
+
+    return names
+
+
+def _select_columns(table, columns, *required) -> tuple:
+    """
+    The select list for a loader's columns argument (see
+    ColumnNameCatalog.select()): () for all columns if columns is None,
+    otherwise [columns] and the [required] columns (display names).
+    """
+    if columns is None:
+        return ()
+
+    return column_names.select(table, list(required) + list(columns))
+
+
+def _read_table(q):
+    """
+    Reads a TableQuery from the snapshot (if selected and the table is in
+    it) or from sqlite, of the DataVersion being served.
+    """
+    version = data_version()
+
+    if version.snapshot is not None and q.table in version.snapshot:
+        return version.snapshot.read(q)
+
+    sql, params = q.to_sql()
+
+    with version.engine.connect() as conn:
+        return pd.read_sql_query(text(sql), conn, params=params)
+
+
+def _execute_query(q, conditions):
+    """
+    Runs the query (sql text or a TableQuery) against the db and cleans up the column headers. If the
+    result includes the SuppressedMask column of a typed schema table, it is
+    decoded into df.attrs["suppressed"] (see as_suppressed()) and dropped.
+    """
+    if isinstance(q, TableQuery):
+        df = _read_table(q)
+    else:
+        with data_version().engine.connect() as conn:
+            df = pd.read_sql_query(q, conn, params=conditions)
+
+    suppressed = None
+
+    if suppression_mask_column in df.columns:
+        suppressed = _decode_suppression_mask(df)
+        df = df.drop(suppression_mask_column, axis=1)
+
+    raw_columns = df.columns
+
+    df.columns = display_column_names(df.columns)
+
+    if suppressed is not None:
+        suppressed.columns = suppressed.columns.map(dict(zip(raw_columns, df.columns)))
+        df.attrs["suppressed"] = suppressed
+
+    return df
+
+
+def run_query(q, *args):
+    """
+    Takes sql text query, gets query as a dataframe (read_sql is a convenience function
+    wrapper around read_sql_query), and perform a variety of basic clean up functions
+    If no data matches the query, an empty df is returned. Results are cached (LRU)
+    by query text and parameters and the cache is invalidated when the db changes.
+    Callers always receive a copy, so modifying the result does not affect the cache.
+
+    Args:
+        q (string): a sqlalchemy "text" query (or a TableQuery)
+        args (dict): a dict of query parameters
+    Returns:
+        pd.DataFrame: pandas dataframe of the query results
+    """
+    conditions = None
+
+    if args:
+        conditions = args[0]
+
+    # a request still running on a replaced version neither reads nor fills
+    # the cache (see pin_data_version())
+    if not _serving_current_version():
+        return _execute_query(q, conditions)
+
+    key = _make_query_cache_key(q, conditions)
+
+    with _query_cache_lock:
+        _check_query_cache_signature()
+        signature = _query_cache_state["signature"]
+
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            _query_cache_state["hits"] += 1
+            return _query_cache[key][0].copy()
+
+        _query_cache_state["misses"] += 1
+
+    df = _execute_query(q, conditions)
+
+    size = int(df.memory_usage(index=True, deep=True).sum())
+
+    # results larger than the entire cache are not stored
+    if size <= QUERY_CACHE_MAX_BYTES:
+        with _query_cache_lock:
+
+            # do not store the result if the db changed while we were reading it
+            if signature == _query_cache_state["signature"] and key not in _query_cache:
+                _query_cache[key] = (df.copy(), size)
+                _query_cache_state["bytes"] += size
+
+                while _query_cache_state["bytes"] > QUERY_CACHE_MAX_BYTES:
+                    _, (_, evicted_size) = _query_cache.popitem(last=False)
+                    _query_cache_state["bytes"] -= evicted_size
+                    _query_cache_state["evictions"] += 1
+
+    return df
+
+
+def get_current_year(db_engine=None):
+    """
+    the most recent academic year of data according to the k8 ilearn
+    data file
+
+    Args:
+        db_engine (sqlalchemy.Engine): the database (default: engine)
+
+    Returns:
+        int: an int representing the most recent year
+    """    
+    db = (db_engine or engine).raw_connection()
+    cur = db.cursor()
+    cur.execute(""" SELECT MAX(Year) FROM academic_data_k8 """)
+    year = cur.fetchone()[0]
+    db.close()
+
+    return year
+
+def get_network_count():
+    """
+    Helper function to dynamically count the number of network logins present
+    in the users database (identified with a negative group_id values). used to
+    determine the offset for creation of the charter dropdown in app.py. 
+
+    Returns:
+        int: the number of network logins
+    """    
+    db = users.raw_connection()
+    cur = db.cursor()
+    cur.execute(""" SELECT COUNT(groupid) FROM users WHERE groupid < 0 """)
+    count = cur.fetchone()[0]
+    count = count + 1
+    db.close()
+
+    return count
+
+
+# Hot reload. reload_data() picks up a new database (rows written by
+# ingest_academic_data.py, or a file installed with install_database()) or a
+# new snapshot (export_data_snapshot()) without a restart: a new engine and
+# snapshot reader are opened next to the old ones, the globals derived from
+# the data (current_academic_year, network_count) are recomputed with them,
+# and the new DataVersion is swapped in for subsequent requests. Each request
+# (and background job) pins the version that is current when it starts (see
+# pin_data_version()) and reads the engine and snapshot from it, so requests
+# that are already running finish on the old data - the old engine is disposed
+# and its snapshot released (see snapshot.py) when the last of them is done.
+# All caches are then emptied. start_data_reloader() checks for new data in
+# the background and rebuilds the in-memory data right away, so the first
+# requests after a reload do not find cold caches.
+@dataclass(frozen=True)
+class DataVersion:
+    """
+    The data being served. Use data_version() rather than the module globals
+    to read values that must come from the same version.
+    """
+    engine: object
+    snapshot: Optional[ArrowSnapshot]
+    signature: Optional[tuple]
+    current_academic_year: int
+    network_count: int
+
+
+_data_version = None
+_reload_lock = threading.Lock()
+
+_pinned_data_version = contextvars.ContextVar("pinned_data_version", default=None)
+
+
+def data_version() -> DataVersion:
+    """
+    Returns:
+        DataVersion: the version pinned by the running request (see
+        pin_data_version()), or the current version
+    """
+    return _pinned_data_version.get() or _data_version
+
+
+def pin_data_version() -> contextvars.Token:
+    """
+    Pins the version being served (see data_version()) to the current
+    context - a request or a background job - until unpin_data_version(), so
+    that a reload_data() in the meantime does not change the data it reads.
+
+    Returns:
+        contextvars.Token: pass to unpin_data_version()
+    """
+    return _pinned_data_version.set(data_version())
+
+
+def unpin_data_version(token: contextvars.Token):
+    _pinned_data_version.reset(token)
+
+
+def dispose_inherited_connections():
+    """
+    Called at the start of a forked process (a background callback job, see
+    callback_cache.background_job()): the pooled sqlite connections copied
+    from the parent are dropped without being closed (they still belong to
+    the parent), so that the process opens its own.
+    """
+    for db_engine in {engine, data_version().engine}:
+        db_engine.dispose(close=False)
+
+
+def _serving_current_version() -> bool:
+    """
+    Returns:
+        bool: False if the running request is pinned to a version that has
+        since been replaced - its results must not be cached
+    """
+    pinned = _pinned_data_version.get()
+
+    return pinned is None or pinned is _data_version
+
+
+def reload_data(force: bool = False) -> bool:
+    """
+    Swaps in a new DataVersion if the database or snapshot has changed since
+    the current one was loaded (or if force is True) and empties all caches.
+
+    Args:
+        force (bool): reload even if nothing has changed
+
+    Returns:
+        bool: True if a new version was swapped in
+    """
+    global _data_version, engine, data_snapshot, current_academic_year, network_count
+
+    with _reload_lock:
+        signature = get_database_signature()
+        previous = _data_version
+
+        if not force and previous is not None and signature == previous.signature:
+            return False
+
+        new_engine = engine if previous is None else create_engine("sqlite:///" + database_path)
+
+        version = DataVersion(
+            engine=new_engine,
+            snapshot=_open_data_snapshot(data_backend, snapshot_path),
+            signature=signature,
+            current_academic_year=get_current_year(new_engine),
+            network_count=get_network_count(),
+        )
+
+        # the engine is disposed when the last request pinned to the version is done
+        weakref.finalize(version, version.engine.dispose)
+
+        _data_version = version
+        engine = version.engine
+        data_snapshot = version.snapshot
+        current_academic_year = version.current_academic_year
+        network_count = version.network_count
+
+        if previous is not None:
+            clear_data_caches()
+
+    return True
+
+
+def install_database(path: str) -> bool:
+    """
+    Replaces the contents of the database at database_path with the database
+    built at path (using the sqlite backup api, so the copy is written in a
+    single transaction - running queries finish first and see the old data)
+    and reloads.
+
+    Args:
+        path (string): the new database
+
+    Returns:
+        bool: True if a new version was swapped in
+    """
+    source = sqlite3.connect(path)
+    target = sqlite3.connect(database_path)
+
+    try:
+        year = source.execute("SELECT MAX(Year) FROM academic_data_k8").fetchone()[0]
+
+        if year is None:
+            raise ValueError(path + " has no academic_data_k8 data")
+
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+    return reload_data()
+
+
+def clear_data_caches():
+    """
+    Empties the query cache and the get_academic_data() stage caches and
+    marks all in-memory data (DatabaseSnapshot) to be rebuilt.
+    """
+    clear_query_cache()
+    clear_academic_data_cache()
+
+    for snapshot in list(DatabaseSnapshot.instances):
+        snapshot.reload()
+
+
+def warm_data_caches():
+    """
+    Builds all in-memory data (DatabaseSnapshot) that is not already built.
+    """
+    for snapshot in list(DatabaseSnapshot.instances):
+        snapshot._refresh()
+
+
+def start_data_reloader(interval: float = None):
+    """
+    Starts a (daemon) thread that calls reload_data() every interval seconds
+    and warms the caches after each reload. Each worker process runs its own.
+
+    Args:
+        interval (float): seconds between checks (default: the
+            DATA_RELOAD_INTERVAL environment variable, or 60). 0 disables.
+
+    Returns:
+        threading.Thread: the reloader (None if disabled)
+    """
+    if interval is None:
+        interval = float(os.getenv("DATA_RELOAD_INTERVAL", "60"))
+
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+
+            try:
+                if reload_data():
+                    print("New data loaded (" + str(current_academic_year) + ")")
+                    warm_data_caches()
+            except Exception as e:
+                # keep serving the current version
+                print("Data reload failed: " + str(e))
+
+    thread = threading.Thread(target=run, name="data-reloader", daemon=True)
+    thread.start()
+
+    return thread
+
+
+reload_data()
+
+
+def get_excluded_years(year: str) -> list:
+    """
+    "excluded years" is a list of year strings (format YYYY) of all years
+    that are more recent than the selected year. it is used to filter data
+
+    Args:
+        year (str): a year string in format YYYY
+
+    Returns:
+        list: a list of year strings - all years more recent than selected year
+    """
+
+    excluded_years = []
+
+    current_year = data_version().current_academic_year
+
+    excluded_academic_years = int(current_year) - int(year)
+
+    for i in range(excluded_academic_years):
+        excluded_year = int(current_year) - i
+        excluded_years.append(excluded_year)
+
+    return excluded_years
+
+
+def year_condition(column: str, year) -> str:
+    """
+    Loaders that accept a year return data for that year and all earlier
+    years. This filters in the query (rather than dropping the rows for
+    get_excluded_years() afterwards) so later years are never read.
+
+    Args:
+        column (str): the year column ("Year" or "TestYear")
+        year (str|int|None): the selected year (bound as :year), None for
+            all years
+
+    Returns:
+        str: an "AND [column] <= :year" condition or an empty string
+    """
+    if year is None:
+        return ""
+
+    return "AND {} <= :year".format(column)
+
+
+# Indexes on the columns the loaders in this module filter on (SchoolID,
+# CorporationID, MajorityEnrolledSchoolID, Year, TestYear, STN), as
+# name -> (table, columns). Created and verified by migrate_database.py.
+database_indexes = {
+    "idx_school_index_school": ("school_index", ["SchoolID"]),
+    "idx_academic_data_k8_school_year": ("academic_data_k8", ["SchoolID", "Year"]),
+    "idx_academic_data_k8_year": ("academic_data_k8", ["Year"]),
+    "idx_academic_data_hs_school_year": ("academic_data_hs", ["SchoolID", "Year"]),
+    "idx_academic_data_hs_year_type": ("academic_data_hs", ["Year", "SchoolType"]),
+    "idx_academic_data_hs_type_year": ("academic_data_hs", ["SchoolType", "Year"]),
+    "idx_corporation_data_k8_corp_year": ("corporation_data_k8", ["CorporationID", "Year"]),
+    "idx_corporation_data_hs_corp_year": ("corporation_data_hs", ["CorporationID", "Year"]),
+    "idx_growth_data_school_year": ("growth_data", ["MajorityEnrolledSchoolID", "TestYear"]),
+    "idx_ilearn_student_school": ("ilearn_student", ["SchoolID"]),
+    "idx_iread_student_school_year": ("iread_student", ["SchoolID", "TestYear"]),
+    "idx_wida_stn_year": ("WIDA", ["STN", "Year"]),
+    "idx_financial_data_school": ("financial_data", ["SchoolID"]),
+    "idx_financial_ratios_corp": ("financial_ratios", ["CorporationID"]),
+    "idx_adm_all_corp": ("adm_all", ["CorporationID"]),
+    "idx_demographic_data_corp_corp": ("demographic_data_corp", ["CorporationID"]),
+    "idx_demographic_data_school_school": ("demographic_data_school", ["SchoolID"]),
+    # covering indexes for slices of one school (see get_academic_slice()) and
+    # of one test for all schools (see AcademicAvailabilityIndex)
+    "idx_academic_facts_entity": (
+        "academic_facts",
+        ["Source", "ID", "Category", "Subject", "Metric", "Year", "Value", "Suppressed"],
+    ),
+    "idx_academic_facts_metric": (
+        "academic_facts",
+        ["Source", "Subject", "Metric", "Category", "ID", "Year", "Value"],
+    ),
+    "idx_academic_fact_entities": ("academic_fact_entities", ["Source", "ID", "Year"]),
+    "idx_state_graduation_averages_year": ("state_graduation_averages", ["Year"]),
+    "idx_ahs_state_averages_year": ("ahs_state_averages", ["Year"]),
+    "idx_school_stns_school": ("school_stns", ["SchoolID", "STN"]),
+}
+
+# tables built from other tables (e.g., by build_academic_facts_table()).
+# The app falls back to the source tables when they do not exist, so their
+# indexes are only created and verified once they have been built.
+academic_fact_tables = ["academic_facts", "academic_fact_entities"]
+
+derived_tables = academic_fact_tables + [
+    "state_graduation_averages",
+    "ahs_state_averages",
+    "school_stns",
+]
+
+
+def _get_index_columns(conn, name):
+    rows = conn.execute(text('PRAGMA index_info("{}")'.format(name))).fetchall()
+
+    # (seqno, cid, name)
+    return [row[2] for row in sorted(rows)]
+
+
+def _table_exists(conn, table) -> bool:
+    q = text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :table")
+
+    return conn.execute(q, dict(table=table)).fetchone() is not None
+
+
+def _skip_index(conn, table) -> bool:
+    # derived tables are optional
+    return table in derived_tables and not _table_exists(conn, table)
+
+
+def create_database_indexes():
+    """
+    Creates each index in database_indexes that does not exist (or exists
+    with different columns).
+
+    Returns:
+        list: the names of the indexes that were created
+    """
+    created = []
+
+    with engine.begin() as conn:
+        for name, (table, columns) in database_indexes.items():
+            if _skip_index(conn, table):
+                continue
+
+            existing = _get_index_columns(conn, name)
+
+            if existing == columns:
+                continue
+
+            if existing:
+                conn.execute(text('DROP INDEX "{}"'.format(name)))
+
+            conn.execute(
+                text(
+                    'CREATE INDEX "{}" ON "{}" ({})'.format(
+                        name, table, ", ".join('"' + c + '"' for c in columns)
+                    )
+                )
+            )
+            created.append(name)
+
+    return created
+
+
+def verify_database_indexes():
+    """
+    Checks that each index in database_indexes exists with the right columns.
+
+    Returns:
+        dict: index name -> problem, for each index that is missing or wrong
+    """
+    problems = {}
+
+    with engine.connect() as conn:
+        for name, (table, columns) in database_indexes.items():
+            if _skip_index(conn, table):
+                continue
+
+            existing = _get_index_columns(conn, name)
+
+            if not existing:
+                problems[name] = "missing (" + table + ")"
+            elif existing != columns:
+                problems[name] = (
+                    "has columns " + ", ".join(existing) + ", expected "
+                    + ", ".join(columns)
+                )
+
+    return problems
+
+
+def _get_typed_column(values):
+    """
+    Returns:
+        tuple: (numeric values, suppressed mask) if the column only holds
+        numbers, "***", and blanks, otherwise None
+    """
+    is_string = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    stripped = values.astype(object).where(is_string).str.strip()
+
+    suppressed = (stripped == "***").to_numpy(dtype=bool)
+    blank = (stripped == "").to_numpy(dtype=bool)
+
+    numeric = pd.to_numeric(values.where(~(suppressed | blank)), errors="coerce")
+
+    if (values.notna().to_numpy() & ~suppressed & ~blank & numeric.isna().to_numpy()).any():
+        return None
+
+    present = numeric.dropna()
+
+    if len(present.index) > 0 and (present % 1 == 0).all():
+        numeric = numeric.astype("Int64")
+
+    return numeric, suppressed
+
+
+def convert_to_typed_schema(tables=None):
+    """
+    Rewrites the academic tables with a typed schema. Every category column
+    (a "|" in the name) that only holds numbers, "***", and blanks becomes an
+    INTEGER or REAL column (NULL for "***" and blanks) and the "***" cells are
+    recorded in a SuppressedMask blob per row. Reads then come back numeric
+    and run_query/as_suppressed() mark the suppressed cells without any string
+    parsing ("***" is only rendered for display). Can
+    be run again after new (text) rows are added to a typed table.
+
+    Args:
+        tables (list): tables to convert (default: typed_schema_tables)
+
+    Returns:
+        dict: table -> number of typed columns
+    """
+    if tables is None:
+        tables = typed_schema_tables
+
+    suppressed_columns.reload()
+    positions = dict(suppressed_columns.positions())
+
+    converted = {}
+
+    for table in tables:
+        with engine.connect() as conn:
+            data = pd.read_sql_query(text('SELECT * FROM "{}"'.format(table)), conn)
+
+        # a table that has already been converted keeps its existing flags
+        if suppression_mask_column in data.columns:
+            previous = _decode_suppression_mask(data)
+            data = data.drop(suppression_mask_column, axis=1)
+        else:
+            previous = pd.DataFrame(index=data.index)
+
+        masks = {}
+
+        for col in [c for c in data.columns if "|" in c]:
+            typed = _get_typed_column(data[col])
+
+            if typed is None:
+                continue
+
+            data[col], mask = typed
+
+            if col in previous.columns:
+                mask = mask | previous[col].to_numpy(dtype=bool)
+
+            masks[col] = mask
+
+            if mask.any() and col not in positions:
+                positions[col] = len(positions)
+
+        converted[table] = (data, masks)
+
+    with engine.begin() as conn:
+        for table, (data, masks) in converted.items():
+            mask = np.zeros((len(data.index), len(positions)), dtype=bool)
+
+            for col, flags in masks.items():
+                if col in positions:
+                    mask[:, positions[col]] = flags
+
+            data[suppression_mask_column] = pack_suppression_mask(mask)
+
+            data.to_sql(table, conn, if_exists="replace", index=False, chunksize=1000)
+
+        pd.DataFrame(
+            {"Position": list(positions.values()), "ColumnName": list(positions.keys())}
+        ).to_sql("suppressed_columns", conn, if_exists="replace", index=False)
+
+    # replacing a table drops its indexes
+    create_database_indexes()
+
+    return {table: len(masks) for table, (_, masks) in converted.items()}
+
+
+def export_data_snapshot(path: str = None) -> dict:
+    """
+    Exports every table to a columnar snapshot for the "snapshot" backend
+    (see use_data_backend()). Arrow columns have a single type, so the
+    academic tables must be converted to the typed schema first (see
+    convert_to_typed_schema()). Export again after the database changes.
+
+    Args:
+        path (string): snapshot directory (default: snapshot_path)
+
+    Returns:
+        dict: table -> number of rows
+    """
+    with engine.connect() as conn:
+        tables = [
+            row[0]
+            for row in conn.execute(
+                text(
+                    """
+                    SELECT name FROM sqlite_master
+                        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                        ORDER BY name
+                    """
+                )
+            )
+        ]
+
+        for table in typed_schema_tables:
+            columns = [
+                row[1] for row in conn.execute(text('PRAGMA table_info("{}")'.format(table)))
+            ]
+
+            if columns and suppression_mask_column not in columns:
+                raise ValueError(
+                    table + " is not typed, run migrate_database.py typed first"
+                )
+
+    return export_snapshot(engine, path or snapshot_path, tables)
+
+
+@dataclass(frozen=True)
+class School:
+    """
+    A single row of the school_index table with typed fields.
+    """
+    school_id: str
+    school_name: str
+    school_type: str
+    guest: bool
+    network: Optional[str]
+    geo_corp: Optional[int]
+    corporation_id: Optional[int]
+    group_id: Optional[int]
+
+
+def _to_int(value) -> Optional[int]:
+    """
+    Converts a school_index value to int, returning None for empty,
+    "None", or otherwise non-numeric values.
+    """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_id_string(value) -> Optional[str]:
+    """
+    Converts a school_index id value (which may be read as int, float, or
+    str) to the 4 digit string format used throughout the app, returning
+    None for empty and "None" values.
+    """
+    number = _to_int(value)
+
+    if number is None:
+        return None
+
+    return str(number)
+
+
+class DatabaseSnapshot(ABC):
+    """
+    Base class for in-memory data derived from the database. Subclasses
+    implement _build(), which reads whatever they need from the db and
+    returns the derived data. The data is built on first access and rebuilt
+    on the next access after the database file changes (see
+    get_database_signature()) or the data is reloaded (see reload_data()).
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self):
+        DatabaseSnapshot.instances.add(self)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._loaded = False
+        self._data = None
+
+    @abstractmethod
+    def _build(self):
+        """
+        Returns:
+            the data derived from the database
+        """
+
+    def _refresh(self):
+        """
+        Builds the data on first use and rebuilds it if the database has changed.
+        """
+        # not kept for a request still running on a replaced version
+        if not _serving_current_version():
+            return self._build()
+
+        signature = get_database_signature()
+
+        with self._lock:
+            if not self._loaded or signature != self._signature:
+                self._data = self._build()
+                self._signature = signature
+                self._loaded = True
+
+            return self._data
+
+    def reload(self):
+        """
+        Forces the data to be rebuilt from the database on the next access.
+        """
+        with self._lock:
+            self._loaded = False
+
+
+# Typed schema (see convert_to_typed_schema()): academic columns are stored as
+# INTEGER/REAL (NULL where IDOE reported "***") and each row has a
+# SuppressedMask blob with one bit per column listed in suppressed_columns.
+suppression_mask_column = "SuppressedMask"
+
+typed_schema_tables = [
+    "academic_data_k8",
+    "academic_data_hs",
+    "corporation_data_k8",
+    "corporation_data_hs",
+]
+
+
+class SuppressedColumnRegistry(DatabaseSnapshot):
+    """
+    Bit position of each column in the SuppressedMask blobs, read from the
+    suppressed_columns table (empty if the database is not typed).
+    """
+
+    def _build(self):
+        q = text("SELECT Position, ColumnName FROM suppressed_columns ORDER BY Position")
+
+        try:
+            with data_version().engine.connect() as conn:
+                registry = pd.read_sql_query(q, conn)
+        except OperationalError:
+            return {}
+
+        return dict(zip(registry["ColumnName"], registry["Position"].astype(int)))
+
+    def positions(self) -> dict:
+        return self._refresh()
+
+
+suppressed_columns = SuppressedColumnRegistry()
+
+
+# Column families, by name: a regex matched against the display names of a
+# table's columns. Loaders that take a columns argument accept family names as
+# well as display names (see ColumnNameCatalog.select()).
+column_families = {
+    # ILEARN proficiency breakdown (academic_information stacked bar charts)
+    "ilearn_proficiency": r"ELA Below|ELA At|ELA Approaching|ELA Above|ELA Total|Math Below|Math At|Math Approaching|Math Above|Math Total",
+}
+
+
+class ColumnNameCatalog(DatabaseSnapshot):
+    """
+    The columns of every table in the database: display name -> sqlite
+    column name (the reverse of display_column_names()) and the select lists
+    for loaders that read a subset of a table's columns.
+    """
+
+    def _build(self):
+        tables = {}
+
+        with data_version().engine.connect() as conn:
+            names = conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
 
-users = create_engine("sqlite:///users.db")
+            for (table,) in names:
+                info = conn.exec_driver_sql('PRAGMA table_info("{}")'.format(table))
+                tables[table] = [row[1] for row in info]
 
-print("Database Engine Created . . .")
+        columns = list(dict.fromkeys(c for table in tables.values() for c in table))
 
+        catalog = {}
+        for column, name in zip(columns, display_column_names(columns)):
+            catalog.setdefault(name, column)
 
-def run_query(q, *args):
-    """
-    Takes sql text query, gets query as a dataframe (read_sql is a convenience function
-    wrapper around read_sql_query), and perform a variety of basic clean up functions
-    If no data matches the query, an empty df is returned
+        return dict(names=catalog, tables=tables, selections={})
 
-    Args:
-        q (string): a sqlalchemy "text" query 
-        args (dict): a dict of query parameters
+    def query_name(self, name: str) -> str:
+        """
+        Args:
+            name (string): a display name
+
+        Returns:
+            string: the sqlite column name. Names that are not in the
+            database (e.g., a column that has not been added yet) have
+            their spaces removed, which reverses most display names.
+        """
+        catalog = self._refresh()["names"]
+
+        if name in catalog:
+            return catalog[name]
+
+        return name.replace(" ", "")
+
+    def select(self, table: str, columns) -> tuple:
+        """
+        Args:
+            table (string): a table
+            columns (iterable): display names and column_families names
+
+        Returns:
+            tuple: the sqlite columns of [table] (in table order) that are
+            named in [columns] or belong to one of the families, plus the
+            SuppressedMask column of a typed table. Empty (all columns) if
+            the table is not in the database.
+        """
+        data = self._refresh()
+
+        key = (table, tuple(columns))
+
+        if key not in data["selections"]:
+            table_columns = data["tables"].get(table, [])
+
+            names = set(columns)
+            families = [re.compile(column_families[c]) for c in names if c in column_families]
+
+            selected = tuple(
+                column
+                for column, name in zip(table_columns, display_column_names(table_columns))
+                if name in names
+                or column == suppression_mask_column
+                or any(f.search(name) for f in families)
+            )
+
+            data["selections"][key] = selected
+
+        return data["selections"][key]
+
+
+column_names = ColumnNameCatalog()
+
+
+def _decode_suppression_mask(df):
+    """
     Returns:
-        pd.DataFrame: pandas dataframe of the query results
+        pd.DataFrame: boolean frame (raw column names) of the suppressed cells
+        in df, with only the columns that have at least one
     """
-    conditions = None
+    positions = suppressed_columns.positions()
+    columns = [c for c in df.columns if c in positions]
+
+    if not positions or not columns:
+        return pd.DataFrame(index=df.index)
+
+    mask = unpack_suppression_mask(
+        df[suppression_mask_column], max(positions.values()) + 1
+    )[:, [positions[c] for c in columns]]
+
+    flagged = mask.any(axis=0)
+
+    return pd.DataFrame(
+        mask[:, flagged], index=df.index, columns=[c for c, f in zip(columns, flagged) if f]
+    )
 
-    with engine.connect() as conn:
-        if args:
-            conditions = args[0]
-
-        df = pd.read_sql_query(q, conn, params=conditions)
-
-        # sqlite column headers do not have spaces between words. But we need to display the column names,
-        # so we have to do a bunch of str.replace to account for all conditions. May be a better way, but
-        # this is pretty fast. Adding a space between any lowercase character and any uppercase/number
-        # character takes care of most of it. The other replace functions catch edge cases.
-        df.columns = df.columns.str.replace(r"([a-z])([A-Z1-9%])", r"\1 \2", regex=True)
-        df.columns = df.columns.str.replace(
-            r"([WADTO])([CATPB&])", r"\1 \2", regex=True
-        )
-        df.columns = df.columns.str.replace("EBRWand", "EBRW and") # better way to do this?    
-        df.columns = df.columns.str.replace(r"([A])([a])", r"\1 \2", regex=True)
-        df.columns = df.columns.str.replace(r"([1-9])([(])", r"\1 \2", regex=True)
-        df.columns = df.columns.str.replace("or ", " or ")
-        df.columns = df.columns.astype(str)
 
-        return df
+# Long format academic data. Every category column ("Category|SubjectMetric",
+# e.g., "Grade3|ELATotalTested") of the academic and corporation tables is also
+# stored as one academic_facts row per school (or corporation), year, and
+# column, and the name, school type, and gradespan of each school for each
+# year are stored in academic_fact_entities. Built from the wide tables by
+# build_academic_facts_table(). Loaders that only need a few categories read
+# (category, subject) slices with index range scans instead of decoding whole
+# wide rows, and fall back to the wide tables if the facts have not been built.
+# source table -> (id column, name column)
+academic_fact_sources = {
+    "academic_data_k8": ("SchoolID", "SchoolName"),
+    "academic_data_hs": ("SchoolID", "SchoolName"),
+    "corporation_data_k8": ("CorporationID", "CorporationName"),
+    "corporation_data_hs": ("CorporationID", "CorporationName"),
+}
+
+# longest first, so that "ELAandMath" is not read as "ELA"
+academic_fact_subjects = ["EBRWandMath", "ELAandMath", "EBRW", "ELA", "Math", "IREAD"]
+
+_academic_column_pattern = re.compile(
+    r"^([^|]*)\|(" + "|".join(academic_fact_subjects) + r"|)(.*)$"
+)
 
 
-def get_current_year():
+def split_academic_column(column: str) -> Optional[tuple]:
     """
-    the most recent academic year of data according to the k8 ilearn
-    data file
+    Splits a raw category column name into (category, subject, metric), e.g.,
+    "Grade3|ELATotalTested" -> ("Grade3", "ELA", "TotalTested"). The subject is
+    "" for columns that are not test results (e.g., "Total|CohortCount").
 
     Returns:
-        int: an int representing the most recent year
-    """    
-    db = engine.raw_connection()
-    cur = db.cursor()
-    cur.execute(""" SELECT MAX(Year) FROM academic_data_k8 """)
-    year = cur.fetchone()[0]
-    db.close()
+        tuple: (category, subject, metric), or None if column has no category
+    """
+    match = _academic_column_pattern.match(column)
 
-    return year
+    if match is None:
+        return None
 
-current_academic_year = get_current_year()
+    return match.groups()
 
-def get_network_count():
+
+def _get_academic_facts(source, data):
     """
-    Helper function to dynamically count the number of network logins present
-    in the users database (identified with a negative group_id values). used to
-    determine the offset for creation of the charter dropdown in app.py. 
+    Returns:
+        tuple: (entities, facts) dataframes for one wide table
+    """
+    id_column, name_column = academic_fact_sources[source]
+
+    suppressed_cells = pd.DataFrame(index=data.index)
+
+    if suppression_mask_column in data.columns:
+        suppressed_cells = _decode_suppression_mask(data)
+        data = data.drop(suppression_mask_column, axis=1)
+
+    ids = pd.to_numeric(data[id_column], errors="coerce").to_numpy()
+    years = pd.to_numeric(data["Year"], errors="coerce").to_numpy()
+
+    entities = pd.DataFrame(
+        {
+            "Source": source,
+            "ID": ids,
+            "Year": years,
+            "Name": data[name_column],
+            "SchoolType": data["SchoolType"] if "SchoolType" in data.columns else None,
+            "LowGrade": data["LowGrade"],
+            "HighGrade": data["HighGrade"],
+        }
+    )
+
+    columns = [c for c in data.columns if split_academic_column(c) is not None]
+    parts = np.array([split_academic_column(c) for c in columns], dtype=object).reshape(-1, 3)
+
+    values = np.full((len(data.index), len(columns)), np.nan)
+    suppressed = np.zeros((len(data.index), len(columns)), dtype=bool)
+
+    for i, col in enumerate(columns):
+        values[:, i] = pd.to_numeric(data[col], errors="coerce").to_numpy(dtype=np.float64)
+
+        if data[col].dtype == object:
+            is_string = data[col].map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+            suppressed[:, i] = (
+                data[col].where(is_string).str.strip() == "***"
+            ).to_numpy(dtype=bool)
+
+        if col in suppressed_cells.columns:
+            suppressed[:, i] |= suppressed_cells[col].to_numpy(dtype=bool)
+
+    # only cells with a value or that are suppressed get a row
+    keep = ~np.isnan(values) | suppressed
+    rows, cols = np.nonzero(keep)
+
+    facts = pd.DataFrame(
+        {
+            "Source": source,
+            "ID": ids[rows],
+            "Year": years[rows],
+            "Category": parts[cols, 0],
+            "Subject": parts[cols, 1],
+            "Metric": parts[cols, 2],
+            "Value": np.where(suppressed[keep], np.nan, values[keep]),
+            "Suppressed": suppressed[keep].astype(int),
+        }
+    )
+
+    return entities, facts
+
+
+def build_academic_facts_table():
+    """
+    Rebuilds academic_facts and academic_fact_entities from the tables in
+    academic_fact_sources (typed or not). Suppressed ("***") cells have a
+    null Value and Suppressed = 1. The new tables are written under temporary
+    names and swapped in with one transaction, so the app never reads a
+    partial build. Run this any time academic data is added to the database
+    (see build_comparison_schools.py).
 
     Returns:
-        int: the number of network logins
-    """    
-    db = users.raw_connection()
-    cur = db.cursor()
-    cur.execute(""" SELECT COUNT(groupid) FROM users WHERE groupid < 0 """)
-    count = cur.fetchone()[0]
-    count = count + 1
-    db.close()
+        int: the number of rows written to academic_facts
+    """
+    count = 0
 
-    return count
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS academic_facts_new"))
+        conn.execute(text("DROP TABLE IF EXISTS academic_fact_entities_new"))
+        conn.execute(
+            text(
+                """
+                CREATE TABLE academic_facts_new (
+                    Source TEXT, ID INTEGER, Year INTEGER, Category TEXT,
+                    Subject TEXT, Metric TEXT, Value REAL, Suppressed INTEGER)
+                """
+            )
+        )
+        conn.execute(
+            text(
+                """
+                CREATE TABLE academic_fact_entities_new (
+                    Source TEXT, ID INTEGER, Year INTEGER, Name, SchoolType,
+                    LowGrade, HighGrade)
+                """
+            )
+        )
 
-network_count = get_network_count()
+    for source in academic_fact_sources:
+        with engine.connect() as conn:
+            data = pd.read_sql_query(text('SELECT * FROM "{}"'.format(source)), conn)
 
+        entities, facts = _get_academic_facts(source, data)
 
-def get_excluded_years(year: str) -> list:
+        with engine.begin() as conn:
+            entities.to_sql(
+                "academic_fact_entities_new", conn, if_exists="append", index=False
+            )
+            facts.to_sql(
+                "academic_facts_new", conn, if_exists="append", index=False, chunksize=10000
+            )
+
+        count += len(facts.index)
+
+    with engine.begin() as conn:
+        for table in academic_fact_tables:
+            conn.execute(text("DROP TABLE IF EXISTS {}".format(table)))
+            conn.execute(text("ALTER TABLE {0}_new RENAME TO {0}".format(table)))
+
+    create_database_indexes()
+
+    return count
+
+
+def get_academic_slice(source, ids, category, subject, metrics, year=None):
     """
-    "excluded years" is a list of year strings (format YYYY) of all years
-    that are more recent than the selected year. it is used to filter data
+    Gets one (category, subject) slice of academic_facts in the format of the
+    wide table it was built from: a row for every year of each school (or
+    corporation) with SchoolID, SchoolName, LowGrade, HighGrade, and
+    SchoolType (CorporationID and CorporationName for corporation tables),
+    plus a "Category|SubjectMetric" column for each metric ("***" where
+    suppressed, null where there is no data).
 
     Args:
-        year (str): a year string in format YYYY
+        source (string): a key of academic_fact_sources
+        ids (list): school (or corporation) ids
+        category (string): raw category, e.g., "Grade3"
+        subject (string): raw subject, e.g., "ELA" ("" for non-test columns)
+        metrics (list): raw metrics, e.g., ["TotalTested", "TotalProficient"]
+        year (int): if given, only years up to and including year
 
     Returns:
-        list: a list of year strings - all years more recent than selected year
+        pd.DataFrame: run_query result ordered by Year and ID. Raises
+        OperationalError if academic_facts has not been built
     """
+    id_column, name_column = academic_fact_sources[source]
 
-    excluded_years = []
+    params = dict(source=source, category=category, subject=subject, year=year)
 
-    excluded_academic_years = int(current_academic_year) - int(year)
+    metric_params = []
+    metric_columns = []
 
-    for i in range(excluded_academic_years):
-        excluded_year = int(current_academic_year) - i
-        excluded_years.append(excluded_year)
+    for i, metric in enumerate(metrics):
+        params["metric" + str(i)] = metric
+        metric_params.append(":metric" + str(i))
+        metric_columns.append(
+            """
+            MAX(CASE WHEN f.Metric = :metric{} THEN
+                CASE WHEN f.Suppressed THEN '***' ELSE f.Value END END) AS "{}"
+            """.format(i, category + "|" + subject + metric)
+        )
 
-    return excluded_years
+    school_type_str = ", e.SchoolType" if id_column == "SchoolID" else ""
+
+    id_str = ", ".join([str(int(v)) for v in ids]) or "NULL"
+
+    q = text(
+        """
+        SELECT e.Year, e.ID AS {}, e.Name AS {}, e.LowGrade, e.HighGrade{}, {}
+            FROM academic_fact_entities e
+            LEFT JOIN academic_facts f
+                ON f.Source = e.Source AND f.ID = e.ID AND f.Category = :category
+                AND f.Subject = :subject AND f.Metric IN ({}) AND f.Year = e.Year
+            WHERE e.Source = :source AND e.ID IN ({}) {}
+            GROUP BY e.Year, e.ID
+            ORDER BY e.Year, e.ID
+        """.format(
+            id_column, name_column, school_type_str, ", ".join(metric_columns),
+            ", ".join(metric_params), id_str, year_condition("e.Year", year),
+        )
+    )
+
+    return run_query(q, params)
+
+
+class SchoolDirectory(DatabaseSnapshot):
+    """
+    In-memory copy of the school_index table. The table is tiny (one row per
+    school), but it is read by nearly every callback every time a school is
+    selected, so we load it once and serve lookups from a dict keyed by
+    SchoolID.
+    """
+
+    def _build(self):
+        q = text(
+            """
+            SELECT SchoolID, SchoolName, SchoolType, Guest, Network, GEOCorp, CorporationID, GroupID
+                FROM school_index
+            """
+        )
+
+        with data_version().engine.connect() as conn:
+            results = pd.read_sql_query(q, conn)
+
+        schools = OrderedDict()  # type: OrderedDict[str, School]
+
+        # NOTE: table order matters - it is used to match individual school
+        # logins to schools (see set_dropdown_options() in app.py)
+        for row in results.itertuples(index=False):
+            school_id = _to_id_string(row.SchoolID)
+
+            schools[school_id] = School(
+                school_id=school_id,
+                school_name=str(row.SchoolName),
+                school_type=str(row.SchoolType),
+                guest=str(row.Guest) == "Y",
+                network=_to_id_string(row.Network),
+                geo_corp=_to_int(row.GEOCorp),
+                corporation_id=_to_int(row.CorporationID),
+                group_id=_to_int(row.GroupID),
+            )
+
+        return schools
+
+    def get(self, school_id) -> School:
+        """
+        Args:
+            school_id (string|int): a 4 digit school id
+
+        Returns:
+            School: the school_index record for the school. Raises KeyError
+            if the school is not in the index
+        """
+        return self._refresh()[_to_id_string(school_id)]
+
+    def __contains__(self, school_id) -> bool:
+        return _to_id_string(school_id) in self._refresh()
+
+    def schools(self) -> list:
+        """
+        Returns:
+            list: all School records in school_index table order
+        """
+        return list(self._refresh().values())
+
+    def group(self, group_id) -> list:
+        """
+        Args:
+            group_id (int): a network GroupID (positive value)
+
+        Returns:
+            list: School records belonging to the group in table order
+        """
+        return [s for s in self._refresh().values() if s.group_id == int(group_id)]
+
+
+school_directory = SchoolDirectory()
 
 
 def get_school_index(school_id):
     """
-    returns school index information
+    returns school index information as a one row dataframe. Most callers
+    should use school_directory.get() instead.
 
     Args:
         school_id (string): a 4 digit number in string format
@@ -146,18 +1515,23 @@ def get_school_index(school_id):
     Returns:
         pd.DataFrame: df of basic school information
     """    
-    params = dict(id=school_id)
-
-    q = text(
-        """
-        SELECT *
-            FROM school_index
-            WHERE school_index.SchoolID = :id
-        """
+    school = school_directory.get(school_id)
+
+    return pd.DataFrame(
+        [
+            {
+                "School ID": school.school_id,
+                "School Name": school.school_name,
+                "School Type": school.school_type,
+                "Guest": "Y" if school.guest else "N",
+                "Network": school.network if school.network else "None",
+                "GEO Corp": school.geo_corp,
+                "Corporation ID": school.corporation_id,
+                "Group ID": school.group_id,
+            }
+        ]
     )
 
-    return run_query(q, params)
-
 
 def get_academic_dropdown_years(*args):
     """
@@ -173,28 +1547,11 @@ def get_academic_dropdown_years(*args):
     params = dict(zip(keys, args))
 
     if params["type"] == "K8" or params["type"] == "K12":
-        q = text(
-            """ 
-            SELECT DISTINCT	Year
-            FROM academic_data_k8
-            WHERE SchoolID = :id
-        """
-        )
+        table = "academic_data_k8"
     else:
-        q = text(
-            """
-            SELECT DISTINCT	Year
-            FROM academic_data_hs
-            WHERE SchoolID = :id
-        """
-        )
-
-    result = run_query(q, params)
-
-    years = result["Year"].tolist()
-    years.sort(reverse=True)
+        table = "academic_data_hs"
 
-    return years
+    return academic_availability.years(params["id"], table)
 
 
 def get_academic_growth_dropdown_years(*args):
@@ -294,80 +1651,191 @@ def get_adm(corp_id):
         FROM adm_all 
         WHERE CorporationID = :id
     """
-    )
+    )
+
+    results = run_query(q, params)
+
+    # NOTE: From 2016 - 2019  "SpringADM" & "FallADM"; beginning with
+    # 2019-20SY: "2019Fall Non Virtual ADM" & "2020Spring Non Virtual ADM"
+
+    # drop "Virtual ADM"
+    results = results.drop(
+        list(
+            results.filter(
+                regex="Fall Virtual ADM|Spring Virtual ADM|Corporation ID|Name"
+            )
+        ),
+        axis=1,
+    )
+
+    # Each adm average requires 2 columns (Fall and Spring). If there are an
+    # odd number of columns after the above drop, that means that the last
+    # column is a Fall without a Spring, so we store that column, drop it,
+    # and add it back later
+    if (len(results.columns) % 2) != 0:
+        last_col = pd.DataFrame()
+        last_col_name = str(int(results.columns[-1][:4]) + 1)
+        last_col[last_col_name] = results[results.columns[-1]]
+        results = results.drop(results.columns[-1], axis=1)
+
+    adm_columns = [c[:4] for c in results.columns if "Spring" in c]
+
+    # make numbers
+    for col in results:
+        results[col] = pd.to_numeric(results[col], errors="coerce")
+
+    # Average each group of 2 columns and use name of 2nd column (Spring) for result
+    final = results.groupby(np.arange(len(results.columns)) // 2, axis=1).mean()
+    final.columns = adm_columns
+
+    if not last_col.empty:
+        final[last_col_name] = last_col[last_col_name]
+
+    return final
+
+
+def get_school_dropdown_list():
+    """
+    Returns:
+        pd.DataFrame: SchoolName, SchoolID, SchoolType, and GroupID (as
+        strings) of all schools in school_index table order
+    """
+    schools = pd.DataFrame(
+        [
+            {
+                "SchoolName": s.school_name,
+                "SchoolID": s.school_id,
+                "SchoolType": s.school_type,
+                "GroupID": str(s.group_id),
+            }
+            for s in school_directory.schools()
+        ],
+        columns=["SchoolName", "SchoolID", "SchoolType", "GroupID"],
+    )
+
+    return schools
+
+# State level aggregates. These only change when data is loaded, so they are
+# computed by build_state_aggregate_tables() (run by build_comparison_schools.py
+# and ingest_academic_data.py) and stored in small tables with a row per
+# Year. The loaders read the tables, or compute the aggregates if the tables
+# have not been built.
+def _get_state_graduation_averages(conn, year=None) -> pd.DataFrame:
+    q = text(
+        """
+        SELECT
+            Year,
+            CAST(SUM("Total|Graduates") AS REAL) / SUM("Total|CohortCount") AS StateGraduationAverage
+        FROM academic_data_hs
+        WHERE SchoolType != "AHS" {}
+        GROUP BY
+            Year
+        """.format(year_condition("Year", year))
+    )
+
+    return pd.read_sql_query(q, conn, params=dict(year=None if year is None else int(year)))
+
+
+def _get_ahs_state_averages(conn, year=None) -> pd.DataFrame:
+    """
+    Sums every numeric column of the AHS rows of academic_data_hs by Year
+    (Attendance Rate is averaged) - AHS have no corporation, so this is
+    used as their corporation data.
+    """
+    q = text(
+        """
+        SELECT *
+            FROM academic_data_hs
+            WHERE SchoolType = "AHS" {}
+        """.format(year_condition("Year", year))
+    )
+
+    results = pd.read_sql_query(q, conn, params=dict(year=None if year is None else int(year)))
+
+    drop_cols = ["SchoolName", "SchoolType", "Lat", "Lon"]
+    if suppression_mask_column in results.columns:
+        drop_cols.append(suppression_mask_column)
+
+    results = results.drop(drop_cols, axis=1)
+
+    non_sum_cols = ["Year", "SchoolID", "CorporationID", "CorporationName", "LowGrade", "HighGrade"]
+    sum_cols = [c for c in results.columns if c not in non_sum_cols]
+
+    to_numeric_columns(results, sum_cols)
+
+    # create a dict for agg()
+    column_map = {col: "first" for col in non_sum_cols}
+    column_map2 = {col: "sum" for col in sum_cols}
+    column_map3 = {"AttendanceRate": "mean"}
+    group_cols = {**column_map, **column_map2, **column_map3}
+
+    final_results = results.groupby(["Year"], as_index=False).agg(group_cols)
+
+    final_results["CorporationName"] = "AHS State Average"
+    final_results["CorporationID"] = 9999
+    final_results["SchoolID"] = 9999
+
+    return final_results.sort_values(by="Year").reset_index(drop=True)
+
+
+# table -> function that computes it
+state_aggregate_tables = {
+    "state_graduation_averages": _get_state_graduation_averages,
+    "ahs_state_averages": _get_ahs_state_averages,
+}
+
+
+def build_state_aggregate_tables() -> dict:
+    """
+    Rebuilds the tables in state_aggregate_tables. Like the academic_facts
+    tables, they are written under temporary names and swapped in with one
+    transaction. Run this any time academic data is added to the database.
 
-    results = run_query(q, params)
+    Returns:
+        dict: table -> number of rows (years)
+    """
+    counts = {}
 
-    # NOTE: From 2016 - 2019  "SpringADM" & "FallADM"; beginning with
-    # 2019-20SY: "2019Fall Non Virtual ADM" & "2020Spring Non Virtual ADM"
+    with engine.begin() as conn:
+        for table, compute in state_aggregate_tables.items():
+            data = compute(conn)
 
-    # drop "Virtual ADM"
-    results = results.drop(
-        list(
-            results.filter(
-                regex="Fall Virtual ADM|Spring Virtual ADM|Corporation ID|Name"
-            )
-        ),
-        axis=1,
-    )
+            conn.execute(text("DROP TABLE IF EXISTS {}_new".format(table)))
+            data.to_sql(table + "_new", conn, index=False)
 
-    # Each adm average requires 2 columns (Fall and Spring). If there are an
-    # odd number of columns after the above drop, that means that the last
-    # column is a Fall without a Spring, so we store that column, drop it,
-    # and add it back later
-    if (len(results.columns) % 2) != 0:
-        last_col = pd.DataFrame()
-        last_col_name = str(int(results.columns[-1][:4]) + 1)
-        last_col[last_col_name] = results[results.columns[-1]]
-        results = results.drop(results.columns[-1], axis=1)
+            counts[table] = len(data.index)
 
-    adm_columns = [c[:4] for c in results.columns if "Spring" in c]
+        for table in state_aggregate_tables:
+            conn.execute(text("DROP TABLE IF EXISTS {}".format(table)))
+            conn.execute(text("ALTER TABLE {0}_new RENAME TO {0}".format(table)))
 
-    # make numbers
-    for col in results:
-        results[col] = pd.to_numeric(results[col], errors="coerce")
+    create_database_indexes()
 
-    # Average each group of 2 columns and use name of 2nd column (Spring) for result
-    final = results.groupby(np.arange(len(results.columns)) // 2, axis=1).mean()
-    final.columns = adm_columns
+    return counts
 
-    if not last_col.empty:
-        final[last_col_name] = last_col[last_col_name]
 
-    return final
+def _get_state_aggregate(table, year=None) -> pd.DataFrame:
+    """
+    Reads a table in state_aggregate_tables (all years, or [year] and
+    earlier), ordered by Year. Computed if the table has not been built.
+    """
+    filters = () if year is None else (("Year", "<=", int(year)),)
 
+    try:
+        return run_query(TableQuery(table, filters=filters, order_by=("Year",)))
 
-def get_school_dropdown_list():
-    q = text(
-        """
-        SELECT SchoolName, SchoolID, SchoolType, GroupID
-        FROM school_index """
-    )
+    except OperationalError:
+        with data_version().engine.connect() as conn:
+            results = state_aggregate_tables[table](conn, year)
 
-    with engine.connect() as conn:
-        schools = pd.read_sql_query(q, conn)
+        results.columns = display_column_names(results.columns)
 
-    schools = schools.astype(str)
+        return results.sort_values(by="Year").reset_index(drop=True)
 
-    return schools
 
 def get_graduation_data():
-    params = dict(id="")
+    results = _get_state_aggregate("state_graduation_averages")
 
-    q = text(
-        """
-        SELECT
-            Year,
-            SUM("Total|Graduates") / SUM("Total|CohortCount") AS "State Graduation Average"
-        FROM academic_data_hs
-        WHERE SchoolType != "AHS"
-        GROUP BY
-            Year
-        """
-    )
-    
-    results = run_query(q, params)
-    
     results = results.loc[::-1].reset_index(drop=True)
 
     # merge state_grad_average with corp_data
@@ -390,219 +1858,316 @@ def get_graduation_data():
     return results
 
 
-def get_gradespan(school_id, selected_year, all_years):
-    # returns a list of grades for for which a school has numbers for both Tested
-    # and Proficient students for the selected year (and all earlier years)
-    # if no grades are found - returns an empty list
-    params = dict(id=school_id)
+# Category columns used to determine which grades, ethnicities and subgroups
+# a school has data for. Each test maps to its table and the column suffixes
+# for the number of students Tested and Proficient (or their equivalents).
+availability_tests = {
+    "ELA": ("academic_data_k8", "ELATotalTested", "ELATotalProficient"),
+    "IREAD": ("academic_data_k8", "IREADTestN", "IREADPassN"),
+    "SAT": ("academic_data_hs", "EBRWTotalTested", "EBRWAtBenchmark"),
+    "Graduation": ("academic_data_hs", "CohortCount", "Graduates"),
+}
+
+availability_categories = {
+    "grade": ["Grade3", "Grade4", "Grade5", "Grade6", "Grade7", "Grade8"],
+    "ethnicity": [
+        "AmericanIndian", "Asian", "Black", "Hispanic", "Multiracial",
+        "NativeHawaiianorOtherPacificIslander", "White",
+    ],
+    "subgroup": [
+        "PaidMeals", "FreeorReducedPriceMeals", "GeneralEducation", "SpecialEducation",
+        "EnglishLanguageLearners", "NonEnglishLanguageLearners",
+    ],
+}
+
+# grade level data is only used for ILEARN
+availability_groups = {
+    "ELA": ["grade", "ethnicity", "subgroup"],
+    "IREAD": ["ethnicity", "subgroup"],
+    "SAT": ["ethnicity", "subgroup"],
+    "Graduation": ["ethnicity", "subgroup"],
+}
+
+
+class AcademicAvailabilityIndex(DatabaseSnapshot):
+    """
+    For every (school, year, test, category group), records which categories
+    have a (non-zero) number of Tested students and which have a (non-zero)
+    number of Proficient students. Each is stored as a bitset over the list of
+    categories in availability_categories, so that combining years is a
+    bitwise OR and the "both Tested and Proficient" check is a bitwise AND.
+    Also records the years each school appears in the k8 and hs tables.
+    Built from academic_facts (index range scans over the tested and
+    proficient rows of each test) or, if it has not been built, with one
+    query per wide table for all schools.
+    """
 
-    idx = all_years.index(int(selected_year))
-    available_years = all_years[idx:]
+    def _build(self):
+        try:
+            return self._build_from_facts()
+        except OperationalError:
+            return self._build_from_tables()
 
-    year_str = ", ".join([str(int(v)) for v in available_years])
+    def _labels(self, test, group) -> list:
+        _, tested, _ = availability_tests[test]
+        columns = [c + "|" + tested for c in availability_categories[group]]
 
-    q = text(
-        """
-        SELECT "Grade3|ELATotalTested", "Grade4|ELATotalTested", "Grade5|ELATotalTested", "Grade6|ELATotalTested", "Grade7|ELATotalTested","Grade8|ELATotalTested",
-            "Grade3|ELATotalProficient", "Grade4|ELATotalProficient", "Grade5|ELATotalProficient", "Grade6|ELATotalProficient", "Grade7|ELATotalProficient","Grade8|ELATotalProficient"
-            FROM academic_data_k8
-            WHERE SchoolID = :id AND Year IN ({})""".format(
-            year_str
-        )
-    )
+        return [c.split("|")[0] for c in display_column_names(columns)]
 
-    result = run_query(q, params)
+    def _build_from_facts(self):
+        bits = {}
+        years = {}
+        labels = {}
 
-    # change "***" to nan
-    for col in result.columns:
-        result[col] = pd.to_numeric(result[col], errors="coerce")
+        tables = sorted(set(t[0] for t in availability_tests.values()))
 
-    # change 0 to nan
-    result.replace(0, np.nan, inplace=True)
+        for table in tables:
+            q = text(
+                """
+                SELECT ID, Year
+                    FROM academic_fact_entities
+                    WHERE Source = :source
+                """
+            )
 
-    # drop those nas
-    result = result.dropna(axis=1, how="all")
+            result = _execute_query(q, dict(source=table))
 
-    # get a list of remaining grades (will be duplicates where both Tested and Proficient are
-    # not nan or 0)
-    regex = re.compile(r"\b\d\b")
-    test_cols = [regex.search(i).group() for i in result.columns.tolist()]
+            for school_id, year in zip(result["ID"], result["Year"]):
+                years.setdefault((_to_id_string(school_id), table), set()).add(_to_int(year))
 
-    # remove unique items (where Tested and Proficient are not both numbers)
-    dupe_cols = [i for i in test_cols if test_cols.count(i) > 1]
+        for test, (table, tested, proficient) in availability_tests.items():
+            _, subject, tested_metric = split_academic_column("|" + tested)
+            proficient_metric = split_academic_column("|" + proficient)[2]
 
-    # keep one of each item
-    result = list(set(dupe_cols))
+            # suppressed (null) and 0 values mean there is no data
+            q = text(
+                """
+                SELECT ID, Year, Category, Metric
+                    FROM academic_facts
+                    WHERE Source = :source AND Subject = :subject
+                        AND Metric IN (:tested, :proficient) AND Value != 0
+                """
+            )
 
-    result.sort()
+            result = _execute_query(
+                q,
+                dict(
+                    source=table, subject=subject, tested=tested_metric,
+                    proficient=proficient_metric,
+                ),
+            )
 
-    return result
+            for group in availability_groups[test]:
+                categories = availability_categories[group]
+                labels[(test, group)] = self._labels(test, group)
 
+                weights = result["Category"].map(
+                    {c: 1 << i for i, c in enumerate(categories)}
+                )
+                present = result.assign(Bits=weights).dropna(subset=["Bits"])
 
-def get_ethnicity(school_id, school_type, hs_category, subject_value, selected_year, all_years):
-    # returns a list of ethnicities for which a school has numbers for both Tested
-    # and Proficient students for the selected year (and all earlier years)
+                # a category has at most one row per school, year, and metric,
+                # so the sum of the bits is their bitwise OR
+                grouped = present.groupby(["ID", "Year", "Metric"])["Bits"].sum()
 
-    params = dict(id=school_id)
+                for (school_id, year, metric), value in grouped.items():
+                    key = (_to_id_string(school_id), _to_int(year), test, group)
+                    old_t, old_p = bits.get(key, (0, 0))
 
-    idx = all_years.index(int(selected_year))
-    available_years = all_years[idx:]
+                    if metric == tested_metric:
+                        bits[key] = (old_t | int(value), old_p)
+                    else:
+                        bits[key] = (old_t, old_p | int(value))
 
-    year_str = ", ".join([str(int(v)) for v in available_years])
+        return {"bits": bits, "years": years, "labels": labels}
 
-    if school_type == "hs":
-        if hs_category == "SAT":
-            q = text(
-                """
-                SELECT "AmericanIndian|EBRWTotalTested", "Asian|EBRWTotalTested", "Black|EBRWTotalTested", "Hispanic|EBRWTotalTested", "Multiracial|EBRWTotalTested","NativeHawaiianorOtherPacificIslander|EBRWTotalTested", "White|EBRWTotalTested",
-                    "AmericanIndian|EBRWAtBenchmark", "Asian|EBRWAtBenchmark", "Black|EBRWAtBenchmark", "Hispanic|EBRWAtBenchmark", "Multiracial|EBRWAtBenchmark","NativeHawaiianorOtherPacificIslander|EBRWAtBenchmark", "White|EBRWAtBenchmark"
-                    FROM academic_data_hs
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
+    def _build_from_tables(self):
+        bits = {}
+        years = {}
+        labels = {}
 
-        else:
-            q = text(
-                """
-                SELECT "AmericanIndian|CohortCount", "Asian|CohortCount", "Black|CohortCount", "Hispanic|CohortCount", "Multiracial|CohortCount","NativeHawaiianorOtherPacificIslander|CohortCount", "White|CohortCount",
-                    "AmericanIndian|Graduates", "Asian|Graduates", "Black|Graduates", "Hispanic|Graduates", "Multiracial|Graduates","NativeHawaiianorOtherPacificIslander|Graduates", "White|Graduates"
-                    FROM academic_data_hs
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
+        tables = sorted(set(t[0] for t in availability_tests.values()))
 
-    else:
-        # k8
-        if subject_value == "IREAD":
-            q = text(
-                """
-                SELECT "AmericanIndian|IREADTestN", "Asian|IREADTestN", "Black|IREADTestN", "Hispanic|IREADTestN", "Multiracial|IREADTestN","NativeHawaiianorOtherPacificIslander|IREADTestN", "White|IREADTestN",
-                    "AmericanIndian|IREADPassN", "Asian|IREADPassN", "Black|IREADPassN", "Hispanic|IREADPassN", "Multiracial|IREADPassN","NativeHawaiianorOtherPacificIslander|IREADPassN", "White|IREADPassN"
-                    FROM academic_data_k8
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
-        else:
+        for table in tables:
+            tests = [k for k, v in availability_tests.items() if v[0] == table]
+
+            columns = []
+            for test in tests:
+                _, tested, proficient = availability_tests[test]
+                for group in availability_groups[test]:
+                    for category in availability_categories[group]:
+                        columns.append(category + "|" + tested)
+                        columns.append(category + "|" + proficient)
+
+            column_str = ", ".join(['"' + c + '"' for c in columns])
 
             q = text(
                 """
-                SELECT "AmericanIndian|ELATotalTested", "Asian|ELATotalTested", "Black|ELATotalTested", "Hispanic|ELATotalTested", "Multiracial|ELATotalTested","NativeHawaiianorOtherPacificIslander|ELATotalTested", "White|ELATotalTested",
-                    "AmericanIndian|ELATotalProficient", "Asian|ELATotalProficient", "Black|ELATotalProficient", "Hispanic|ELATotalProficient", "Multiracial|ELATotalProficient","NativeHawaiianorOtherPacificIslander|ELATotalProficient", "White|ELATotalProficient"
-                    FROM academic_data_k8
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
+                SELECT SchoolID, Year, {}
+                    FROM {}""".format(
+                    column_str, table
                 )
             )
 
-    result = run_query(q, params)
+            result = _execute_query(q, None)
 
-    for col in result.columns:
-        result[col] = pd.to_numeric(result[col], errors="coerce")
+            # run_query style header cleanup keeps columns in SELECT order, so
+            # the display label for each raw column is found by position
+            display_names = dict(zip(columns, result.columns[2:]))
 
-    result.replace(0, np.nan, inplace=True)
+            values = to_numeric_columns(result.iloc[:, 2:].copy())
+            values.columns = columns
 
-    result = result.dropna(axis=1, how="all")
+            # "***", null, and 0 all mean there is no data
+            present = (values.notna() & (values != 0)).to_numpy()
+            position = {c: i for i, c in enumerate(columns)}
 
-    test_cols = [item.split("|")[0] for item in result.columns.values]
+            school_ids = [_to_id_string(v) for v in result.iloc[:, 0]]
+            row_years = [_to_int(v) for v in result.iloc[:, 1]]
 
-    dupe_cols = [i for i in test_cols if test_cols.count(i) > 1]
+            for school_id, year in zip(school_ids, row_years):
+                years.setdefault((school_id, table), set()).add(year)
 
-    result = list(set(dupe_cols))
+            for test in tests:
+                _, tested, proficient = availability_tests[test]
 
-    return result
+                for group in availability_groups[test]:
+                    categories = availability_categories[group]
+                    weights = 1 << np.arange(len(categories), dtype=np.int64)
 
+                    tested_idx = [position[c + "|" + tested] for c in categories]
+                    proficient_idx = [position[c + "|" + proficient] for c in categories]
 
-def get_subgroup(school_id, school_type, hs_category, subject_value, selected_year, all_years):
-    # returns a list of subgroups for which a school has numbers for both Tested
-    # and Proficient students for the selected year (and all earlier years)
+                    tested_bits = present[:, tested_idx].astype(np.int64) @ weights
+                    proficient_bits = present[:, proficient_idx].astype(np.int64) @ weights
 
-    params = dict(id=school_id)
+                    labels[(test, group)] = [
+                        display_names[c + "|" + tested].split("|")[0] for c in categories
+                    ]
 
-    idx = all_years.index(int(selected_year))
-    available_years = all_years[idx:]
+                    for school_id, year, t_bits, p_bits in zip(
+                        school_ids, row_years, tested_bits, proficient_bits
+                    ):
+                        key = (school_id, year, test, group)
+                        old_t, old_p = bits.get(key, (0, 0))
+                        bits[key] = (old_t | int(t_bits), old_p | int(p_bits))
 
-    year_str = ", ".join([str(int(v)) for v in available_years])
+        return {"bits": bits, "years": years, "labels": labels}
 
-    if school_type == "hs":
-        if hs_category == "SAT":
-            q = text(
-                """
-                SELECT "PaidMeals|EBRWTotalTested", "FreeorReducedPriceMeals|EBRWTotalTested", "GeneralEducation|EBRWTotalTested", "SpecialEducation|EBRWTotalTested", "EnglishLanguageLearners|EBRWTotalTested","NonEnglishLanguageLearners|EBRWTotalTested",
-                "PaidMeals|EBRWAtBenchmark", "FreeorReducedPriceMeals|EBRWAtBenchmark", "GeneralEducation|EBRWAtBenchmark", "SpecialEducation|EBRWAtBenchmark", "EnglishLanguageLearners|EBRWAtBenchmark","NonEnglishLanguageLearners|EBRWAtBenchmark"
-                FROM academic_data_hs
-                WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
+    def years(self, school_id, table) -> list:
+        """
+        Args:
+            school_id (string): a 4 digit number in string format
+            table (string): academic_data_k8 or academic_data_hs
 
-        else:
-            q = text(
-                """
-                SELECT "PaidMeals|CohortCount", "FreeorReducedPriceMeals|CohortCount", "GeneralEducation|CohortCount", "SpecialEducation|CohortCount", "EnglishLanguageLearners|CohortCount","NonEnglishLanguageLearners|CohortCount",
-                "PaidMeals|Graduates", "FreeorReducedPriceMeals|Graduates", "GeneralEducation|Graduates", "SpecialEducation|Graduates", "EnglishLanguageLearners|Graduates","NonEnglishLanguageLearners|Graduates"
-                FROM academic_data_hs
-                WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
+        Returns:
+            list: years (int) for which the school has a row in table, most recent first
+        """
+        data = self._refresh()
 
-    else:   # k8
+        return sorted(
+            data["years"].get((_to_id_string(school_id), table), set()), reverse=True
+        )
 
-        if subject_value == "IREAD":
+    def categories(self, school_id, years, test, group) -> list:
+        """
+        Args:
+            school_id (string): a 4 digit number in string format
+            years (list): the years to consider
+            test (string): a key of availability_tests
+            group (string): a key of availability_categories
+
+        Returns:
+            list: display names of the categories for which the school has
+            numbers for both Tested and Proficient students in any of the years
+        """
+        data = self._refresh()
+        school_id = _to_id_string(school_id)
+
+        tested = 0
+        proficient = 0
+        for year in years:
+            t_bits, p_bits = data["bits"].get((school_id, int(year), test, group), (0, 0))
+            tested |= t_bits
+            proficient |= p_bits
+
+        available = tested & proficient
+
+        return [
+            label
+            for i, label in enumerate(data["labels"].get((test, group), []))
+            if available & (1 << i)
+        ]
 
-            q = text(
-                """
-                SELECT "PaidMeals|IREADTestN", "FreeorReducedPriceMeals|IREADTestN", "GeneralEducation|IREADTestN", "SpecialEducation|IREADTestN", "EnglishLanguageLearners|IREADTestN","NonEnglishLanguageLearners|IREADTestN",
-                    "PaidMeals|IREADPassN", "FreeorReducedPriceMeals|IREADPassN", "GeneralEducation|IREADPassN", "SpecialEducation|IREADPassN", "EnglishLanguageLearners|IREADPassN","NonEnglishLanguageLearners|IREADPassN"
-                    FROM academic_data_k8
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
 
-        else:
+academic_availability = AcademicAvailabilityIndex()
 
-            q = text(
-                """
-                SELECT "PaidMeals|ELATotalTested", "FreeorReducedPriceMeals|ELATotalTested", "GeneralEducation|ELATotalTested", "SpecialEducation|ELATotalTested", "EnglishLanguageLearners|ELATotalTested","NonEnglishLanguageLearners|ELATotalTested",
-                    "PaidMeals|ELATotalProficient", "FreeorReducedPriceMeals|ELATotalProficient", "GeneralEducation|ELATotalProficient", "SpecialEducation|ELATotalProficient", "EnglishLanguageLearners|ELATotalProficient","NonEnglishLanguageLearners|ELATotalProficient"
-                    FROM academic_data_k8
-                    WHERE SchoolID = :id AND Year IN ({})""".format(
-                    year_str
-                )
-            )
 
-    result = run_query(q, params)
+def _get_available_years(selected_year, all_years):
+    # the selected year and all earlier years
+    idx = all_years.index(int(selected_year))
+
+    return all_years[idx:]
 
-    for col in result.columns:
-        result[col] = pd.to_numeric(result[col], errors="coerce")
 
-    result.replace(0, np.nan, inplace=True)
+def _get_availability_test(school_type, hs_category, subject_value):
+    if school_type == "hs":
+        return "SAT" if hs_category == "SAT" else "Graduation"
+    else:
+        return "IREAD" if subject_value == "IREAD" else "ELA"
+
 
-    result = result.dropna(axis=1, how="all")
+def get_gradespan(school_id, selected_year, all_years):
+    # returns a list of grades for for which a school has numbers for both Tested
+    # and Proficient students for the selected year (and all earlier years)
+    # if no grades are found - returns an empty list
+    available_years = _get_available_years(selected_year, all_years)
 
-    test_cols = [item.split("|")[0] for item in result.columns.values]
+    grades = academic_availability.categories(school_id, available_years, "ELA", "grade")
 
-    dupe_cols = [i for i in test_cols if test_cols.count(i) > 1]
+    regex = re.compile(r"\b\d\b")
+    result = [regex.search(g).group() for g in grades]
 
-    result = list(set(dupe_cols))
+    result.sort()
 
     return result
 
 
-def get_financial_data(school_id):
-    params = dict(id=school_id)
-    q = text(
-        """
-        SELECT * 
-        FROM financial_data 
-        WHERE SchoolID = :id
+def get_ethnicity(school_id, school_type, hs_category, subject_value, selected_year, all_years):
+    # returns a list of ethnicities for which a school has numbers for both Tested
+    # and Proficient students for the selected year (and all earlier years)
+    available_years = _get_available_years(selected_year, all_years)
+    test = _get_availability_test(school_type, hs_category, subject_value)
+
+    return academic_availability.categories(school_id, available_years, test, "ethnicity")
+
+
+def get_subgroup(school_id, school_type, hs_category, subject_value, selected_year, all_years):
+    # returns a list of subgroups for which a school has numbers for both Tested
+    # and Proficient students for the selected year (and all earlier years)
+    available_years = _get_available_years(selected_year, all_years)
+    test = _get_availability_test(school_type, hs_category, subject_value)
+
+    return academic_availability.categories(school_id, available_years, test, "subgroup")
+
+
+def get_financial_data(school_id, columns=None):
+    """
+    Args:
+        school_id (string): school id
+        columns (list): display names and column_families to read (default:
+            all columns, which the financial pages use)
+
+    Returns:
+        pd.DataFrame: the school's financial data
     """
+    q = TableQuery(
+        "financial_data",
+        columns=_select_columns("financial_data", columns, "School ID", "Category"),
+        filters=(("SchoolID", "=", school_id),),
     )
-    return run_query(q, params)
+
+    return run_query(q)
 
 
 def get_financial_ratios(corp_id):
@@ -662,39 +2227,66 @@ def get_letter_grades(*args):
     return run_query(q, params)
 
 
-def get_wida_student_data(stns):
+def get_wida_student_data(school, year=None):
+    """
+    The WIDA file does not have a School ID column, so student level WIDA
+    data is matched to the school by STN: a join to school_stns (or, if it
+    has not been built, to the STNs in the school's ILEARN and IREAD data).
 
-    params = dict(id="")
+    Args:
+        school (string): school id
+        year (string|int): the selected year (None for all years)
 
-    # when looking for a string value in a column, we need to wrap each
-    # value in '', otherwise it will be interpreted as a column name
-    stn_str ="'" + "', '".join([str(v) for v in stns]) + "'"
+    Returns:
+        pd.DataFrame: the WIDA rows (2019 and later) of the school's students
+    """
+    params = dict(id=school, year=None if year is None else int(year))
 
     q = text(
         """
-        SELECT *
-            FROM WIDA
-            WHERE YEAR >= 2019 AND STN IN ({})""".format(
-            stn_str
+        SELECT WIDA.*
+            FROM school_stns
+            JOIN WIDA ON WIDA.STN = school_stns.STN
+            WHERE school_stns.SchoolID = :id AND WIDA.Year >= 2019 {}""".format(
+            year_condition("WIDA.Year", year)
         )
     )
 
-    results = run_query(q, params)
+    try:
+        results = run_query(q, params)
+
+    except OperationalError:
+        q = text(
+            """
+            SELECT *
+                FROM WIDA
+                WHERE Year >= 2019 {} AND STN IN (
+                    SELECT STN FROM ilearn_student WHERE SchoolID = :id
+                    UNION
+                    SELECT STN FROM iread_student WHERE SchoolID = :id AND TestYear > 2018
+                )""".format(
+                year_condition("Year", year)
+            )
+        )
+
+        results = run_query(q, params)
+
     results = results.sort_values(by="STN", ascending=False)
 
     return results
 
 
 def get_iread_student_data(*args):
-    keys = ["id"]
+    keys = ["id", "year"]
     params = dict(zip(keys, args))
+    params["year"] = int(params["year"]) if params.get("year") is not None else None
 
     q = text(
         """
         SELECT *
             FROM iread_student
-	        WHERE SchoolID = :id AND TestYear > 2018
-        """
+	        WHERE SchoolID = :id AND TestYear > 2018 {}
+        """.format(year_condition("TestYear", params["year"]))
     )
 
     results = run_query(q, params)
@@ -744,6 +2336,21 @@ def get_ilearn_stns(*args):
 
 # combination the above two functions
 def get_school_stns(school):
+    params = dict(id=school)
+
+    q = text(
+        """
+        SELECT STN
+            FROM school_stns
+            WHERE SchoolID = :id
+        """
+    )
+
+    try:
+        return run_query(q, params)
+
+    except OperationalError:
+        pass
 
     ilearn_stns = get_ilearn_stns(school)
     ilearn_stns["STN"] = ilearn_stns["STN"].astype(str)
@@ -759,65 +2366,59 @@ def get_school_stns(school):
     return school_stns
 
 
-def get_ilearn_student_data(*args):
-    keys = ["id"]
-    params = dict(zip(keys, args))
-
-    q = text(
-        """
-        SELECT *
-            FROM ilearn_student
-	        WHERE SchoolID = :id
-        """
-    )
-
-    results = run_query(q, params)
-
-    return results
+def build_school_stns_table() -> int:
+    """
+    Rebuilds school_stns, the distinct (SchoolID, STN) pairs of the ILEARN
+    and IREAD (2019 and later) student level data, which is used to find a
+    school's WIDA data. Run this any time student level data is added to the
+    database.
 
+    Returns:
+        int: the number of rows written
+    """
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS school_stns_new"))
+        conn.execute(text("CREATE TABLE school_stns_new (SchoolID INTEGER, STN TEXT)"))
+        conn.execute(
+            text(
+                """
+                INSERT INTO school_stns_new
+                    SELECT SchoolID, CAST(STN AS TEXT) FROM ilearn_student
+                    UNION
+                    SELECT SchoolID, CAST(STN AS TEXT) FROM iread_student WHERE TestYear > 2018
+                """
+            )
+        )
+        count = conn.execute(text("SELECT COUNT(*) FROM school_stns_new")).scalar()
 
-# Calculates AHS State Graduation Average for all Years as
-# a substitute for corp_data
-def get_ahs_averages():
-    params = dict(id="")
-    q = text (
-        """
-        SELECT *
-            FROM academic_data_hs
-            WHERE SchoolType = "AHS"
-        """
-    )
+        conn.execute(text("DROP TABLE IF EXISTS school_stns"))
+        conn.execute(text("ALTER TABLE school_stns_new RENAME TO school_stns"))
 
-    results = run_query(q, params)
+    create_database_indexes()
 
-    drop_cols = ["School Name", "School Type", "Lat", "Lon"]
-    results = results.drop(drop_cols, axis=1)
+    return count
 
-    non_sum_cols = ["Year", "School ID", "Corporation ID", "Corporation Name", "Low Grade", "High Grade"]
-    sum_cols = [c for c in results.columns if c not in non_sum_cols]
 
-    for col in sum_cols:
-        results[col] = pd.to_numeric(results[col], errors="coerce")
+def get_ilearn_student_data(school_id, columns=None):
+    q = TableQuery(
+        "ilearn_student",
+        columns=_select_columns("ilearn_student", columns, "STN"),
+        filters=(("SchoolID", "=", school_id),),
+    )
 
-    # create a dict for agg()
-    column_map = {col: "first" for col in non_sum_cols}
-    column_map2 = {col: "sum" for col in sum_cols}
-    column_map3 = {"Attendance Rate": "mean"}
-    group_cols = {**column_map, **column_map2, **column_map3}
+    results = run_query(q)
 
-    final_results = results.groupby(["Year"], as_index=False).agg(group_cols)
-    
-    final_results["Corporation Name"] = "AHS State Average"
-    final_results["Corporation ID"] = 9999
-    final_results["School ID"] = 9999
+    return results
 
-    final_results = final_results.sort_values(by="Year")
 
-    return final_results
+# Calculates AHS State Graduation Average for all Years as
+# a substitute for corp_data
+def get_ahs_averages(year=None):
+    return _get_state_aggregate("ahs_state_averages", year)
 
 
 def get_attendance_data(school_id, school_type, year):
-    params = dict(id=school_id)
+    params = dict(id=school_id, year=int(year))
  
     # NOTE: AHS attendance data is stored in the hs table. K12 attendance
     # data is the same in both k8 and hs tables (it isn't broken out)
@@ -838,17 +2439,14 @@ def get_attendance_data(school_id, school_type, year):
     elif school_type == "K12":
         return
     
-    query_string  = """
-        SELECT Year, AttendanceRate, StudentsChronicallyAbsent, TotalStudentCount
-            FROM {}
-	        WHERE {} = :id
-        """.format(
-        table, id_type
+    q = TableQuery(
+        table,
+        columns=("Year", "AttendanceRate", "StudentsChronicallyAbsent", "TotalStudentCount"),
+        filters=((id_type, "=", params["id"]), ("Year", "<=", params["year"])),
+        order_by=("Year",),
     )
 
-    q = text(query_string)
-  
-    results = run_query(q, params)
+    results = run_query(q)
     results = results.sort_values(by="Year", ascending=False)
 
     attendance_data = results[results["Attendance Rate"].notnull()]
@@ -863,10 +2461,6 @@ def get_attendance_data(school_id, school_type, year):
 
     attendance_data = attendance_data.drop(["Students Chronically Absent","Total Student Count"], axis=1)
 
-    excluded_years = get_excluded_years(year)
-    if excluded_years:
-        attendance_data = attendance_data[~attendance_data["Year"].isin(excluded_years)]
-    
     attendance_rate = (
         attendance_data.set_index("Year")
         .T.rename_axis("Category")
@@ -896,44 +2490,57 @@ def get_attendance_data(school_id, school_type, year):
 
 
 # Get k8 academic data for single school
-def get_proficiency_data(*args):
-    keys = ["id"]
-    params = dict(zip(keys, args))
+def get_proficiency_data(school_id, columns=None):
+    """
+    Args:
+        school_id (string): school id
+        columns (list): display names and column_families to read (default:
+            all columns). Year is always read.
 
-    q = text(
-        """
-        SELECT *
-            FROM academic_data_k8
-	        WHERE SchoolID = :id
-        """
+    Returns:
+        pd.DataFrame: the school's academic_data_k8 rows, most recent first
+    """
+    q = TableQuery(
+        "academic_data_k8",
+        columns=_select_columns("academic_data_k8", columns, "Year"),
+        filters=(("SchoolID", "=", school_id),),
+        order_by=("Year",),
     )
 
-    results = run_query(q, params)
+    results = as_suppressed(run_query(q))
     results = results.sort_values(by="Year", ascending=False)
 
     return results
 
 
-def get_corporation_academic_data(*args):
-    keys = ["id","type"]
+def get_corporation_academic_data(*args, columns=None):
+    keys = ["id", "type", "year"]
     params = dict(zip(keys, args))
+    params["year"] = int(params["year"]) if params.get("year") is not None else None
 
     if params["type"] == "HS" or params["type"] == "AHS":
         table = "corporation_data_hs"
     else:
         table = "corporation_data_k8"
 
-    q = text(
-        """
-        SELECT *
-            FROM {}
-            WHERE CorporationID = (
-                SELECT GEOCorp
-                    FROM school_index
-                    WHERE SchoolID = :id)""".format(table)
+    if params["id"] in school_directory:
+        geo_corp = school_directory.get(params["id"]).geo_corp
+    else:
+        geo_corp = None
+
+    filters = (("CorporationID", "=", geo_corp),)
+
+    if params["year"] is not None:
+        filters = filters + (("Year", "<=", params["year"]),)
+
+    q = TableQuery(
+        table,
+        columns=_select_columns(table, columns, "Year", "Corporation ID", "Corporation Name"),
+        filters=filters,
+        order_by=("Year",),
     )
 
-    results = run_query(q, params)
+    results = as_suppressed(run_query(q))
 
     results = results.sort_values(by="Year")
 
@@ -941,15 +2548,16 @@ def get_corporation_academic_data(*args):
 
 
 def get_growth_data(*args):
-    keys = ["id"]
+    keys = ["id", "year"]
     params = dict(zip(keys, args))
+    params["year"] = int(params["year"]) if params.get("year") is not None else None
 
     q = text(
         """
         SELECT *
 	        FROM growth_data
-	        WHERE MajorityEnrolledSchoolID = :id
-        """
+	        WHERE MajorityEnrolledSchoolID = :id {}
+        """.format(year_condition("TestYear", params["year"]))
     )
     return run_query(q, params)
 
@@ -988,66 +2596,424 @@ def get_school_coordinates(*args):
     return run_query(q, params)
 
 
+class SpatialIndexCache(DatabaseSnapshot):
+    """
+    SchoolSpatialIndex for each (year, school type), built the first time it
+    is requested and discarded when the database changes.
+    """
+
+    def _build(self):
+        return {}
+
+    def get(self, year, school_type) -> SchoolSpatialIndex:
+        """
+        Args:
+            year (string|int): the selected year
+            school_type (string): K8, HS, or AHS
+
+        Returns:
+            SchoolSpatialIndex: spatial index of all schools of the type in the year
+        """
+        indexes = self._refresh()
+
+        key = (int(year), school_type)
+
+        if key not in indexes:
+            indexes[key] = SchoolSpatialIndex(get_school_coordinates(int(year), school_type))
+
+        return indexes[key]
+
+
+spatial_indexes = SpatialIndexCache()
+
+
+# comparison school lists are computed for this many schools (the academic
+# analysis single year page shows 40, the multiple years page shows 20).
+# K8 comparison schools must test at least comparison_min_tested students
+max_comparison_schools = 40
+comparison_min_tested = 20
+
+comparison_school_types = ["K8", "HS", "AHS"]
+
+
+def _comparison_search_options(school_type):
+    # AHS don't have a gradespan in the technical sense, and "Total|ELATotalTested"
+    # (a proxy for school size) only exists for K8 schools
+    return dict(
+        check_gradespan=school_type != "AHS",
+        min_tested=comparison_min_tested if school_type == "K8" else 0,
+    )
+
+
+def build_comparison_schools_table():
+    """
+    Computes, for every school in every year of academic_data_k8 and
+    academic_data_hs (and for each school type), the ranked list of the
+    [max_comparison_schools] closest schools that pass the comparison school
+    filters and writes it to the comparison_schools table. Each school also
+    gets a Rank 0 row for itself that stores its own Total Tested value
+    (this also distinguishes "no comparable schools" from a missing key).
+
+    Returns:
+        int: the number of rows written
+    """
+    rows = []
+
+    for school_type in comparison_school_types:
+        table = "academic_data_k8" if school_type == "K8" else "academic_data_hs"
+
+        with engine.connect() as conn:
+            years = pd.read_sql_query(
+                text("SELECT DISTINCT Year FROM {}".format(table)), conn
+            )["Year"].tolist()
+
+        for year in years:
+            spatial_index = SchoolSpatialIndex(get_school_coordinates(int(year), school_type))
+            options = _comparison_search_options(school_type)
+
+            for position, school_id in enumerate(spatial_index.school_ids):
+                school_tested = spatial_index.tested_count(school_id)
+
+                rows.append(
+                    (int(year), school_type, int(school_id), 0, int(school_id),
+                     spatial_index.school_names[position], 0.0, school_tested)
+                )
+
+                positions, distances = spatial_index.nearest(
+                    school_id, max_comparison_schools, **options
+                )
+
+                for rank, (p, d) in enumerate(zip(positions, distances), start=1):
+                    rows.append(
+                        (int(year), school_type, int(school_id), rank,
+                         int(spatial_index.school_ids[p]), spatial_index.school_names[p],
+                         float(d), spatial_index.tested_count(spatial_index.school_ids[p]))
+                    )
+
+    comparison_schools = pd.DataFrame(
+        rows,
+        columns=[
+            "Year", "SchoolType", "SchoolID", "Rank", "ComparisonSchoolID",
+            "ComparisonSchoolName", "Distance", "TotalTested",
+        ],
+    )
+
+    with engine.begin() as conn:
+        comparison_schools.to_sql(
+            "comparison_schools", conn, if_exists="replace", index=False, chunksize=10000
+        )
+        conn.execute(
+            text(
+                """
+                CREATE INDEX IF NOT EXISTS idx_comparison_schools
+                    ON comparison_schools (SchoolID, Year, SchoolType, Rank)
+                """
+            )
+        )
+
+    return len(comparison_schools.index)
+
+
+def get_comparison_school_list(school_id, year, school_type, max, check_school_tested=False):
+    """
+    Gets the [max] closest comparable schools for the selected school from
+    the comparison_schools table (see build_comparison_schools_table()). If
+    the table doesn't exist or has no rows for the school/year/type, the list
+    is computed from the spatial index.
+
+    Args:
+        school_id (string): a 4 digit number in string format
+        year (string|int): the selected year
+        school_type (string): K8, HS, or AHS
+        max (int): the maximum number of comparison schools
+        check_school_tested (bool): if True, a K8 selected school must itself test at
+        least comparison_min_tested students
+
+    Returns:
+        dict: School Name: School ID in order of increasing distance from the selected
+        school, or None if the selected school is not in the set
+    """
+    options = _comparison_search_options(school_type)
+
+    params = dict(id=int(school_id), year=int(year), type=school_type, max=int(max))
+
+    q = text(
+        """
+        SELECT Rank, ComparisonSchoolID, ComparisonSchoolName, TotalTested
+            FROM comparison_schools
+            WHERE SchoolID = :id AND Year = :year AND SchoolType = :type AND Rank <= :max
+            ORDER BY Rank
+        """
+    )
+
+    try:
+        results = run_query(q, params)
+    except OperationalError:
+        # comparison_schools table has not been built
+        results = pd.DataFrame()
+
+    if len(results.index) > 0:
+        school_tested = pd.to_numeric(results.iloc[0, 3], errors="coerce")
+        comparisons = results.iloc[1:]
+
+        in_set = not (
+            check_school_tested and options["min_tested"]
+            and not school_tested >= options["min_tested"]
+        )
+
+        if not in_set:
+            return None
+
+        return dict(zip(comparisons.iloc[:, 2], comparisons.iloc[:, 1].astype(int).tolist()))
+
+    # fall back to live computation
+    spatial_index = spatial_indexes.get(year, school_type)
+
+    if school_id not in spatial_index or (
+        check_school_tested and options["min_tested"]
+        and not spatial_index.tested_count(school_id) >= options["min_tested"]
+    ):
+        return None
+
+    return calculate_comparison_school_list(school_id, spatial_index, max, **options)
+
+
 # filename99 = ("analysis-data.csv")
 # analysis_data.to_csv(filename99, index=False)
     
-# Where all the magic happens
-# Gets all the academic data and formats it for display
-def get_academic_data(*args):
-    """Where the magic happens. Gets academic data for school, geo school corporation,
-    and comparable schools, if relevant, and formats it for tables and figs depending
-    on the requesting page.
+# get_academic_data() is split into four stages, each memoized by its inputs
+# (see AcademicDataStage):
+#   raw fetch (school & corp data for the selected years) ->
+#   cleaned (categories the school did not test dropped) ->
+#   processed (proficiency/graduation/sat rates & revised comparison totals) ->
+#   page projection (analysis, info, or metrics)
+# So the academic_information and academic_metrics pages for the same school
+# and year share the raw, cleaned, and processed frames and only the
+# projection differs.
+#
+# The analysis page (a school and its comparison schools) merges the
+# processed frame of the school (and its corp) with the processed rows of each
+# comparison school, which are memoized one school at a time (see
+# _process_comparison_school()). So adding or removing a comparison school
+# only fetches and processes that school. The analysis page runs as a
+# background callback, in a new process for each job (see app.py), so these
+# rows are also kept in a store that all of the processes on the server share
+# (a diskcache directory at COMPARISON_CACHE_PATH, "" to turn it off), keyed by
+# the stage arguments and the state of the data (see SharedStageStore).
+ACADEMIC_STAGE_MAX_ENTRIES = 32
+COMPARISON_STAGE_MAX_ENTRIES = 256
+
+comparison_cache_path = os.getenv("COMPARISON_CACHE_PATH", "data/comparison_cache")
+COMPARISON_CACHE_MAX_BYTES = int(
+    os.getenv("COMPARISON_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+
+class SharedStageStore:
+    """
+    AcademicDataStage results shared by all processes, in a diskcache directory
+    (created on first use) that only the server's user can read or write -
+    results are stored pickled. The least recently used results are evicted
+    when the store is larger than max_bytes. A store that cannot be read or
+    written behaves like a miss.
 
     Args:
-    schools (list): list of school IDs
-    type (str): school type ("K8","K12","HS","AHS")
-    year (str): selected year
-    page (str): page from which data is requested
+        path (string): the diskcache directory
+        max_bytes (int): the size limit
+    """
 
-    Returns:
-        data: pd.DataFrame
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def _open(self):
+        with self._lock:
+            if self._cache is None:
+                os.makedirs(self.path, mode=0o700, exist_ok=True)
+                self._cache = diskcache.Cache(
+                    self.path,
+                    size_limit=self.max_bytes,
+                    eviction_policy="least-recently-used",
+                )
+
+            return self._cache
+
+    def get(self, key):
+        try:
+            return self._open().get(key)
+        except Exception as e:
+            print("Shared stage store unavailable (" + str(e) + ")")
+            return None
+
+    def set(self, key, value):
+        try:
+            self._open().set(key, value)
+        except Exception as e:
+            print("Shared stage store unavailable (" + str(e) + ")")
+
+
+class AcademicDataStage:
     """
-    keys = ["schools", "type", "year", "page"]
+    One memoized stage of the get_academic_data() pipeline. Results are kept
+    (LRU, up to max_entries) by the stage arguments (schools,
+    school type, year, and page for the projection), are flushed whenever the
+    database file changes, and are always returned as copies.
 
-    params = dict(zip(keys, args))
+    A stage's function is called with the output of the upstream stage (if
+    any) followed by the stage arguments. The time spent in each stage (not
+    including upstream stages) is tracked by school type, see
+    get_academic_data_timings().
+
+    Args:
+        name (str): stage name
+        function (callable): the stage function
+        upstream (AcademicDataStage): the stage whose output is the input to
+            this stage
+        arg_count (int): the number of arguments passed upstream
+        max_entries (int): the number of results kept
+        shared (SharedStageStore): a store shared with the other processes,
+            read on a miss and written with every result (optional)
+    """
+
+    def __init__(
+        self, name, function, upstream=None, arg_count=3,
+        max_entries=ACADEMIC_STAGE_MAX_ENTRIES, shared=None
+    ):
+        self.name = name
+        self.function = function
+        self.upstream = upstream
+        self.arg_count = arg_count
+        self.max_entries = max_entries
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._signature = None
+        self._timings = {}
+
+    def _record(self, school_type, hit, seconds=0.0):
+        timing = self._timings.setdefault(
+            school_type, {"calls": 0, "hits": 0, "seconds": 0.0}
+        )
+        timing["calls"] += 1
+        timing["hits"] += hit
+        timing["seconds"] += seconds
+
+    def __call__(self, schools, school_type, *args):
+        key = (tuple(schools), school_type) + args
+
+        signature = get_database_signature()
+
+        # results of a request running on a replaced version are not kept
+        cacheable = _serving_current_version()
+
+        with self._lock:
+            if signature != self._signature:
+                self._cache.clear()
+                self._signature = signature
+
+            if cacheable and key in self._cache:
+                self._cache.move_to_end(key)
+                self._record(school_type, True)
+                return self._cache[key].copy()
+
+        # the data version is part of the shared key - a reload can swap in a
+        # new snapshot without changing the database file
+        shared_key = None
+
+        if cacheable and self.shared is not None:
+            shared_key = (self.name, key, signature, data_version().signature)
+            result = self.shared.get(shared_key)
+
+            if result is not None:
+                with self._lock:
+                    self._record(school_type, True)
+
+                    if signature == self._signature:
+                        self._store(key, result)
+
+                return result
+
+        stage_args = (list(schools), school_type) + args
+
+        if self.upstream is not None:
+            upstream_args = stage_args[:self.arg_count]
+            stage_input = (self.upstream(*upstream_args),)
+        else:
+            stage_input = ()
+
+        start = time.perf_counter()
+
+        result = self.function(*stage_input, *stage_args)
+
+        seconds = time.perf_counter() - start
+
+        with self._lock:
+            self._record(school_type, False, seconds)
+
+            if cacheable and signature == self._signature and result is not None:
+                self._store(key, result)
+
+        if shared_key is not None and result is not None:
+            self.shared.set(shared_key, result)
+
+        return result
+
+    def _store(self, key, result):
+        """
+        Keeps a copy of result. Must be called while holding _lock.
+        """
+        self._cache[key] = result.copy()
+
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def timings(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self._timings.items()}
+
+
+def _fetch_academic_data(schools, school_type, year):
+    """
+    Stage 1 (raw fetch): gets all academic data for the school(s) and school
+    corporation for the selected year and all earlier years.
+    """
+    params = dict(schools=schools, type=school_type, year=int(year))
 
     # if length of school_id is > 1, then we are pulling data for a list
     # of schools (academic_analysis), otherwise one school (academic_info and
     # academic_metric)
-    if len(params["schools"]) > 1:
-
-        school_id = params["schools"][0]
-        school_str = ", ".join([str(int(v)) for v in params["schools"]])
-    
-    else:
-
-        school_id = params["schools"][0]
-        school_str = params["schools"][0]
+    school_ids = tuple(int(v) for v in params["schools"])
 
     # Get data for academic_information and academic_metrics
-    # all data / all years for school(s) and school corporation
+    # all data for the selected year and earlier for school(s) and school
+    # corporation
     if params["type"] == "K8":
         school_table = "academic_data_k8"
     else:
         school_table = "academic_data_hs"
 
-    query_string = """
-        SELECT *
-            FROM {}
-            WHERE SchoolID IN ({})""".format(
-        school_table, school_str
+    q = TableQuery(
+        school_table,
+        filters=(("SchoolID", "in", school_ids), ("Year", "<=", params["year"])),
+        order_by=("SchoolID", "Year"),
     )
 
-    q = text(query_string)
-    
-    school_data = run_query(q, params)
+    school_data = as_suppressed(run_query(q))
 
     # get corp data (for academic_metrics and academic_analysis_single_year)
     # and add to dataframe
     if params["type"] == "AHS":
-        corp_data = get_ahs_averages()
+        corp_data = get_ahs_averages(params["year"])
     else:
-        corp_data = get_corporation_academic_data(params["schools"][0], params["type"])
+        corp_data = get_corporation_academic_data(
+            params["schools"][0], params["type"], params["year"]
+        )
 
     # add columns not in corp database
     corp_data["School ID"] = corp_data["Corporation ID"]
@@ -1057,17 +3023,22 @@ def get_academic_data(*args):
     # multiple school ids in the schools variable
     raw_merged_data = pd.concat([school_data,corp_data],axis=0)
 
-    # Drop years of data that have been excluded by the
-    # selected year (are later than)
-    excluded_years = get_excluded_years(params["year"])
-    
-    if excluded_years:
-        raw_merged_data = raw_merged_data[~raw_merged_data["Year"].isin(excluded_years)]
- 
     raw_merged_data = raw_merged_data.sort_values(by="Year", ascending=False)
     
     raw_merged_data = raw_merged_data.reset_index(drop=True)
 
+    return raw_merged_data
+
+
+def _clean_academic_data(raw_merged_data, schools, school_type, year):
+    """
+    Stage 2 (cleaned): drops all categories that the selected school did not
+    test.
+    """
+    params = dict(schools=schools, type=school_type, year=year)
+
+    school_id = params["schools"][0]
+
     # Drop all columns for a Category if the value of "Total Tested" for
     # the Category for the school is null or 0 for the "school"
     drop_columns = []
@@ -1083,11 +3054,13 @@ def get_academic_data(*args):
     else:
         tested_cols = [col for col in data.columns.to_list() if "Total Tested" in col or "Cohort Count" in col]
 
+    school_rows = data.loc[data["School ID"] == school_id, tested_cols]
+
     for col in tested_cols:
 
         if ( 
-            pd.to_numeric(data[data["School ID"] == school_id][col], errors="coerce").sum() == 0
-            or data[data["School ID"] == school_id][col].isnull().all()
+            as_numeric(school_rows[col]).sum() == 0
+            or school_rows[col].isnull().all()
         ):
 
             if "Total Tested" in col:
@@ -1111,6 +3084,18 @@ def get_academic_data(*args):
     # k8 or hs data with excluded years and non-tested categories dropped
     data = data.reset_index(drop=True)
 
+    return data
+
+
+def _process_academic_data(data, schools, school_type, year):
+    """
+    Stage 3 (processed): calculates proficiency, graduation and sat rates and
+    recalculates comparison school totals using the school's grade span.
+    """
+    params = dict(schools=schools, type=school_type, year=year)
+
+    school_id = params["schools"][0]
+
     # process HS data
     if params["type"] == "HS" or params["type"] == "AHS":
         processed_data = data.copy()
@@ -1129,13 +3114,9 @@ def get_academic_data(*args):
         # process additional AHS only data
         if params["type"] == "AHS":
             
-            if "AHS|CCR" in processed_data.columns:
-                processed_data["AHS|CCR"] = pd.to_numeric(processed_data["AHS|CCR"], errors="coerce")
-
-            if "AHS|Grad All" in processed_data.columns:
-                processed_data["AHS|Grad All"] = pd.to_numeric(
-                    processed_data["AHS|Grad All"], errors="coerce"
-                )
+            to_numeric_columns(
+                processed_data, processed_data.columns.intersection(["AHS|CCR", "AHS|Grad All"])
+            )
 
             if {"AHS|CCR", "AHS|Grad All"}.issubset(processed_data.columns):
                 processed_data["CCR Percentage"] = processed_data["AHS|CCR"] / processed_data["AHS|Grad All"]
@@ -1172,6 +3153,18 @@ def get_academic_data(*args):
         # this is school, school corporation, and comparable school data
         processed_data = processed_data.reset_index()
 
+    return processed_data
+
+
+def _project_academic_data(processed_data, schools, school_type, year, page):
+    """
+    Stage 4 (page projection): formats the processed data for the requesting
+    page.
+    """
+    params = dict(schools=schools, type=school_type, year=year, page=page)
+
+    school_id = params["schools"][0]
+
     # if all columns in data other than the 1st (Year) are null
     # then return empty df
 
@@ -1204,10 +3197,7 @@ def get_academic_data(*args):
 
                 # force all to numeric (this removes "***" strings) - we
                 # later use NaN as a proxy
-                for col in hs_cols:
-                    analysis_data[col] = pd.to_numeric(
-                        analysis_data[col], errors="coerce"
-                    )
+                to_numeric_columns(analysis_data, hs_cols)
 
                 # drop all columns where the row at school_name_idx has a NaN value
                 analysis_data = analysis_data.loc[:, ~hs_data.iloc[school_idx].isna()]                
@@ -1243,10 +3233,7 @@ def get_academic_data(*args):
                     inplace=True,
                 )
 
-                for col in check_for_unchartable_data.columns:
-                    check_for_unchartable_data[col] = pd.to_numeric(
-                        check_for_unchartable_data[col], errors="coerce"
-                    )
+                to_numeric_columns(check_for_unchartable_data)
 
                 # one last check
                 if (
@@ -1393,9 +3380,6 @@ def get_academic_data(*args):
                     corp_info_data = processed_data[processed_data["School ID"] == processed_data["Corporation ID"]]
 
                     final_corp_data = transpose_data(corp_info_data,params)        
-                    
-                    filename99 = ("final_corp_data.csv")
-                    final_corp_data.to_csv(filename99, index=False)
 
                     corp_proficiency_cols = [col for col in final_corp_data.columns.to_list() if "Corp" in col]
                     
@@ -1404,13 +3388,156 @@ def get_academic_data(*args):
 
                     return metric_data
 
-# TODO: Do we need a default on error?
-    # return data
+
+def _process_comparison_school(schools, school_type, year):
+    """
+    Stage 3 (processed) for one comparison school: the processed rows of the
+    comparison school (schools[1]) for the selected school (schools[0]). Only
+    the comparison school is fetched - it is cleaned and its totals are
+    recalculated using the cleaned data of the selected school, which is
+    shared with the other comparison schools (and the other pages).
+    """
+    school_id, comparison_id = schools
+
+    if school_type == "K8":
+        school_table = "academic_data_k8"
+    else:
+        school_table = "academic_data_hs"
+
+    q = TableQuery(
+        school_table,
+        filters=(("SchoolID", "in", (int(comparison_id),)), ("Year", "<=", int(year))),
+        order_by=("SchoolID", "Year"),
+    )
+
+    comparison_data = as_suppressed(run_query(q))
+
+    # the categories the selected school did not test are dropped (see
+    # _clean_academic_data())
+    school_data = clean_academic_data([school_id], school_type, year)
+
+    comparison_data["School ID"] = comparison_data["School ID"].astype("Int64").astype("str")
+    comparison_data["Corporation ID"] = comparison_data["Corporation ID"].astype("Int64").astype("str")
+
+    comparison_data = comparison_data.reindex(columns=school_data.columns)
+
+    data = pd.concat([school_data, comparison_data], axis=0)
+    data = data.sort_values(by="Year", ascending=False).reset_index(drop=True)
+
+    processed_data = _process_academic_data(data, schools, school_type, year)
+
+    return processed_data[processed_data["School ID"] == str(comparison_id)]
+
+
+def _merge_comparison_data(schools, school_type, year):
+    """
+    Stage 3 (processed) for the analysis page: the processed frame of the
+    selected school and school corporation followed by the processed rows of
+    each comparison school, in order. Columns that only some of the frames
+    have are NaN for the others.
+    """
+    frames = [process_academic_data([schools[0]], school_type, year)]
+
+    for comparison_id in schools[1:]:
+        frames.append(
+            comparison_academic_data([schools[0], comparison_id], school_type, year)
+        )
+
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+
+fetch_academic_data = AcademicDataStage("raw", _fetch_academic_data)
+
+clean_academic_data = AcademicDataStage(
+    "cleaned", _clean_academic_data, upstream=fetch_academic_data
+)
+
+process_academic_data = AcademicDataStage(
+    "processed", _process_academic_data, upstream=clean_academic_data
+)
+
+project_academic_data = AcademicDataStage(
+    "projection", _project_academic_data, upstream=process_academic_data
+)
+
+comparison_academic_data = AcademicDataStage(
+    "comparison", _process_comparison_school,
+    max_entries=COMPARISON_STAGE_MAX_ENTRIES,
+    shared=SharedStageStore(comparison_cache_path, COMPARISON_CACHE_MAX_BYTES)
+    if comparison_cache_path else None,
+)
+
+project_comparison_data = AcademicDataStage(
+    "comparison projection", _project_academic_data, upstream=_merge_comparison_data
+)
+
+academic_data_stages = [
+    fetch_academic_data,
+    clean_academic_data,
+    process_academic_data,
+    project_academic_data,
+    comparison_academic_data,
+    project_comparison_data,
+]
+
+
+def get_academic_data_timings():
+    """
+    Returns the time spent in each get_academic_data() stage, by school type.
+
+    Returns:
+        dict: {stage name: {school type: {"calls", "hits", "seconds"}}} where
+        seconds is the total time spent computing the stage (cache misses)
+    """
+    return {stage.name: stage.timings() for stage in academic_data_stages}
+
+
+def clear_academic_data_cache():
+    """
+    Empties all get_academic_data() stage caches.
+    """
+    for stage in academic_data_stages:
+        stage.clear()
+
+
+# Where all the magic happens
+# Gets all the academic data and formats it for display
+def get_academic_data(*args):
+    """Where the magic happens. Gets academic data for school, geo school corporation,
+    and comparable schools, if relevant, and formats it for tables and figs depending
+    on the requesting page. See AcademicDataStage. Comparable schools (the schools
+    after the first on the analysis page) are processed and cached one at a time.
+
+    Args:
+    schools (list): list of school IDs
+    type (str): school type ("K8","K12","HS","AHS")
+    year (str): selected year
+    page (str): page from which data is requested
+
+    Returns:
+        data: pd.DataFrame
+    """
+    keys = ["schools", "type", "year", "page"]
+
+    params = dict(zip(keys, args))
+
+    if params["page"] == "analysis" and len(params["schools"]) > 1:
+        return project_comparison_data(
+            params["schools"], params["type"], params["year"], params["page"]
+        )
+
+    return project_academic_data(
+        params["schools"], params["type"], params["year"], params["page"]
+    )
+
 
 # TODO: Eventually merge into get_academic_data()
 def get_year_over_year_data(*args):
     keys = ["school_id", "comp_list", "category", "year", "flag"]
     params = dict(zip(keys, args))
+    params["year"] = int(params["year"])
+
+    year_str = year_condition("Year", params["year"])
 
     school_str = ", ".join([str(int(v)) for v in params["comp_list"]])
 
@@ -1456,8 +3583,8 @@ def get_year_over_year_data(*args):
             result = params["category"] + " Proficient"
 
     # Query strings (param must be passed in with spaces)
-    passed_query = passed.replace(" ", "")
-    tested_query = tested.replace(" ", "")
+    passed_query = column_names.query_name(passed)
+    tested_query = column_names.query_name(tested)
 
     school_query_str = (
         "Year, SchoolID, SchoolName, LowGrade, HighGrade, SchoolType, "
@@ -1481,14 +3608,31 @@ def get_year_over_year_data(*args):
     query_string1 = """
         SELECT {}
             FROM {}
-	        WHERE SchoolID = :school_id
+	        WHERE SchoolID = :school_id {}
         """.format(
-        school_query_str, school_table
+        school_query_str, school_table, year_str
     )
 
     q1 = text(query_string1)
 
-    school_data = run_query(q1, params)
+    # read from academic_facts if it has been built
+    category, subject, passed_metric = split_academic_column(passed_query)
+    metrics = [passed_metric, split_academic_column(tested_query)[2]]
+
+    school_columns = [
+        "Year", "School ID", "School Name", "Low Grade", "High Grade", "School Type",
+        passed, tested,
+    ]
+
+    try:
+        school_data = get_academic_slice(
+            school_table, [params["school_id"]], category, subject, metrics, params["year"]
+        )[school_columns]
+        use_facts = True
+
+    except OperationalError:
+        school_data = run_query(q1, params)
+        use_facts = False
 
     # get school type and then drop column (this just gets the string
     # value with the highest frequency - avoids situations where a
@@ -1526,14 +3670,22 @@ def get_year_over_year_data(*args):
                 WHERE CorporationID = (
                     SELECT GEOCorp
                         FROM school_index
-                        WHERE SchoolID = :school_id)
+                        WHERE SchoolID = :school_id) {}
             """.format(
-            corp_query_str, corp_table
+            corp_query_str, corp_table, year_str
         )
 
         q2 = text(query_string2)
 
-        corp_data = run_query(q2, params)
+        if use_facts:
+            geo_corp = school_directory.get(params["school_id"]).geo_corp
+
+            corp_data = get_academic_slice(
+                corp_table, [geo_corp] if geo_corp is not None else [], category,
+                subject, metrics, params["year"]
+            )[["Year", "Corporation Name", "Low Grade", "High Grade", passed, tested]]
+        else:
+            corp_data = run_query(q2, params)
 
         corp_data[corp_data["Corporation Name"][0]] = pd.to_numeric(
             corp_data[passed], errors="coerce"
@@ -1547,13 +3699,19 @@ def get_year_over_year_data(*args):
         query_string3 = """
                 SELECT {}
                     FROM {}
-                    WHERE SchoolID IN ({})""".format(
-            school_query_str, school_table, school_str
+                    WHERE SchoolID IN ({}) {}""".format(
+            school_query_str, school_table, school_str, year_str
         )
 
         q3 = text(query_string3)
 
-        comparable_schools_data = run_query(q3, params)
+        if use_facts:
+            comparable_schools_data = get_academic_slice(
+                school_table, params["comp_list"], category, subject, metrics,
+                params["year"]
+            )[school_columns]
+        else:
+            comparable_schools_data = run_query(q3, params)
 
         comparable_schools_data[result] = pd.to_numeric(
             comparable_schools_data[passed], errors="coerce"
@@ -1591,17 +3749,14 @@ def get_year_over_year_data(*args):
                     on="Year",
                 )
 
-        # account for changes in the year
-        excluded_years = get_excluded_years(params["year"])
-        if excluded_years:
-            result = result[~result["Year"].isin(excluded_years)]
-
     return result, all_school_info
 
 
 def get_student_level_ilearn(school, subject):
 
-    ilearn_student_all = get_ilearn_student_data(school)
+    ilearn_student_all = get_ilearn_student_data(
+        school, ["Current Grade", "Tested Grade", subject + " Proficiency"]
+    )
 
     # will also be empty for guest schools
     if not ilearn_student_all.empty:
@@ -9,7 +9,7 @@ from dash import html, dash_table, Input, Output, callback
 from dash.exceptions import PreventUpdate
 
 from .globals import max_display_years
-from .load_data import get_financial_data, get_school_index
+from .load_data import get_financial_data, school_directory
 from .tables import no_data_table, create_proficiency_key
 from .string_helpers import convert_to_svg_circle
 
@@ -26,11 +26,11 @@ def update_organizational_compliance(school, year):
     if not school:
         raise PreventUpdate
 
-    selected_school = get_school_index(school)
+    selected_school = school_directory.get(school)
     selected_year_numeric = int(year)
     selected_year_string = str(selected_year_numeric)
 
-    if selected_school["Guest"].values[0] == "Y":
+    if selected_school.guest:
         school = "9999"
 
     financial_data = get_financial_data(school)
@@ -41,7 +41,7 @@ def update_organizational_compliance(school, year):
         )
 
     else:
-        if selected_school["Guest"].values[0] == "Y":
+        if selected_school.guest:
             table_title = selected_year_string +" Organizational and Operational Accountability (SAMPLE DATA)"
         else:
             table_title = selected_year_string +" Organizational and Operational Accountability"
@@ -18,11 +18,18 @@ from .globals import (
     subgroup,
 )
 
+# returns the "Category|Subject" part of a column name, which is shared by
+# the Tested (N-Size) and the proficiency columns for each category, e.g.:
+# "Grade 3|ELA Total Tested" & "Grade 3|ELA Proficient %" -> "Grade 3|ELA".
+# names without a "|" (School ID, Low Grade, etc.) return NaN
+def category_key(categories: pd.Series) -> pd.Series:
+    return categories.str.extract(r"^(.+?\|\S+)", expand=False)
+
 # filters tested (nsize) cols and proficiency calculations into
 # separate dataframes, performs some cleanup, including a transposition,
 # moving years to column headers and listing categories in their own
-# columns and then cross-merging the two. variables change depending on
-# whether we are analyzing a school or a corporation
+# columns and then merging the two on a category key. variables change
+# depending on whether we are analyzing a school or a corporation
 def transpose_data(df,params):
 
     # First, determine whether df contains data for the charter school or
@@ -82,13 +89,13 @@ def transpose_data(df,params):
     tested_data = tested_data.fillna(value=np.nan)
     tested_data = tested_data.replace(0, np.nan)
 
-    # add new column with substring values and drop the original
-    # Category column
-    tested_data["Substring"] = tested_data["Category"].replace(
-        substring_dict, regex=True
+    # add a join key (e.g., "Grade 3|ELA") derived from the Category and
+    # drop the original Category column
+    tested_data["Key"] = category_key(
+        tested_data["Category"].replace(substring_dict, regex=True)
     )
 
-    tested_data = tested_data.drop("Category", axis=1)
+    tested_data = tested_data.drop("Category", axis=1).dropna(subset=["Key"])
 
     proficiency_data = (
         proficiency_data.set_index("Year")
@@ -115,38 +122,17 @@ def transpose_data(df,params):
 
     proficiency_data = proficiency_data.fillna(value=np.nan)
 
-    # Merge Total Tested DF with Proficiency DF based on substring match
-    # NOTE: the cross-merge and substring match process takes about .3s,
-    # is there a faster way?
-    merged_data = proficiency_data.merge(tested_data, how="cross")
-
-    # Need to temporarily rename "English Learner" because otherwise merge
-    # will match both "English" and "Non English"
-    merged_data = merged_data.replace(
-        {
-            "Non English Language Learners": "Temp1",
-            "English Language Learners": "Temp2",
-        },
-        regex=True,
-    )
-
-    # keep only those rows where substring is in Category
-    merged_data = merged_data[
-        [
-            a in b
-            for a, b in zip(merged_data["Substring"], merged_data["Category"])
-        ]
-    ]
+    # Merge Total Tested DF with Proficiency DF on the Category key. an inner
+    # merge keeps the order of proficiency_data and drops any row (e.g., School ID,
+    # Low Grade) without a matching Tested row.
+    # NOTE: this replaces a cross-merge & substring match ("Grade 3|ELA" in
+    # "Grade 3|ELA Proficient %"), which was O(n*m) and needed "English Language
+    # Learners" to be temporarily renamed so it didn't match "Non English ..."
+    proficiency_data["Key"] = category_key(proficiency_data["Category"])
 
-    merged_data = merged_data.replace(
-        {
-            "Temp1": "Non English Language Learners",
-            "Temp2": "English Language Learners",
-        },
-        regex=True,
-    )
+    merged_data = proficiency_data.merge(tested_data, how="inner", on="Key")
 
-    merged_data = merged_data.drop("Substring", axis=1)
+    merged_data = merged_data.drop("Key", axis=1)
     merged_data = merged_data.reset_index(drop=True)
     
     # reorder columns for display
@@ -0,0 +1,380 @@
+###########################################
+# ICSB Dashboard - Columnar Data Snapshot #
+###########################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# An alternative to reading table rows from SQLite through SQLAlchemy. Each
+# table of the database is exported to Parquet files (one directory per year,
+# rows sorted by school/corporation id, small row groups) and read back with
+# pyarrow from memory-mapped files, with the query filters pushed down to the
+# scan (row group statistics let pyarrow skip the years and schools that are
+# not requested). Only single table reads (TableQuery) are served from the
+# snapshot - joins and aggregates still go to SQLite. pyarrow (see
+# requirements.txt) is only imported if it is installed, so the sqlite backend
+# works without it - selecting the snapshot backend requires it.
+#
+# Each export is written to a new version directory next to the one in use and
+# the CURRENT file, which names the version to read, is replaced last (an
+# atomic rename). Readers that opened an older version keep reading it: each
+# reader holds a shared lock (flock) on its version's manifest, in any process
+# (including forked children), and an export only deletes the versions it can
+# lock exclusively. Where flock is not available (Windows), the previous
+# version is kept and anything older is deleted.
+
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+manifest_name = "manifest.json"
+pointer_name = "CURRENT"
+
+# rows per Parquet row group - small enough that a single school's rows can
+# be found without reading (most of) the other schools in the same year
+snapshot_row_group_size = 128
+
+# columns used to partition (by year) and sort (by id) each table, in order
+# of preference
+partition_columns = ["Year", "TestYear"]
+id_columns = ["SchoolID", "CorporationID", "MajorityEnrolledSchoolID", "STN"]
+
+
+@dataclass(frozen=True)
+class TableQuery:
+    """
+    A single table read that both SQLite and the snapshot can serve:
+
+        SELECT [columns] FROM [table] WHERE [filters] ORDER BY [order_by]
+
+    Args:
+        table (string): table name
+        columns (tuple): column names (empty for all columns)
+        filters (tuple): (column, operator, value) conditions, joined with AND.
+        Operators are "=", "<=", and "in" (value is a tuple)
+        order_by (tuple): column names (ascending)
+    """
+    table: str
+    columns: tuple = ()
+    filters: tuple = ()
+    order_by: tuple = ()
+
+    def to_sql(self) -> tuple:
+        """
+        Returns:
+            tuple: (sql string, dict of parameters)
+        """
+        columns = ", ".join('"' + c + '"' for c in self.columns) if self.columns else "*"
+
+        conditions = []
+        params = {}
+
+        for i, (column, operator, value) in enumerate(self.filters):
+            if operator == "in":
+                names = []
+                for j, v in enumerate(value):
+                    params["p{}_{}".format(i, j)] = v
+                    names.append(":p{}_{}".format(i, j))
+
+                conditions.append('"{}" IN ({})'.format(column, ", ".join(names) or "NULL"))
+            else:
+                params["p" + str(i)] = value
+                conditions.append('"{}" {} :p{}'.format(column, operator, i))
+
+        sql = 'SELECT {} FROM "{}"'.format(columns, self.table)
+
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        if self.order_by:
+            sql += " ORDER BY " + ", ".join('"' + c + '"' for c in self.order_by)
+
+        return sql, params
+
+
+def _to_arrow(df: pd.DataFrame):
+    """
+    SQLite columns can hold values of any type, Arrow columns cannot. Text
+    columns that also hold numbers are stored as strings.
+    """
+    for col in df.columns:
+        if df[col].dtype == object:
+            values = df[col].dropna()
+            kinds = set(type(v) for v in values)
+
+            if len(kinds) > 1 or (kinds and not kinds <= {str, bytes}):
+                df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def snapshot_version(path: str) -> Optional[str]:
+    """
+    Args:
+        path (string): the snapshot directory
+
+    Returns:
+        string: the version directory named in [path]/CURRENT, or None if
+        there is no snapshot at [path]
+    """
+    try:
+        with open(os.path.join(path, pointer_name)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _open_version(path: str) -> tuple:
+    """
+    Opens the manifest of the version named in [path]/CURRENT and takes a
+    shared lock on it, which keeps export_snapshot() from deleting the
+    version until the file is closed. If an export deletes the version
+    before it is locked, the new CURRENT is read instead.
+
+    Args:
+        path (string): the snapshot directory
+
+    Returns:
+        tuple: (version, open manifest file)
+    """
+    while True:
+        version = snapshot_version(path)
+
+        if version is None:
+            raise FileNotFoundError("no snapshot at " + path)
+
+        manifest_path = os.path.join(path, version, manifest_name)
+
+        try:
+            manifest = open(manifest_path)
+        except FileNotFoundError:
+            if snapshot_version(path) == version:
+                raise
+
+            continue
+
+        if fcntl is None:
+            return version, manifest
+
+        fcntl.flock(manifest, fcntl.LOCK_SH)
+
+        # deleted while we were waiting for the lock
+        if os.path.exists(manifest_path):
+            return version, manifest
+
+        manifest.close()
+
+
+def _remove_unused_versions(path: str, keep: str, previous: Optional[str]):
+    """
+    Deletes the version directories in path other than keep that no reader
+    holds (see _open_version()). Without flock, previous is kept instead.
+    """
+    for name in os.listdir(path):
+        directory = os.path.join(path, name)
+
+        if name == keep or not os.path.isdir(directory):
+            continue
+
+        if fcntl is None:
+            if name != previous:
+                shutil.rmtree(directory)
+            continue
+
+        try:
+            manifest = open(os.path.join(directory, manifest_name))
+        except FileNotFoundError:
+            # an export that did not finish
+            shutil.rmtree(directory)
+            continue
+
+        with manifest:
+            try:
+                fcntl.flock(manifest, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+
+            shutil.rmtree(directory)
+
+
+def export_snapshot(engine, path: str, tables: list) -> dict:
+    """
+    Writes each table to [path]/[version]/[table]/[partition]/part-0.parquet,
+    where partition is Year=[year] for tables with a year column (and "all"
+    otherwise), then the manifest, and then points [path]/CURRENT at the new
+    version. Older versions are deleted once no reader holds them (here, or
+    by a later export).
+
+    Args:
+        engine (sqlalchemy.Engine): the database
+        path (string): the snapshot directory
+        tables (list): the tables to export
+
+    Returns:
+        dict: table -> number of rows
+    """
+    if pa is None:
+        raise ImportError("the snapshot backend requires pyarrow")
+
+    from sqlalchemy import text
+
+    previous = snapshot_version(path)
+    version = "v" + str(time.time_ns())
+    staging = os.path.join(path, version)
+
+    manifest = {}
+    counts = {}
+
+    for table in tables:
+        with engine.connect() as conn:
+            df = pd.read_sql_query(text('SELECT * FROM "{}"'.format(table)), conn)
+
+        partition = next((c for c in partition_columns if c in df.columns), None)
+        sort = [c for c in [partition] + id_columns if c in df.columns][:2]
+
+        if sort:
+            df = df.sort_values(sort, kind="stable")
+
+        data = _to_arrow(df.reset_index(drop=True))
+
+        if partition is None or not pd.api.types.is_numeric_dtype(df[partition]):
+            partition = None
+            groups = [("all", data)]
+        else:
+            keys = pd.Series(df[partition].to_numpy())
+            groups = [
+                (partition + "=" + str(key), data.take(rows.index.to_numpy()))
+                for key, rows in keys.groupby(keys, dropna=False)
+            ]
+
+        for name, part in groups:
+            directory = os.path.join(staging, table, name)
+            os.makedirs(directory)
+            pq.write_table(
+                part,
+                os.path.join(directory, "part-0.parquet"),
+                row_group_size=snapshot_row_group_size,
+            )
+
+        manifest[table] = dict(partition=partition, rows=data.num_rows)
+        counts[table] = data.num_rows
+
+    with open(os.path.join(staging, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    pointer = os.path.join(path, pointer_name)
+
+    with open(pointer + ".new", "w") as f:
+        f.write(version)
+
+    os.replace(pointer + ".new", pointer)
+
+    _remove_unused_versions(path, version, previous)
+
+    return counts
+
+
+class ArrowSnapshot:
+    """
+    Reads TableQuery results from a snapshot written by export_snapshot().
+    The version named in CURRENT when the reader is created is read (and
+    kept on disk) until the reader is closed or discarded. Datasets are
+    opened once (on first use of each table) over memory-mapped files.
+
+    Args:
+        path (string): the snapshot directory
+    """
+
+    def __init__(self, path: str):
+        if pa is None:
+            raise ImportError("the snapshot backend requires pyarrow")
+
+        self.version, self._manifest_file = _open_version(path)
+
+        self.path = os.path.join(path, self.version)
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+        self._datasets = {}
+
+        self.manifest = json.load(self._manifest_file)
+
+    def close(self):
+        """
+        Releases the version (a later export may delete it).
+        """
+        self._datasets = {}
+        self._manifest_file.close()
+
+    def __contains__(self, table) -> bool:
+        return table in self.manifest
+
+    def _dataset(self, table):
+        if table not in self._datasets:
+            self._datasets[table] = ds.dataset(
+                os.path.join(self.path, table), format="parquet", filesystem=self._filesystem
+            )
+
+        return self._datasets[table]
+
+    def _filter(self, schema, filters):
+        expression = None
+
+        for column, operator, value in filters:
+            field = ds.field(column)
+            column_type = schema.field(column).type
+
+            # cast (e.g., "1001" to int64) the way sqlite applies column affinity
+            if operator == "in":
+                condition = field.isin(pa.array(list(value)).cast(column_type))
+            else:
+                scalar = pa.scalar(value).cast(column_type)
+
+                if operator == "=":
+                    condition = field == scalar
+                elif operator == "<=":
+                    condition = field <= scalar
+                else:
+                    raise ValueError("unsupported operator: " + operator)
+
+            expression = condition if expression is None else expression & condition
+
+        return expression
+
+    def read(self, query: TableQuery) -> pd.DataFrame:
+        """
+        Args:
+            query (TableQuery): a table in the snapshot
+
+        Returns:
+            pd.DataFrame: the same columns (in the same order) as the SQLite read
+        """
+        dataset = self._dataset(query.table)
+
+        columns = list(query.columns) or dataset.schema.names
+        read_columns = columns + [c for c in query.order_by if c not in columns]
+
+        result = dataset.to_table(
+            columns=read_columns, filter=self._filter(dataset.schema, query.filters)
+        )
+
+        if query.order_by:
+            result = result.sort_by([(c, "ascending") for c in query.order_by])
+
+        return result.select(columns).to_pandas()
@@ -0,0 +1,495 @@
+############################################
+# ICSB Dashboard - Suppressed Numeric Type #
+############################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+# IDOE replaces any value with an insufficient n-size with "***" (there is data,
+# but not enough of it to show under privacy laws) and we use "-***" as a special
+# accountability flag (see calculate_year_over_year()). So academic columns end up
+# holding a mix of numbers, NaN, None, "***", and "-***". SuppressedArray stores
+# these as a float64 array of values plus a uint8 array of state codes, so that
+# calculations can be done without string comparisons or repeated pd.to_numeric
+# calls. Values are only turned back into "***" strings by to_numpy() / render().
+
+import numbers
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import (
+    ExtensionArray,
+    ExtensionDtype,
+    no_default,
+    register_extension_dtype,
+)
+
+# state codes
+VALUE = 0
+MISSING = 1
+SUPPRESSED = 2
+NEGATIVE_SUPPRESSED = 3
+
+SUPPRESSED_STRING = "***"
+NEGATIVE_SUPPRESSED_STRING = "-***"
+
+
+@register_extension_dtype
+class SuppressedDtype(ExtensionDtype):
+    """
+    pandas dtype for SuppressedArray.
+    """
+
+    name = "suppressed"
+    type = object
+    kind = "O"
+    na_value = np.nan
+
+    @classmethod
+    def construct_array_type(cls):
+        return SuppressedArray
+
+    def _get_common_dtype(self, dtypes):
+        # concatenating with a numeric column (e.g., the same column for a
+        # school without suppressed values) keeps the column suppressed
+        if all(
+            isinstance(dtype, SuppressedDtype)
+            or (isinstance(dtype, np.dtype) and dtype.kind in "fiub")
+            for dtype in dtypes
+        ):
+            return self
+
+        return None
+
+
+def _parse_scalar(value):
+    """
+    Returns:
+        tuple: (value, state) for a single value
+    """
+    if isinstance(value, str):
+        if value == SUPPRESSED_STRING:
+            return np.nan, SUPPRESSED
+        if value == NEGATIVE_SUPPRESSED_STRING:
+            return np.nan, NEGATIVE_SUPPRESSED
+
+    number = pd.to_numeric(pd.Series([value], dtype=object), errors="coerce").iloc[0]
+
+    if pd.isna(number):
+        return np.nan, MISSING
+
+    return float(number), VALUE
+
+
+class SuppressedArray(ExtensionArray):
+    """
+    A float64 value array plus a uint8 state array (VALUE, MISSING, SUPPRESSED,
+    NEGATIVE_SUPPRESSED).
+
+    Arithmetic (+, -, *, /) follows the existing suppression rules: the result is
+    SUPPRESSED where either operand is SUPPRESSED, otherwise MISSING where either
+    operand has no value ("-***" has no numeric value), otherwise the result of the
+    operation. Ordering comparisons (<, <=, >, >=) are only True where both operands
+    have a value. Equality also matches "***" to "***" and "-***" to "-***", so
+    that code written for the string representation (e.g., data == "***") works
+    on a SuppressedArray column.
+
+    Args:
+        values (np.ndarray): float values (ignored where state is not VALUE)
+        states (np.ndarray): state codes
+    """
+
+    def __init__(self, values, states, copy=False):
+        self._values = np.array(values, dtype=np.float64, copy=copy)
+        self._states = np.array(states, dtype=np.uint8, copy=copy)
+
+    @classmethod
+    def from_values(cls, data):
+        """
+        Parses a sequence of numbers, NaN, None, "***" and "-***" (a Series,
+        array, or list). Any other (non-numeric) string is treated as MISSING.
+        """
+        if isinstance(data, cls):
+            return data
+
+        if isinstance(data, pd.Series) and isinstance(data.dtype, SuppressedDtype):
+            return data.array
+
+        if isinstance(data, (pd.Series, pd.Index)):
+            data = data.to_numpy()
+
+        data = np.asarray(data)
+
+        if data.dtype.kind in "fiub":
+            values = data.astype(np.float64)
+            states = np.where(np.isnan(values), MISSING, VALUE)
+
+            return cls(values, states)
+
+        data = data.astype(object)
+
+        suppressed = data == SUPPRESSED_STRING
+        negative_suppressed = data == NEGATIVE_SUPPRESSED_STRING
+
+        numeric = pd.to_numeric(pd.Series(data, dtype=object), errors="coerce").to_numpy(
+            dtype=np.float64
+        )
+
+        states = np.select(
+            [suppressed, negative_suppressed, ~np.isnan(numeric)],
+            [SUPPRESSED, NEGATIVE_SUPPRESSED, VALUE],
+            default=MISSING,
+        )
+
+        return cls(np.where(states == VALUE, numeric, np.nan), states)
+
+    # state masks
+    @property
+    def has_value(self) -> np.ndarray:
+        return self._states == VALUE
+
+    @property
+    def missing(self) -> np.ndarray:
+        return self._states == MISSING
+
+    @property
+    def suppressed(self) -> np.ndarray:
+        return self._states == SUPPRESSED
+
+    @property
+    def negative_suppressed(self) -> np.ndarray:
+        return self._states == NEGATIVE_SUPPRESSED
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: float values (NaN where there is no value)
+        """
+        return np.where(self.has_value, self._values, np.nan)
+
+    @property
+    def states(self) -> np.ndarray:
+        return self._states
+
+    def render(self, missing=None) -> np.ndarray:
+        """
+        Converts back to the mixed representation used by the tables and charts.
+
+        Args:
+            missing: the value to use for MISSING entries
+
+        Returns:
+            np.ndarray: object array of floats, "***", "-***", and [missing]
+        """
+        result = self.values.astype(object)
+        result[self.missing] = missing
+        result[self.suppressed] = SUPPRESSED_STRING
+        result[self.negative_suppressed] = NEGATIVE_SUPPRESSED_STRING
+
+        return result
+
+    # ExtensionArray interface
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        return cls.from_values(scalars)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls.from_values(values)
+
+    def _values_for_factorize(self):
+        return self.render(missing=np.nan), np.nan
+
+    @property
+    def dtype(self):
+        return SuppressedDtype()
+
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes + self._states.nbytes
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, item):
+        if isinstance(item, numbers.Integral):
+            state = self._states[item]
+
+            if state == VALUE:
+                return float(self._values[item])
+            if state == SUPPRESSED:
+                return SUPPRESSED_STRING
+            if state == NEGATIVE_SUPPRESSED:
+                return NEGATIVE_SUPPRESSED_STRING
+
+            return self.dtype.na_value
+
+        item = pd.api.indexers.check_array_indexer(self, item)
+
+        return type(self)(self._values[item], self._states[item])
+
+    def __setitem__(self, key, value):
+        key = pd.api.indexers.check_array_indexer(self, key)
+
+        if pd.api.types.is_list_like(value):
+            value = type(self).from_values(value)
+            self._values[key] = value._values
+            self._states[key] = value._states
+        else:
+            self._values[key], self._states[key] = _parse_scalar(value)
+
+    def isna(self) -> np.ndarray:
+        return self.missing | (self.has_value & np.isnan(self._values))
+
+    def take(self, indices, allow_fill=False, fill_value=None):
+        # frames with many SuppressedArray columns call this once per column
+        # for every row selection, so the indices are only checked once
+        indices = np.asarray(indices, dtype=np.intp)
+
+        if not allow_fill:
+            return type(self)(self._values[indices], self._states[indices])
+
+        if fill_value is not None and not pd.isna(fill_value):
+            fill, fill_state = _parse_scalar(fill_value)
+        else:
+            fill, fill_state = np.nan, MISSING
+
+        fill_mask = indices == -1
+
+        if (indices < -1).any():
+            raise ValueError("invalid value in 'indices'. Must be all >= -1")
+
+        if len(self) == 0 and not fill_mask.all():
+            raise IndexError("cannot do a non-empty take from an empty axes.")
+
+        positions = np.where(fill_mask, 0, indices)
+        values = np.where(fill_mask, fill, self._values.take(positions) if len(self) else np.nan)
+        states = np.where(fill_mask, fill_state, self._states.take(positions) if len(self) else 0)
+
+        return type(self)(values, states)
+
+    def copy(self):
+        return type(self)(self._values, self._states, copy=True)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        return cls(
+            np.concatenate([a._values for a in to_concat]),
+            np.concatenate([a._states for a in to_concat]),
+        )
+
+    def to_numpy(self, dtype=None, copy=False, na_value=no_default):
+        if dtype is not None and np.dtype(dtype).kind == "f":
+            return self.values.astype(dtype)
+
+        return self.render(missing=None if na_value is no_default else na_value)
+
+    def __array__(self, dtype=None):
+        return self.to_numpy(dtype=dtype)
+
+    # arithmetic & comparison
+    def _coerce_other(self, other):
+        if isinstance(other, (pd.Series, pd.Index)):
+            other = other.array
+
+        if isinstance(other, SuppressedArray):
+            return other._values, other._states
+
+        if pd.api.types.is_list_like(other):
+            other = type(self).from_values(other)
+            return other._values, other._states
+
+        value, state = _parse_scalar(other)
+
+        return value, state
+
+    def _arithmetic(self, other, op, reverse=False):
+        other_values, other_states = self._coerce_other(other)
+
+        left, right = (other_values, self._values) if reverse else (self._values, other_values)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = op(left, right)
+
+        states = np.select(
+            [
+                (self._states == SUPPRESSED) | (other_states == SUPPRESSED),
+                (self._states != VALUE) | (other_states != VALUE),
+            ],
+            [SUPPRESSED, MISSING],
+            default=VALUE,
+        )
+
+        return type(self)(np.broadcast_to(values, states.shape), states)
+
+    def _compare(self, other, op) -> np.ndarray:
+        other_values, other_states = self._coerce_other(other)
+
+        with np.errstate(invalid="ignore"):
+            result = op(self._values, other_values)
+
+        return result & (self._states == VALUE) & (other_states == VALUE)
+
+    def _reduce(self, name, *, skipna=True, **kwargs):
+        # sum, mean, min, max, etc. of the values ("***" and "-***" are NaN)
+        return getattr(pd.Series(self.values), name)(skipna=skipna, **kwargs)
+
+    def __add__(self, other):
+        return self._arithmetic(other, np.add)
+
+    def __radd__(self, other):
+        return self._arithmetic(other, np.add, reverse=True)
+
+    def __sub__(self, other):
+        return self._arithmetic(other, np.subtract)
+
+    def __rsub__(self, other):
+        return self._arithmetic(other, np.subtract, reverse=True)
+
+    def __mul__(self, other):
+        return self._arithmetic(other, np.multiply)
+
+    def __rmul__(self, other):
+        return self._arithmetic(other, np.multiply, reverse=True)
+
+    def __truediv__(self, other):
+        return self._arithmetic(other, np.true_divide)
+
+    def __rtruediv__(self, other):
+        return self._arithmetic(other, np.true_divide, reverse=True)
+
+    def __eq__(self, other):
+        other_values, other_states = self._coerce_other(other)
+
+        with np.errstate(invalid="ignore"):
+            equal = (self._values == other_values) & (self._states == VALUE)
+
+        # "***" == "***" and "-***" == "-***"
+        same_flag = self._states >= SUPPRESSED
+
+        return (equal | same_flag) & (self._states == other_states)
+
+    def __ne__(self, other):
+        return ~self.__eq__(other)
+
+    def __lt__(self, other):
+        return self._compare(other, np.less)
+
+    def __le__(self, other):
+        return self._compare(other, np.less_equal)
+
+    def __gt__(self, other):
+        return self._compare(other, np.greater)
+
+    def __ge__(self, other):
+        return self._compare(other, np.greater_equal)
+
+
+# Typed schema: academic tables can store numeric columns (NULL where the value
+# was "***") plus one SuppressedMask blob per row, with one bit per column that
+# has suppressed values (see load_data.convert_to_typed_schema()).
+def pack_suppression_mask(mask: np.ndarray) -> list:
+    """
+    Args:
+        mask (np.ndarray): (rows x columns) boolean array of suppressed cells
+
+    Returns:
+        list: a bytes value per row (None for rows without suppressed cells)
+    """
+    mask = np.asarray(mask, dtype=bool)
+    packed = np.packbits(mask, axis=1)
+
+    return [
+        row.tobytes() if flagged else None
+        for row, flagged in zip(packed, mask.any(axis=1))
+    ]
+
+
+def unpack_suppression_mask(blobs, width: int) -> np.ndarray:
+    """
+    Reverses pack_suppression_mask(). Masks written when there were fewer
+    columns are shorter and are padded with False.
+
+    Args:
+        blobs (iterable): bytes values (or None) per row
+        width (int): number of columns
+
+    Returns:
+        np.ndarray: (rows x width) boolean array
+    """
+    nbytes = (width + 7) // 8
+
+    padded = b"".join(
+        (blob or b"")[:nbytes].ljust(nbytes, b"\x00") for blob in blobs
+    )
+
+    packed = np.frombuffer(padded, dtype=np.uint8).reshape(-1, nbytes)
+
+    return np.unpackbits(packed, axis=1, count=width).astype(bool)
+
+
+def as_suppressed(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the columns of a run_query result that have suppressed cells to
+    SuppressedArray columns, so that the frame stays numeric and the
+    suppression travels with the values (through reindexing, concatenation,
+    and the calculations) until render_suppressed() puts "***" back for a
+    table or figure. For a typed schema result the suppressed cells are read
+    from data.attrs["suppressed"] (recorded by run_query), otherwise from the
+    "***" and "-***" strings. Must be called before the rows are reindexed or
+    concatenated.
+
+    Args:
+        data (pd.DataFrame): a run_query result
+
+    Returns:
+        pd.DataFrame: the same dataframe
+    """
+    suppressed = data.attrs.pop("suppressed", None)
+
+    if suppressed is None:
+        strings = data.select_dtypes(include=object)
+        flagged = strings.columns[
+            strings.isin([SUPPRESSED_STRING, NEGATIVE_SUPPRESSED_STRING]).any()
+        ]
+
+        for col in flagged:
+            data[col] = SuppressedArray.from_values(data[col])
+
+        return data
+
+    suppressed = suppressed.reindex(index=data.index, fill_value=False)
+    suppressed = suppressed.loc[:, suppressed.any() & suppressed.columns.isin(data.columns)]
+
+    for col in suppressed.columns:
+        # typed schema columns are numeric (NULL where the value was "***")
+        values = data[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        states = np.select(
+            [suppressed[col].to_numpy(dtype=bool), np.isnan(values)],
+            [SUPPRESSED, MISSING],
+            default=VALUE,
+        )
+
+        data[col] = SuppressedArray(values, states)
+
+    return data
+
+
+def render_suppressed(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts any SuppressedArray columns of [data] (in place) to the object
+    representation (floats, None, "***", and "-***") used by the tables and
+    figures. Anything that fills or formats cells with display strings (e.g.,
+    conditional_fillna()) must render first.
+
+    Args:
+        data (pd.DataFrame): a dataframe
+
+    Returns:
+        pd.DataFrame: the same dataframe
+    """
+    for col in data.columns[data.dtypes.map(lambda dtype: isinstance(dtype, SuppressedDtype))]:
+        data[col] = data[col].array.render()
+
+    return data
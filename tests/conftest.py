@@ -0,0 +1,9 @@
+# puts the app directory on sys.path so the tests can import the pages
+# package, wherever pytest is run from:
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+######################################
+# ICSB Dashboard - Calculation Tests #
+######################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.calculations import set_academic_rating, set_academic_ratings
+
+# (flag, threshold) pairs used by calculate_metrics.py
+rating_thresholds = [
+    (1, [0.05, 0.02, 0]),
+    (1, [0.1, 0.02, 0]),
+    (1, [0.5, 0.499, 0.234]),
+    (2, [0.9, 0.8, 0.7, 0.7]),
+    (2, [0.1, 0.02, 0]),
+    (3, [0, -0.01]),
+    (4, ["A", "B", "C"]),
+]
+
+special_values = ["***", "-***", None, np.nan, "No Grade", "No Data"]
+
+letter_grades = ["A", "B", "C", "D", "F"]
+
+
+def random_values(rng, flag: int, threshold: list, size: int) -> list:
+    """
+    A mix of special values, threshold values, values just above and below the
+    thresholds, and random values (letter grades and NaN for flag 4).
+    """
+    if flag == 4:
+        pool = letter_grades + special_values
+        return [pool[i] for i in rng.integers(0, len(pool), size)]
+
+    edges = []
+    for t in threshold:
+        edges += [t, t - 0.001, t + 0.001]
+
+    values = []
+    for _ in range(size):
+        kind = rng.integers(0, 4)
+
+        if kind == 0:
+            values.append(special_values[rng.integers(0, len(special_values))])
+        elif kind == 1:
+            values.append(edges[rng.integers(0, len(edges))])
+        elif kind == 2:
+            # numeric strings are converted with float() by both functions
+            values.append(str(round(rng.uniform(-1, 1), 3)))
+        else:
+            values.append(rng.uniform(-1, 1))
+
+    return values
+
+
+@pytest.mark.parametrize("flag, threshold", rating_thresholds)
+@pytest.mark.parametrize("seed", range(20))
+def test_set_academic_ratings_matches_set_academic_rating(flag, threshold, seed):
+    rng = np.random.default_rng(seed)
+
+    rows, columns = 25, 4
+    values = random_values(rng, flag, threshold, rows * columns)
+
+    data = pd.DataFrame(
+        np.array(values, dtype=object).reshape(rows, columns),
+        columns=["Diff " + str(i) for i in range(columns)],
+    )
+
+    expected = data.applymap(lambda v: set_academic_rating(v, threshold, flag))
+
+    result = set_academic_ratings(data, threshold, flag)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("flag, threshold", rating_thresholds)
+def test_set_academic_ratings_special_values(flag, threshold):
+    data = pd.DataFrame({"Diff": special_values})
+
+    expected = [set_academic_rating(v, threshold, flag) for v in special_values]
+
+    assert set_academic_ratings(data, threshold, flag)["Diff"].tolist() == expected
+
+
+def test_set_academic_ratings_unknown_flag():
+    with pytest.raises(ValueError):
+        set_academic_ratings(pd.DataFrame({"Diff": [0.5]}), [0.1, 0.02, 0], 5)
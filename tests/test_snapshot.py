@@ -0,0 +1,87 @@
+############################################
+# ICSB Dashboard - Columnar Snapshot Tests #
+############################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from pages.snapshot import (
+    ArrowSnapshot, TableQuery, export_snapshot, fcntl, manifest_name, snapshot_version
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine("sqlite:///" + str(tmp_path / "test.db"))
+    yield engine
+    engine.dispose()
+
+
+def write_year(engine, year: int):
+    data = pd.DataFrame({"Year": [year, year], "SchoolID": [1, 2], "Total": [10, 20]})
+    data.to_sql("academic_data_k8", engine, if_exists="replace", index=False)
+
+
+def versions(path) -> set:
+    return {name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))}
+
+
+def test_export_and_read(engine, tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_year(engine, 2023)
+
+    assert export_snapshot(engine, path, ["academic_data_k8"]) == {"academic_data_k8": 2}
+
+    reader = ArrowSnapshot(path)
+    result = reader.read(TableQuery("academic_data_k8", ("SchoolID", "Total"), (("SchoolID", "=", 2),)))
+
+    assert reader.version == snapshot_version(path)
+    assert result.to_dict("list") == {"SchoolID": [2], "Total": [20]}
+
+    reader.close()
+
+
+@pytest.mark.skipif(fcntl is None, reason="readers are only tracked with flock")
+def test_versions_are_kept_while_read(engine, tmp_path):
+    path = str(tmp_path / "snapshot")
+    query = TableQuery("academic_data_k8", ("Year",))
+
+    write_year(engine, 2022)
+    export_snapshot(engine, path, ["academic_data_k8"])
+    old_reader = ArrowSnapshot(path)
+
+    # two more exports: the version being read is kept, the unread one is not
+    write_year(engine, 2023)
+    export_snapshot(engine, path, ["academic_data_k8"])
+    unread = snapshot_version(path)
+
+    write_year(engine, 2024)
+    export_snapshot(engine, path, ["academic_data_k8"])
+
+    assert versions(path) == {old_reader.version, snapshot_version(path)}
+    assert unread not in versions(path)
+    assert old_reader.read(query)["Year"].tolist() == [2022, 2022]
+    assert ArrowSnapshot(path).read(query)["Year"].tolist() == [2024, 2024]
+
+    # once released, the next export deletes it
+    old_reader.close()
+    export_snapshot(engine, path, ["academic_data_k8"])
+
+    assert versions(path) == {snapshot_version(path)}
+
+
+def test_unfinished_export_is_removed(engine, tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_year(engine, 2023)
+
+    os.makedirs(os.path.join(path, "v0", "academic_data_k8"))
+    export_snapshot(engine, path, ["academic_data_k8"])
+
+    assert "v0" not in versions(path)
+    assert os.path.exists(os.path.join(path, snapshot_version(path), manifest_name))
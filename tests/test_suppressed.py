@@ -0,0 +1,415 @@
+##################################################
+# ICSB Dashboard - Suppressed Numeric Type Tests #
+##################################################
+# author:   jbetley (https://github.com/jbetley)
+# version:  1.15
+# date:     02/21/24
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.suppressed import (
+    SuppressedArray,
+    SuppressedDtype,
+    VALUE,
+    MISSING,
+    SUPPRESSED,
+    NEGATIVE_SUPPRESSED,
+    as_suppressed,
+    render_suppressed,
+)
+from pages.calculations import (
+    as_numeric,
+    calculate_percentage,
+    calculate_difference,
+    calculate_year_over_year,
+    conditional_fillna,
+    set_academic_ratings,
+)
+
+mixed_values = [0.25, "***", None, np.nan, "-***", "0.5", "No Data", 0, ""]
+mixed_states = [
+    VALUE, SUPPRESSED, MISSING, MISSING, NEGATIVE_SUPPRESSED, VALUE, MISSING, VALUE, MISSING
+]
+
+
+def as_list(array: SuppressedArray) -> list:
+    """
+    The rendered values, with NaN as None so that lists can be compared with ==.
+    """
+    return [None if v is None or (isinstance(v, float) and np.isnan(v)) else v
+            for v in array.render()]
+
+
+def test_from_values_parses_mixed_values():
+    array = SuppressedArray.from_values(mixed_values)
+
+    assert array.states.tolist() == mixed_states
+    np.testing.assert_array_equal(
+        array.values, [0.25, np.nan, np.nan, np.nan, np.nan, 0.5, np.nan, 0, np.nan]
+    )
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pd.Series(mixed_values, dtype=object),
+        np.array(mixed_values, dtype=object),
+        pd.Index(mixed_values, dtype=object),
+    ],
+)
+def test_from_values_accepts_series_arrays_and_indexes(data):
+    assert SuppressedArray.from_values(data).states.tolist() == mixed_states
+
+
+def test_from_values_numeric_input():
+    array = SuppressedArray.from_values(np.array([1, 2, np.nan]))
+
+    assert array.states.tolist() == [VALUE, VALUE, MISSING]
+    assert array.values.dtype == np.float64
+
+
+def test_from_values_returns_typed_input_unchanged():
+    array = SuppressedArray.from_values(mixed_values)
+
+    assert SuppressedArray.from_values(array) is array
+    assert SuppressedArray.from_values(pd.Series(array)) is array
+
+
+def test_series_dtype():
+    data = pd.Series(mixed_values, dtype="suppressed")
+
+    assert isinstance(data.dtype, SuppressedDtype)
+    assert data.array.states.tolist() == mixed_states
+
+
+@pytest.mark.parametrize(
+    "operator",
+    [
+        lambda a, b: a + b,
+        lambda a, b: a - b,
+        lambda a, b: a * b,
+        lambda a, b: a / b,
+    ],
+)
+def test_arithmetic_carries_suppression(operator):
+    left = SuppressedArray.from_values([4, "***", "***", None, "-***", 4, 4, 4])
+    right = SuppressedArray.from_values([2, 2, None, "***", 2, "***", None, "-***"])
+
+    result = operator(left, right)
+
+    assert result.states.tolist() == [
+        VALUE, SUPPRESSED, SUPPRESSED, SUPPRESSED, MISSING, SUPPRESSED, MISSING, MISSING
+    ]
+    assert result.values[0] == operator(4.0, 2.0)
+    assert np.isnan(result.values[1:]).all()
+
+
+def test_arithmetic_with_scalars_and_reversed_operands():
+    array = SuppressedArray.from_values([4, "***", None])
+
+    assert as_list(array - 1) == [3.0, "***", None]
+    assert as_list(1 - array) == [-3.0, "***", None]
+    assert as_list(array / 2) == [2.0, "***", None]
+    assert as_list(8 / array) == [2.0, "***", None]
+    assert as_list(array * "***") == ["***", "***", "***"]
+
+
+def test_arithmetic_with_series():
+    data = pd.Series([4, "***", None], dtype="suppressed")
+
+    result = data - pd.Series([1, 1, 1])
+
+    assert isinstance(result.dtype, SuppressedDtype)
+    assert as_list(result.array) == [3.0, "***", None]
+
+
+@pytest.mark.parametrize(
+    "operator, expected",
+    [
+        (lambda a, b: a < b, [True, False, False, False, False]),
+        (lambda a, b: a <= b, [True, False, False, False, False]),
+        (lambda a, b: a > b, [False, False, False, False, False]),
+        (lambda a, b: a >= b, [False, False, False, False, False]),
+    ],
+)
+def test_ordering_comparisons_need_values(operator, expected):
+    array = SuppressedArray.from_values([0, "***", "-***", None, 0])
+    other = SuppressedArray.from_values([1, 1, 1, 1, "***"])
+
+    assert operator(array, other).tolist() == expected
+
+
+def test_equality_matches_values_and_flags():
+    array = SuppressedArray.from_values([0, "***", "-***", None, 2])
+
+    assert (array == 0).tolist() == [True, False, False, False, False]
+    assert (array == "***").tolist() == [False, True, False, False, False]
+    assert (array == "-***").tolist() == [False, False, True, False, False]
+    assert (array != "***").tolist() == [True, False, True, True, True]
+
+    # missing values are never equal (like NaN)
+    assert (array == array).tolist() == [True, True, True, False, True]
+    assert not (array == None).any()  # noqa: E711
+
+
+def test_dataframe_equality_with_suppressed_string():
+    data = pd.DataFrame(
+        {
+            "Year": [2023, 2022],
+            "Total|ELA Proficient %": SuppressedArray.from_values(["***", 0.5]),
+        }
+    )
+
+    assert np.where(data == "***")[0].tolist() == [0]
+    assert np.where(data == "***")[1].tolist() == [1]
+
+
+def test_render():
+    array = SuppressedArray.from_values(mixed_values)
+
+    rendered = array.render()
+
+    assert rendered.dtype == object
+    assert rendered.tolist() == [
+        0.25, "***", None, None, "-***", 0.5, None, 0.0, None
+    ]
+
+    assert array.render(missing="No Data")[2] == "No Data"
+
+    # to_numpy() renders, unless asked for floats
+    assert array.to_numpy().tolist() == rendered.tolist()
+    np.testing.assert_array_equal(array.to_numpy(dtype=float), array.values)
+
+
+def test_getitem():
+    array = SuppressedArray.from_values(mixed_values)
+
+    assert array[0] == 0.25
+    assert array[1] == "***"
+    assert array[4] == "-***"
+    assert np.isnan(array[2])
+
+    assert array[[1, 0]].states.tolist() == [SUPPRESSED, VALUE]
+    assert array[array.has_value].values.tolist() == [0.25, 0.5, 0.0]
+
+
+def test_take():
+    array = SuppressedArray.from_values([0.25, "***", "-***"])
+
+    assert array.take([2, 0, 1]).states.tolist() == [NEGATIVE_SUPPRESSED, VALUE, SUPPRESSED]
+    assert array.take([-1]).states.tolist() == [NEGATIVE_SUPPRESSED]
+
+    filled = array.take([0, -1], allow_fill=True)
+    assert filled.states.tolist() == [VALUE, MISSING]
+
+    filled = array.take([0, -1], allow_fill=True, fill_value="***")
+    assert filled.states.tolist() == [VALUE, SUPPRESSED]
+
+    with pytest.raises(IndexError):
+        array.take([5])
+
+
+def test_reindex_uses_take():
+    data = pd.Series(SuppressedArray.from_values(["***", 0.5]), index=[2023, 2022])
+
+    result = data.reindex([2021, 2022, 2023])
+
+    assert result.array.states.tolist() == [MISSING, VALUE, SUPPRESSED]
+
+
+def test_concat_same_type():
+    first = SuppressedArray.from_values([0.25, "***"])
+    second = SuppressedArray.from_values(["-***", None])
+
+    result = SuppressedArray._concat_same_type([first, second])
+
+    assert result.states.tolist() == [VALUE, SUPPRESSED, NEGATIVE_SUPPRESSED, MISSING]
+
+    # and through pd.concat
+    result = pd.concat([pd.Series(first), pd.Series(second)], ignore_index=True)
+
+    assert isinstance(result.dtype, SuppressedDtype)
+    assert as_list(result.array) == [0.25, "***", "-***", None]
+
+
+def test_concat_with_numeric_column_keeps_type():
+    suppressed = pd.DataFrame({"Total|ELA Total Tested": SuppressedArray.from_values(["***", 20])})
+    numeric = pd.DataFrame({"Total|ELA Total Tested": [30.0]})
+
+    result = pd.concat([suppressed, numeric], ignore_index=True)
+
+    assert isinstance(result["Total|ELA Total Tested"].dtype, SuppressedDtype)
+    assert as_list(result["Total|ELA Total Tested"].array) == ["***", 20.0, 30.0]
+
+    # a missing column is missing for the other frame
+    result = pd.concat([suppressed, pd.DataFrame({"Year": [2023]})], ignore_index=True)
+
+    assert as_list(result["Total|ELA Total Tested"].array) == ["***", 20.0, None]
+
+
+def test_isna():
+    array = SuppressedArray.from_values(mixed_values)
+
+    # suppressed values are data (there just isn't enough of it to show)
+    assert array.isna().tolist() == [
+        False, False, True, True, False, False, True, False, True
+    ]
+    assert pd.Series(array).isna().tolist() == array.isna().tolist()
+
+
+def test_setitem_and_copy():
+    array = SuppressedArray.from_values([0.25, "***", None])
+    copy = array.copy()
+
+    array[0] = "***"
+    array[[1, 2]] = [0.5, "-***"]
+
+    assert array.states.tolist() == [SUPPRESSED, VALUE, NEGATIVE_SUPPRESSED]
+    assert copy.states.tolist() == [VALUE, SUPPRESSED, MISSING]
+
+
+def test_reductions_ignore_suppressed_values():
+    data = pd.Series([0.25, "***", None, 0.5], dtype="suppressed")
+
+    assert data.sum() == 0.75
+    assert data.max() == 0.5
+    assert data.mean() == 0.375
+
+
+def test_render_suppressed():
+    data = pd.DataFrame(
+        {
+            "Category": ["Total", "Black"],
+            "2023Diff": SuppressedArray.from_values(["***", -0.1]),
+        }
+    )
+
+    render_suppressed(data)
+
+    assert data["2023Diff"].dtype == object
+    assert data["2023Diff"].tolist() == ["***", -0.1]
+
+
+def test_conditional_fillna_renders_typed_columns():
+    data = pd.DataFrame({"2023Diff": SuppressedArray.from_values(["***", None, 0.1])})
+
+    assert conditional_fillna(data)["2023Diff"].tolist() == ["***", "—", 0.1]
+
+
+@pytest.mark.parametrize("flag, threshold", [(1, [0.05, 0.02, 0]), (3, [0, -0.01])])
+def test_ratings_of_typed_columns(flag, threshold):
+    values = [0.1, "***", "-***", None, 0.0, -0.05]
+    typed = pd.DataFrame({"Diff": SuppressedArray.from_values(values)})
+    mixed = pd.DataFrame({"Diff": pd.Series(values, dtype=object)})
+
+    pd.testing.assert_frame_equal(
+        set_academic_ratings(typed, threshold, flag),
+        set_academic_ratings(mixed, threshold, flag),
+    )
+
+
+def test_calculations_return_typed_arrays():
+    numerator = pd.Series([1, "***", None, None], dtype=object)
+    denominator = pd.Series([4, 4, 4, None], dtype=object)
+
+    percentage = calculate_percentage(numerator, denominator)
+
+    assert isinstance(percentage, SuppressedArray)
+    assert as_list(percentage) == [0.25, "***", 0.0, None]
+
+    difference = calculate_difference(percentage, pd.Series([0.05, 0.05, 0.05, 0.05]))
+
+    assert isinstance(difference, SuppressedArray)
+    assert as_list(difference) == [0.2, "***", -0.05, None]
+
+
+def test_year_over_year():
+    current = pd.Series([0.5, "***", 0.5, 0.5, None, "-***"], dtype=object)
+    previous = pd.Series([0.25, 0.25, "***", None, 0.25, 0.25], dtype=object)
+
+    result = calculate_year_over_year(current, previous)
+
+    assert isinstance(result, SuppressedArray)
+    assert as_list(result) == [0.25, "***", "***", None, None, None]
+
+
+@pytest.mark.parametrize(
+    "current, previous, expected",
+    [
+        # 0% of students proficient after a year with no data or "***"
+        (0, None, "-***"),
+        (0, np.nan, "-***"),
+        (0, "***", "-***"),
+        (0.0, "***", "-***"),
+        # numeric strings are parsed, so "0" is 0
+        ("0", None, "-***"),
+        ("0", "***", "-***"),
+        # non-numeric strings have no value, so they are handled like NaN
+        (0, "No Data", "-***"),
+        (0, "", "-***"),
+        # a "-***" previous year is neither missing nor "***"
+        (0, "-***", None),
+        (0, 0.25, -0.25),
+        ("***", None, "***"),
+    ],
+)
+def test_year_over_year_negative_suppressed(current, previous, expected):
+    result = calculate_year_over_year(
+        pd.Series([current], dtype=object), pd.Series([previous], dtype=object)
+    )
+
+    assert as_list(result) == [expected]
+
+
+def test_as_suppressed_typed_schema_result():
+    # a typed schema result is numeric, with the suppressed cells recorded
+    # by run_query in attrs
+    data = pd.DataFrame(
+        {
+            "Year": [2023, 2022],
+            "Total|ELA Total Tested": [np.nan, 40.0],
+            "Total|ELA Total Proficient": [10.0, np.nan],
+        }
+    )
+    data.attrs["suppressed"] = pd.DataFrame(
+        {
+            "Total|ELA Total Tested": [True, False],
+            "Total|ELA Total Proficient": [False, False],
+        }
+    )
+
+    as_suppressed(data)
+
+    assert "suppressed" not in data.attrs
+    assert as_list(data["Total|ELA Total Tested"].array) == ["***", 40.0]
+
+    # columns without suppressed cells are left alone
+    assert data["Total|ELA Total Proficient"].dtype == np.float64
+
+
+def test_as_suppressed_string_result():
+    data = pd.DataFrame(
+        {
+            "School Name": ["A", "B"],
+            "Total|ELA Total Tested": pd.Series(["***", 40], dtype=object),
+            "Total|ELA Total Proficient": [10.0, np.nan],
+        }
+    )
+
+    as_suppressed(data)
+
+    assert as_list(data["Total|ELA Total Tested"].array) == ["***", 40.0]
+    assert data["School Name"].dtype == object
+    assert data["Total|ELA Total Proficient"].dtype == np.float64
+
+
+def test_as_numeric():
+    data = pd.Series(["***", 0.5, None], dtype="suppressed", name="Total|ELA Proficient %")
+
+    result = as_numeric(data)
+
+    assert result.dtype == np.float64
+    assert result.name == data.name
+    np.testing.assert_array_equal(result.to_numpy(), [np.nan, 0.5, np.nan])